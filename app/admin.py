@@ -0,0 +1,184 @@
+"""
+Endpoints to run the service rather than read or edit devices, the
+admin endpoints, background job status and saved request profiles
+"""
+
+import logging
+import time
+
+from fastapi import APIRouter, Body, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app import discovery, notifications, profiling
+from app.breaker import circuit_breakers
+from app.device import Device, run_blocking
+from app.exceptions import InvalidData
+from app.models import CredentialType, InventoryEntry
+from app.store import job_store
+
+router = APIRouter()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(
+    profile_id: str,
+    x_profile: str | None = Header(None),
+    sort: str = Query("cumulative", pattern=r"^(cumulative|tottime|calls)$"),
+    limit: int = Query(50, ge=1, le=1000),
+) -> str:
+    """
+    Text report of a saved request profile
+    Needs the profiling token in the X-Profile header
+    Args:
+        profile_id (str): from the X-Profile-Id response header
+        sort (str): cumulative, tottime or calls
+        limit (int): most functions to list
+    Returns:
+        str
+    """
+    if not profiling.token_matches(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    try:
+        return profiling.report(profile_id, sort, limit)
+    except (InvalidData, FileNotFoundError) as e:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown profile {profile_id}"
+        ) from e
+
+
+@router.post("/admin/discover", status_code=200)
+async def discover_inventory(
+    inventory: list[InventoryEntry] = Body(),
+    concurrency: int = Query(discovery.DISCOVERY_CONCURRENCY, ge=1, le=1000),
+    refresh: bool = False,
+    prewarm: bool = False,
+) -> dict:
+    """
+    Discover the device type of every host in an inventory and store
+    them in one go, hosts we know are skipped unless refresh is set
+    Args:
+        inventory (list): host and credential for each device
+        concurrency (int): most devices to connect to at the same time
+        refresh (bool): discover known hosts again
+        prewarm (bool): open a pooled session to each host
+    Returns:
+        dict of per host results and counts by status
+    """
+    results = await discovery.discover_many(
+        inventory, concurrency, refresh=refresh, prewarm=prewarm
+    )
+    return {
+        "results": [result.model_dump(mode="json") for result in results],
+        "summary": discovery.summarise(results),
+    }
+
+
+@router.get("/admin/breakers")
+def list_breakers() -> list:
+    """
+    Circuit breakers of hosts that have failed to connect since they
+    last connected, hosts that are not listed are closed
+    Returns:
+        list of dict
+    """
+    return [
+        status.model_dump(mode="json")
+        for status in circuit_breakers.statuses()
+    ]
+
+
+@router.delete("/admin/breakers", status_code=200)
+def reset_breaker(host: str) -> dict:
+    """
+    Close a host's circuit breaker so the next request connects
+    If the host has no breaker it returns 404
+    Args:
+        host (str): hostname of the device
+    Returns:
+        dict
+    """
+    if not circuit_breakers.reset(host):
+        raise HTTPException(status_code=404, detail=f"No breaker for {host}")
+    return {"detail": f"Closed breaker for {host}"}
+
+
+@router.get("/admin/subscriptions")
+def list_subscriptions() -> list:
+    """
+    Hosts whose notifications we subscribe to and how that is going
+    Returns:
+        list of dict
+    """
+    return [
+        status.model_dump(mode="json")
+        for status in notifications.subscription_manager.statuses()
+    ]
+
+
+@router.post("/admin/subscriptions", status_code=200)
+async def subscribe(
+    host: str, credential: CredentialType = CredentialType.DEFAULT
+) -> dict:
+    """
+    Subscribe to a host's notifications so its cached reads are dropped
+    when its config changes, and kept for longer until then
+    Args:
+        host (str): hostname of the device
+        credential (str): optional credential to use
+    Returns:
+        dict of the subscription status
+    """
+    try:
+        device = await Device.load(host, credential.value)
+    except Exception as e:
+        logging.exception("Cannot subscribe to %s", host)
+        raise HTTPException(
+            status_code=500, detail=f"Exception {e.__class__.__name__}: {e}"
+        ) from e
+    status = notifications.subscription_manager.watch(device)
+    return status.model_dump(mode="json")
+
+
+@router.delete("/admin/subscriptions", status_code=200)
+async def unsubscribe(host: str) -> dict:
+    """
+    Stop subscribing to a host's notifications
+    If the host was not subscribed it returns 404
+    Args:
+        host (str): hostname of the device
+    Returns:
+        dict
+    """
+    if not await run_blocking(
+        notifications.subscription_manager.unwatch, host
+    ):
+        raise HTTPException(
+            status_code=404, detail=f"Not subscribed to {host}"
+        )
+    return {"detail": f"Unsubscribed from {host}"}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str) -> dict:
+    """
+    Status, timings and, once finished, the result of a background job
+    The result is the body the write would have answered with and
+    status_code its status
+    Args:
+        job_id (str): from the 202 response
+    Returns:
+        dict
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+    queued_until = job.started_at or time.time()
+    return job.model_dump(mode="json") | {
+        "queued_seconds": queued_until - job.created_at,
+        "run_seconds": (
+            None
+            if job.started_at is None
+            else (job.finished_at or time.time()) - job.started_at
+        ),
+    }
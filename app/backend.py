@@ -2,307 +2,813 @@
 Backend classes to action changes on a device via NETCONF
 """
 
+import asyncio
+import itertools
 import logging
 import os
-import sqlite3
+import time
+from contextlib import nullcontext
 from dataclasses import dataclass
+from functools import partial
 
-import xmltodict
-from jinja2 import Environment, FileSystemLoader
+from lxml import etree
 from ncclient import manager
 
+from app import deadlines
+from app.cache import CachedRead
+from app.device import Device, read_cache, run_blocking
 from app.exceptions import (
     CannotEdit,
-    InvalidCredential,
+    DeadlineExceeded,
     InvalidData,
     InvalidDeviceType,
+    UnknownVersion,
 )
-from app.models import DeviceCapability, InterfaceConfig
+from app.models import (
+    InterfaceChanges,
+    InterfaceConfig,
+    InterfaceFilter,
+    OutputFormat,
+)
+from app.parsers import (
+    INTERFACE_TAG,
+    element_to_dict,
+    find_interface_names,
+    has_interface_configurations,
+    parse_interfaces,
+)
+from app.metrics import (
+    CACHE_REQUESTS,
+    COMMIT_BATCH_SIZE,
+    ERRORS,
+)
+from app.registry import TemplateOperation, template_registry
+from app.scheduler import PendingWrite, commit_scheduler
+from app.store import snapshot_store
 
 log_level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper())
 logging.basicConfig(level=log_level)
 
-env = Environment(loader=FileSystemLoader("app/templates"))
-
 
-def get_credentials(credential: str) -> tuple:
+def filter_interfaces(interfaces, interface_filter: InterfaceFilter):
     """
-    Get credentials from environment base on a type
+    Apply the parts of a filter the device may not have, a name prefix,
+    the selected fields and the limit and offset
     Args:
-        credential (str): type of credential to retreive
+        interfaces (iterable): dict for each interface
+        interface_filter (InterfaceFilter): what to keep
     Returns:
-        tuple (username, password)
+        iterator of dict
     """
-    try:
-        return (
-            os.environ[f"{credential.upper()}_USERNAME"],
-            os.environ[f"{credential.upper()}_PASSWORD"],
+    if interface_filter.name_prefix:
+        interfaces = (
+            interface
+            for interface in interfaces
+            if interface.get("interface-name", "").startswith(
+                interface_filter.name_prefix
+            )
+        )
+    if interface_filter.fields:
+        keep = {"active", "interface-name"}
+        keep.update(field.value for field in interface_filter.fields)
+        interfaces = (
+            {key: value for key, value in interface.items() if key in keep}
+            for interface in interfaces
         )
-    except KeyError as e:
-        raise InvalidCredential(credential) from e
+    return page(interfaces, interface_filter)
 
 
-@dataclass
-class ConnectionManager:
+def filter_records(records, interface_filter: InterfaceFilter):
     """
-    Class to manage how to connect to the device via ncclient
+    Same as filter_interfaces for InterfaceRecord
+    Args:
+        records (iterable): InterfaceRecord for each interface
+        interface_filter (InterfaceFilter): what to keep
+    Returns:
+        iterator of InterfaceRecord
     """
+    if interface_filter.name_prefix:
+        records = (
+            record
+            for record in records
+            if record.interface_name.startswith(interface_filter.name_prefix)
+        )
+    if interface_filter.fields:
+        records = (
+            record.project(interface_filter.fields) for record in records
+        )
+    return page(records, interface_filter)
 
-    timeout: int = 30
-    hostkey_verify: bool = False
-    look_for_keys: bool = False
 
-    def format_params(
-        self, host: str, device_type: str, username: str, password: str
-    ) -> dict:
-        """Format the manager params dict for ncclient manager.connect"""
-        return {
-            "host": host,
-            "username": username,
-            "password": password,
-            "timeout": self.timeout,
-            "hostkey_verify": self.hostkey_verify,
-            "look_for_keys": self.look_for_keys,
-            "device_params": {"name": device_type},
-        }
+def page(items, interface_filter: InterfaceFilter):
+    """Apply the offset and limit of a filter"""
+    stop = None
+    if interface_filter.limit is not None:
+        stop = interface_filter.offset + interface_filter.limit
+    return itertools.islice(items, interface_filter.offset, stop)
 
 
 @dataclass
-class Device:
-    """
-    A class to manage parameters to connect to a device and
-    how to get/edit the config
-    """
+class InterfaceManager:  # pylint: disable=too-many-public-methods
+    """An interface object on a device"""
 
-    host: str
-    credential: str
+    device: Device
 
-    def __post_init__(self):
-        connection_manager = ConnectionManager()
-        username, password = get_credentials(self.credential)
-        self.device_type = self.get_device_type(
-            connection_manager, username, password
-        )
-        logging.info(
-            "Detected %s as device type: %s", self.host, self.device_type
-        )
-        self.manager_params = connection_manager.format_params(
-            self.host, self.device_type, username, password
-        )
+    def template(self, operation: TemplateOperation):
+        """Compiled template for an operation on this device type"""
+        return template_registry.get(self.device.device_type, operation)
 
-    def save_device_type(self, device_type: str) -> None:
+    def validate_data(self, data: etree._Element) -> None:
+        """
+        Validate the data element contains what we need based on what
+        template we used
+        Raises:
+            InvalidData when the data is not valid for the device tpye
         """
-        Store the device type so we dont need determine it again
+        if self.device.device_type == "iosxr":
+            if not has_interface_configurations(data):
+                raise InvalidData(
+                    f"No interface-configurations in data from "
+                    f"{self.device.host}"
+                )
+        else:
+            raise InvalidDeviceType(
+                "Cannot validate data for device type "
+                f"{self.device.device_type}"
+            )
+
+    def check_exists(
+        self, ncclient_manager: manager.Manager, interface_name: str
+    ) -> bool:
+        """
+        Check if the interface exists using an open session
         Args:
-            device_type (str): device type to store with self.host
-        """
-        conn = sqlite3.connect("netconf.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            "CREATE TABLE IF NOT EXISTS device_info ( "
-            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
-            "host TEXT NOT NULL, "
-            "device_type TEXT NOT NULL)"
-        )
-        cursor.execute(
-            "INSERT INTO device_info (host, device_type) VALUES (?, ?)",
-            (self.host, device_type),
+            ncclient_manager (manager.Manager): session to read with
+            interface_name (str): name of the interface to check
+        Returns:
+            boolean
+        """
+        try:
+            self.fetch_one(ncclient_manager, interface_name)
+        except InvalidData:
+            return False
+
+        return True
+
+    def fetch_one(
+        self, ncclient_manager: manager.Manager, interface_name: str
+    ) -> etree._Element:
+        """
+        Get config of a single interface using an open session
+        Args:
+            ncclient_manager (manager.Manager): session to read with
+            interface_name (str): name of the interface to get
+        Returns:
+            validated data element
+        """
+        template = self.template(TemplateOperation.GET_INTERFACE)
+        rendered_config = template.render(interface_name=interface_name)
+        data = self.device.get_config_element(
+            ncclient_manager, rendered_config
         )
-        conn.commit()
-        conn.close()
+        self.validate_data(data)
+        return data
 
-    def fetch_device_type(self) -> str:
+    def fetch_names(
+        self, ncclient_manager: manager.Manager, interface_names: list
+    ) -> set:
         """
-        Fetch device type from db if its there
+        Find which of the interfaces exist with one read
+        Args:
+            ncclient_manager (manager.Manager): session to read with
+            interface_names (list): names of the interfaces to check
         Returns:
-            device type (str)
+            set of the names that exist
         """
-        conn = sqlite3.connect("netconf.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT device_type FROM device_info WHERE host = ?", (self.host,)
+        template = self.template(TemplateOperation.GET_INTERFACES)
+        rendered_config = template.render(interface_names=interface_names)
+        data = self.device.get_config_element(
+            ncclient_manager, rendered_config
         )
-        row = cursor.fetchone()
-        conn.close()
-        return row[0]
+        return set(find_interface_names(data))
 
-    def get_device_type(
+    def get_one(
+        self, interface_name: str, output: OutputFormat = OutputFormat.RAW
+    ) -> dict:
+        """
+        Get config of a single interface
+        Args:
+            interface_name (str): name of the interface to check
+            output (OutputFormat): raw dict of the xml or a record
+        Returns:
+            dict
+        """
+        with self.device.session() as ncclient_manager:
+            data = self.fetch_one(ncclient_manager, interface_name)
+        with self.device.phase("convert"):
+            if output == OutputFormat.RECORDS:
+                return parse_interfaces(data)[0].as_dict()
+            return element_to_dict(data)
+
+    def get_all(
         self,
-        connection_manager: ConnectionManager,
-        username: str,
-        password: str,
-    ) -> str:
+        interface_filter: InterfaceFilter | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ) -> dict:
         """
-        Determine the ncclient device type from the NETCONF capabilities
+        Get config of all interfaces
         Args:
-            connection_manager (ConnectionManager): used for manager params
-            username (str): to connect to device
-            password (str): to connect to device
+            interface_filter (InterfaceFilter): optional filter, what the
+                device can filter goes in the request and the rest is
+                trimmed here
+            output (OutputFormat): raw dict of the xml or records
         Returns:
-            device_type (str): ncclient device type
-        Raises:
-            InvalidDeviceType if we can't get a device type
+            dict
         """
-        try:
-            return self.fetch_device_type()
-        except (TypeError, sqlite3.OperationalError):
-            pass
+        interface_filter = interface_filter or InterfaceFilter()
+        with self.device.session() as ncclient_manager:
+            data = self.device.get_config_element(
+                ncclient_manager, self.render_filter(interface_filter)
+            )
+        if interface_filter.is_empty:
+            self.validate_data(data)
 
-        default_manager_params = connection_manager.format_params(
-            self.host, "default", username, password
+        with self.device.phase("convert"):
+            return self.convert_all(data, interface_filter, output)
+
+    @staticmethod
+    def convert_all(
+        data: etree._Element,
+        interface_filter: InterfaceFilter,
+        output: OutputFormat,
+    ) -> dict:
+        """
+        Build the get_all response from the data element
+        Args:
+            data (etree._Element): data from the device
+            interface_filter (InterfaceFilter): what to keep
+            output (OutputFormat): raw dict of the xml or records
+        Returns:
+            dict
+        """
+        if output == OutputFormat.RECORDS:
+            records = filter_records(parse_interfaces(data), interface_filter)
+            return {"interfaces": [record.as_dict() for record in records]}
+
+        json_data = element_to_dict(data)
+        if interface_filter.is_empty:
+            return json_data
+
+        if has_interface_configurations(data):
+            configurations = json_data["data"]["interface-configurations"]
+        else:
+            configurations = {}
+            json_data = {"data": {"interface-configurations": configurations}}
+
+        interfaces = configurations.get("interface-configuration", [])
+        if isinstance(interfaces, dict):
+            interfaces = [interfaces]
+        configurations["interface-configuration"] = list(
+            filter_interfaces(interfaces, interface_filter)
         )
-        with manager.connect(**default_manager_params) as mgr:
-            for capability in DeviceCapability:
-                if any(
-                    capability.value in server_capability
-                    for server_capability in mgr.server_capabilities
-                ):
-                    self.save_device_type(capability.name.lower())
-                    return capability.name.lower()
+        return json_data
 
-        raise InvalidDeviceType("Could not determine a device type for host")
+    def render_filter(self, interface_filter: InterfaceFilter) -> str:
+        """
+        Render the get_interfaces filter as tight as the device allows,
+        a name prefix needs XPath so is only sent if the device has it
+        Args:
+            interface_filter (InterfaceFilter): what to get
+        Returns:
+            str
+        """
+        template = self.template(TemplateOperation.GET_INTERFACES)
+        xpath_prefix = None
+        if (
+            interface_filter.name_prefix
+            and not interface_filter.interface_names
+            and self.device.supports(":xpath")
+        ):
+            xpath_prefix = interface_filter.name_prefix
+        return template.render(
+            interface_names=interface_filter.interface_names,
+            fields=[field.value for field in interface_filter.fields],
+            xpath_prefix=xpath_prefix,
+        )
 
-    def get_config(
-        self, ncclient_manager: manager.Manager, rendered_config: str
-    ) -> dict:
+    def read_one(
+        self,
+        interface_name: str,
+        max_age: float | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ) -> CachedRead:
         """
-        Get the running config with a filter
-        returns a dict from the xml data
+        Get config of a single interface from the read cache if it is
+        no older than max_age, otherwise from the device
+        Args:
+            interface_name (str): name of the interface to get
+            max_age (float): oldest cached read we accept in seconds
+            output (OutputFormat): raw dict of the xml or a record
+        Returns:
+            CachedRead
         """
-        response = ncclient_manager.get_config(
-            source="running", filter=rendered_config
+        return self.read(
+            ("interface", interface_name, output),
+            partial(self.get_one, interface_name, output),
+            max_age,
         )
-        xml_data = response.data_xml
-        return xmltodict.parse(xml_data)
-
-    def edit_config(
-        self, ncclient_manager: manager.Manager, rendered_config: str
-    ) -> None:
-        """Edit the candidate config and commit the change"""
-        ncclient_manager.edit_config(
-            target="candidate", config=rendered_config
+
+    def read_all(
+        self,
+        max_age: float | None = None,
+        interface_filter: InterfaceFilter | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ) -> CachedRead:
+        """
+        Get config of all interfaces from the read cache if it is no
+        older than max_age, otherwise from the device
+        Args:
+            max_age (float): oldest cached read we accept in seconds
+            interface_filter (InterfaceFilter): optional filter
+            output (OutputFormat): raw dict of the xml or records
+        Returns:
+            CachedRead
+        """
+        return self.read(
+            ("interfaces", interface_filter, output),
+            partial(self.get_all, interface_filter, output),
+            max_age,
         )
-        ncclient_manager.commit()
 
+    def snapshot(self, cached: CachedRead) -> int:
+        """
+        Config version of a full raw read of the interfaces, saved as a
+        new snapshot if we dont hold its content yet
+        Args:
+            cached (CachedRead): from read_all with no filter
+        Returns:
+            int
+        """
+        version = snapshot_store.version(self.device.host, cached.etag)
+        if version is not None:
+            return version
+        with self.device.phase("snapshot"):
+            return snapshot_store.save(
+                self.device.host,
+                cached.etag,
+                self.snapshot_interfaces(cached.data),
+            )
 
-@dataclass
-class InterfaceManager:
-    """An interface object on a device"""
+    @staticmethod
+    def snapshot_interfaces(data: dict) -> dict:
+        """
+        Interfaces in a raw get_all response keyed by name
+        Args:
+            data (dict): raw dict of the xml
+        Returns:
+            dict
+        """
+        configurations = (data["data"] or {}).get("interface-configurations")
+        configurations = configurations or {}
+        interfaces = configurations.get("interface-configuration", [])
+        if isinstance(interfaces, dict):
+            interfaces = [interfaces]
+        return {
+            interface["interface-name"]: interface for interface in interfaces
+        }
 
-    device: Device
+    def read_versioned(self, max_age: float | None = None) -> tuple:
+        """
+        Full raw read of the interfaces and its config version
+        Args:
+            max_age (float): oldest cached read we accept in seconds
+        Returns:
+            tuple (CachedRead, int version)
+        """
+        cached = self.read_all(max_age, InterfaceFilter())
+        return cached, self.snapshot(cached)
 
-    def validate_data(self, json_data: dict) -> None:
+    def changes_since(
+        self, since: int, max_age: float | None = None
+    ) -> InterfaceChanges:
         """
-        Validate the json data contains what we need based on what
-        template we used
+        Interfaces added, changed or removed since a config version
+        Args:
+            since (int): version the caller has
+            max_age (float): oldest cached read we accept in seconds
+        Returns:
+            InterfaceChanges
         Raises:
-            InvalidData when the data is not valid for the device tpye
+            UnknownVersion if we dont hold the version
         """
-        if self.device.device_type == "iosxr":
-            if (
-                json_data.get("data", {}).get("interface-configurations")
-                is None
-            ):
-                raise InvalidData(json_data)
-        else:
-            raise InvalidDeviceType(
-                "Cannot validate data for device type "
-                f"{self.device.device_type}"
+        _, version = self.read_versioned(max_age)
+        changes = snapshot_store.changes(self.device.host, since, version)
+        if changes is None:
+            raise UnknownVersion(
+                f"Version {since} of {self.device.host} is not held"
             )
+        added, changed, removed = changes
+        return InterfaceChanges(
+            host=self.device.host,
+            since=since,
+            version=version,
+            added=added,
+            changed=changed,
+            removed=removed,
+        )
 
-    def check_exists(self, interface_name: str) -> bool:
+    def read(self, key: tuple, fetch, max_age: float | None) -> CachedRead:
         """
-        Check if the interface exists
+        Serve a read from the cache or fetch and cache it
         Args:
-            interface_name (str): name of the interface to check
+            key (tuple): what is being read
+            fetch (callable): reads from the device on a miss
+            max_age (float): oldest cached read we accept in seconds
         Returns:
-            boolean
+            CachedRead
         """
-        try:
-            self.get_one(interface_name)
-        except InvalidData:
-            return False
+        cached = read_cache.get(self.device.host, key, max_age)
+        if cached is not None:
+            CACHE_REQUESTS.inc("read", "hit")
+            return cached
 
-        return True
+        CACHE_REQUESTS.inc("read", "miss")
+        generation = read_cache.generation(self.device.host)
+        return read_cache.set(self.device.host, key, fetch(), generation)
 
-    def get_one(self, interface_name: str) -> dict:
+    def element_tag(self) -> str:
         """
-        Get config of a single interface
+        Namespaced tag of one interface in the data for the device type
+        Raises:
+            InvalidDeviceType if we dont know the device type
+        """
+        if self.device.device_type == "iosxr":
+            return INTERFACE_TAG
+        raise InvalidDeviceType(
+            f"Cannot parse data for device type {self.device.device_type}"
+        )
+
+    def stream_all(
+        self,
+        interface_filter: InterfaceFilter | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ):
+        """
+        Get config of all interfaces parsed one interface at a time
+        The session is returned to the pool before parsing starts
         Args:
-            interface_name (str): name of the interface to check
+            interface_filter (InterfaceFilter): optional filter
+            output (OutputFormat): raw dicts of the xml or records
         Returns:
-            dict
+            generator of dict for each interface
         """
-        with manager.connect(**self.device.manager_params) as ncclient_manager:
-            template_name = f"{self.device.device_type}_get_interface.xml.j2"
-            template = env.get_template(template_name)
-            rendered_config = template.render(interface_name=interface_name)
-            json_data = self.device.get_config(
-                ncclient_manager, rendered_config
+        interface_filter = interface_filter or InterfaceFilter()
+        tag = self.element_tag()
+        with self.device.session() as ncclient_manager:
+            xml_data = self.device.get_config_xml(
+                ncclient_manager, self.render_filter(interface_filter)
             )
-            self.validate_data(json_data)
-            return json_data
+        if output == OutputFormat.RECORDS:
+            records = filter_records(
+                self.device.iter_config(xml_data, tag, output),
+                interface_filter,
+            )
+            return (record.as_dict() for record in records)
+        return filter_interfaces(
+            self.device.iter_config(xml_data, tag), interface_filter
+        )
 
-    def get_all(self) -> dict:
+    def create_one(
+        self, interface_config: InterfaceConfig, dry_run: bool = False
+    ) -> dict:
         """
-        Get config of all interfaces
+        Create a single interface on the device with a commit of its own
+
+        The existence check, edit and commit share one session and run
+        under a candidate lock so no other writer can slip in between
+        Args:
+            interface_config (InterfaceConfig): config of interface to add
         Returns:
             dict
         """
-        with manager.connect(**self.device.manager_params) as ncclient_manager:
-            template_name = f"{self.device.device_type}_get_interfaces.xml.j2"
-            template = env.get_template(template_name)
-            rendered_config = template.render()
-            json_data = self.device.get_config(
-                ncclient_manager, rendered_config
-            )
-            self.validate_data(json_data)
-            return json_data
+        template = self.template(TemplateOperation.CREATE_INTERFACE)
+        rendered_config = template.render(**interface_config.__dict__)
+
+        with self.device.session() as ncclient_manager:
+            with self.write_lock(ncclient_manager, dry_run):
+                if self.check_exists(
+                    ncclient_manager, interface_config.interface_name
+                ):
+                    raise CannotEdit(
+                        f"Interface {interface_config.interface_name} "
+                        "already exists"
+                    )
+                if dry_run:
+                    return rendered_config
+
+                return self.device.edit_config(
+                    ncclient_manager, rendered_config
+                )
+
+    def delete_one(self, interface_name: str, dry_run: bool = False) -> dict:
+        """
+        Delete a single interface from the device with a commit of its own
 
-    def create(
+        The existence check, edit and commit share one session and run
+        under a candidate lock so no other writer can slip in between
+        Args:
+            interface_name (str): name of the interface to check
+        Returns:
+            dict
+        """
+        template = self.template(TemplateOperation.DELETE_INTERFACE)
+        rendered_config = template.render(interface_name=interface_name)
+
+        with self.device.session() as ncclient_manager:
+            with self.write_lock(ncclient_manager, dry_run):
+                if not self.check_exists(ncclient_manager, interface_name):
+                    raise CannotEdit(
+                        f"Interface {interface_name} does not exist"
+                    )
+                if dry_run:
+                    return rendered_config
+
+                return self.device.edit_config(
+                    ncclient_manager, rendered_config
+                )
+
+    async def schedule_async(self, write: PendingWrite):
+        """
+        Queue a write with the commit scheduler for this device and wait
+        for its outcome in the event loop, so writers queued behind a
+        slow commit dont hold executor threads
+        Returns:
+            the result of the write
+        Raises:
+            whatever the write raised
+        """
+        write.deadline = deadlines.current_deadline.get()
+        return await commit_scheduler.submit_async(
+            (self.device.host, self.device.credential),
+            write,
+            self.apply_writes,
+            run_blocking,
+        )
+
+    def apply_writes(self, writes: list) -> list:
+        """
+        Apply a batch of queued writes and resolve each of them
+        A name can only be written once per commit so later writes to a
+        name already in the batch are handed back for the next one. If
+        the shared commit fails each write is retried on its own so one
+        bad write does not fail the rest
+        Args:
+            writes (list): PendingWrite in the order they arrived
+        Returns:
+            list of PendingWrite deferred to the next batch
+        """
+        accepted, deferred, names = [], [], set()
+        for write in writes:
+            if (
+                write.deadline is not None
+                and write.deadline <= time.monotonic()
+            ):
+                write.resolve(
+                    error=DeadlineExceeded(
+                        "Deadline exceeded waiting to commit to "
+                        f"{self.device.host}"
+                    )
+                )
+            elif write.name in names:
+                deferred.append(write)
+            else:
+                names.add(write.name)
+                accepted.append(write)
+
+        if len(accepted) > 1:
+            # the batch has as long as the most patient of its writers
+            deadline = None
+            if all(write.deadline is not None for write in accepted):
+                deadline = max(write.deadline for write in accepted)
+            try:
+                with deadlines.use(deadline):
+                    self.apply_batch(accepted)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning(
+                    "Shared commit of %s writes to %s failed, applying "
+                    "them one at a time: %r",
+                    len(accepted),
+                    self.device.host,
+                    e,
+                )
+        for write in accepted:
+            if not write.done:
+                self.apply_one(write)
+        return deferred
+
+    def apply_one(self, write: PendingWrite) -> None:
+        """Apply a single queued write with a commit of its own"""
+        if write.operation == "create":
+            apply = self.create_one
+        else:
+            apply = self.delete_one
+        try:
+            with deadlines.use(write.deadline):
+                result = apply(write.data)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            write.resolve(error=e)
+            return
+        COMMIT_BATCH_SIZE.observe(1, self.device.host)
+        write.resolve(result)
+
+    def apply_batch(self, writes: list) -> None:
+        """
+        Apply queued writes to distinct interfaces with one existence
+        read and one commit, writes that cant be made are resolved with
+        CannotEdit like they would be on their own
+        Args:
+            writes (list): PendingWrite each for a different name
+        """
+        with self.device.session() as ncclient_manager:
+            with self.write_lock(ncclient_manager, False):
+                existing = self.fetch_names(
+                    ncclient_manager, [write.name for write in writes]
+                )
+                creates, deletes = [], []
+                for write in writes:
+                    if write.operation == "create":
+                        if write.name in existing:
+                            write.resolve(
+                                error=CannotEdit(
+                                    f"Interface {write.name} already exists"
+                                )
+                            )
+                        else:
+                            creates.append(write)
+                    elif write.name not in existing:
+                        write.resolve(
+                            error=CannotEdit(
+                                f"Interface {write.name} does not exist"
+                            )
+                        )
+                    else:
+                        deletes.append(write)
+
+                rendered_configs = []
+                if creates:
+                    rendered_configs.append(
+                        self.template(
+                            TemplateOperation.CREATE_INTERFACES
+                        ).render(interfaces=[write.data for write in creates])
+                    )
+                if deletes:
+                    rendered_configs.append(
+                        self.template(
+                            TemplateOperation.DELETE_INTERFACES
+                        ).render(
+                            interface_names=[write.name for write in deletes]
+                        )
+                    )
+                if not rendered_configs:
+                    return
+                self.device.edit_config(ncclient_manager, *rendered_configs)
+
+        COMMIT_BATCH_SIZE.observe(
+            len(creates) + len(deletes), self.device.host
+        )
+        for write in creates + deletes:
+            write.resolve()
+
+    async def get_all_async(self) -> dict:
+        """Awaitable get_all run on the netconf executor"""
+        return await run_blocking(self.get_all)
+
+    async def read_one_async(
+        self,
+        interface_name: str,
+        max_age: float | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ) -> CachedRead:
+        """Awaitable read_one run on the netconf executor"""
+        return await run_blocking(
+            self.read_one, interface_name, max_age, output
+        )
+
+    async def read_all_async(
+        self,
+        max_age: float | None = None,
+        interface_filter: InterfaceFilter | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ) -> CachedRead:
+        """Awaitable read_all run on the netconf executor"""
+        return await run_blocking(
+            self.read_all, max_age, interface_filter, output
+        )
+
+    async def read_versioned_async(
+        self, max_age: float | None = None
+    ) -> tuple:
+        """Awaitable read_versioned run on the netconf executor"""
+        return await run_blocking(self.read_versioned, max_age)
+
+    async def changes_since_async(
+        self, since: int, max_age: float | None = None
+    ) -> InterfaceChanges:
+        """Awaitable changes_since run on the netconf executor"""
+        return await run_blocking(self.changes_since, since, max_age)
+
+    async def stream_all_async(
+        self,
+        interface_filter: InterfaceFilter | None = None,
+        output: OutputFormat = OutputFormat.RAW,
+    ):
+        """Awaitable stream_all run on the netconf executor"""
+        return await run_blocking(self.stream_all, interface_filter, output)
+
+    async def create_async(
         self, interface_config: InterfaceConfig, dry_run: bool = False
     ) -> dict:
         """
         Create a single interface on the device
+        Writes to the same device that arrive together are committed
+        together by the commit scheduler, dry runs are answered directly
         Args:
             interface_config (InterfaceConfig): config of interface to add
         Returns:
             dict
         """
-        if self.check_exists(interface_config.interface_name):
-            raise CannotEdit(
-                f"Interface {interface_config.interface_name} already exists"
+        if dry_run:
+            return await run_blocking(
+                self.create_one, interface_config, dry_run
             )
-
-        with manager.connect(**self.device.manager_params) as ncclient_manager:
-            template_name = (
-                f"{self.device.device_type}_create_interface.xml.j2"
+        return await self.schedule_async(
+            PendingWrite(
+                "create", interface_config.interface_name, interface_config
             )
-            template = env.get_template(template_name)
-            rendered_config = template.render(**interface_config.__dict__)
-            if dry_run:
-                return rendered_config
-
-            return self.device.edit_config(ncclient_manager, rendered_config)
+        )
 
-    def delete(self, interface_name: str, dry_run: bool = False) -> dict:
+    async def delete_async(
+        self, interface_name: str, dry_run: bool = False
+    ) -> dict:
         """
         Delete a single interface from the device config
+        Writes to the same device that arrive together are committed
+        together by the commit scheduler, dry runs are answered directly
         Args:
-            interface_name (str): name of the interface to check
+            interface_name (str): name of the interface to delete
         Returns:
             dict
         """
-        if not self.check_exists(interface_name):
-            raise CannotEdit(f"Interface {interface_name} does not exist")
+        if dry_run:
+            return await run_blocking(self.delete_one, interface_name, dry_run)
+        return await self.schedule_async(
+            PendingWrite("delete", interface_name, interface_name)
+        )
+
+    @staticmethod
+    def write_lock(ncclient_manager: manager.Manager, dry_run: bool):
+        """
+        Lock the candidate datastore for a write, dry runs dont need it
+        Returns:
+            context manager
+        """
+        if dry_run:
+            return nullcontext()
+        return ncclient_manager.locked("candidate")
 
-        with manager.connect(**self.device.manager_params) as ncclient_manager:
-            template_name = (
-                f"{self.device.device_type}_delete_interface.xml.j2"
-            )
-            template = env.get_template(template_name)
-            rendered_config = template.render(interface_name=interface_name)
-            if dry_run:
-                return rendered_config
 
-            return self.device.edit_config(ncclient_manager, rendered_config)
+async def get_all_many(hosts: list, credential: str, concurrency: int):
+    """
+    Get config of all interfaces on many devices at once
+    Results are yielded as each device answers so one slow device does
+    not hold back the rest
+    Args:
+        hosts (list): hostnames of the devices to read
+        credential (str): type of credential to use
+        concurrency (int): most devices to read at the same time
+    Yields:
+        dict with host and either data or error
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(host: str) -> dict:
+        async with semaphore:
+            try:
+                device = await Device.load(host, credential)
+                data = await InterfaceManager(device).get_all_async()
+                return {"host": host, "data": data}
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning("Failed to read %s: %r", host, e)
+                ERRORS.inc(e.__class__.__name__)
+                return {
+                    "host": host,
+                    "error": f"Exception {e.__class__.__name__}: {e}",
+                }
+
+    tasks = [asyncio.create_task(fetch(host)) for host in dict.fromkeys(hosts)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,225 @@
+"""
+Writes to many interfaces on a device with one edit and one commit
+"""
+
+from app.backend import InterfaceManager, filter_records
+from app.device import run_blocking
+from app.models import (
+    BatchResult,
+    BatchStatus,
+    InterfaceDiff,
+    InterfaceField,
+    InterfaceFilter,
+)
+from app.parsers import parse_interfaces
+from app.registry import TemplateOperation
+
+
+class BatchInterfaceManager(InterfaceManager):
+    """Batch creates, deletes and reconciles of interfaces on a device"""
+
+    def create_many(
+        self, interface_configs: list, dry_run: bool = False
+    ) -> tuple:
+        """
+        Create several interfaces with one existence read, one edit and
+        one commit, interfaces that already exist are skipped
+        Args:
+            interface_configs (list): InterfaceConfig of each to add
+        Returns:
+            tuple (list of BatchResult, rendered config or None)
+        """
+        return self._apply_many(
+            [config.interface_name for config in interface_configs],
+            "create",
+            dry_run,
+            {config.interface_name: config for config in interface_configs},
+        )
+
+    def delete_many(
+        self, interface_names: list, dry_run: bool = False
+    ) -> tuple:
+        """
+        Delete several interfaces with one existence read, one edit and
+        one commit, interfaces that do not exist are skipped
+        Args:
+            interface_names (list): names of the interfaces to delete
+        Returns:
+            tuple (list of BatchResult, rendered config or None)
+        """
+        return self._apply_many(interface_names, "delete", dry_run)
+
+    def _apply_many(
+        self,
+        interface_names: list,
+        operation: str,
+        dry_run: bool,
+        interface_configs: dict | None = None,
+    ) -> tuple:
+        """
+        Shared flow for create_many and delete_many
+        Args:
+            interface_names (list): names in the order they were asked for
+            operation (str): create or delete
+            dry_run (bool): render but dont edit
+            interface_configs (dict): InterfaceConfig by name for create
+        Returns:
+            tuple (list of BatchResult, rendered config or None)
+        """
+        template = self.template(TemplateOperation(f"{operation}_interfaces"))
+        done = {
+            "create": BatchStatus.CREATED,
+            "delete": BatchStatus.DELETED,
+        }[operation]
+
+        with self.device.session() as ncclient_manager:
+            with self.write_lock(ncclient_manager, dry_run):
+                existing = self.fetch_names(
+                    ncclient_manager, list(dict.fromkeys(interface_names))
+                )
+                results, pending = [], []
+                for interface_name in interface_names:
+                    if interface_name in pending:
+                        status = BatchStatus.DUPLICATE
+                    elif operation == "create" and interface_name in existing:
+                        status = BatchStatus.EXISTS
+                    elif (
+                        operation == "delete"
+                        and interface_name not in existing
+                    ):
+                        status = BatchStatus.MISSING
+                    else:
+                        status = BatchStatus.PLANNED if dry_run else done
+                        pending.append(interface_name)
+                    results.append(
+                        BatchResult(
+                            interface_name=interface_name, status=status
+                        )
+                    )
+
+                if not pending:
+                    return results, None
+
+                rendered_config = template.render(
+                    interface_names=pending,
+                    interfaces=[
+                        interface_configs[name]
+                        for name in pending
+                        if interface_configs
+                    ],
+                )
+                if not dry_run:
+                    self.device.edit_config(ncclient_manager, rendered_config)
+                return results, rendered_config
+
+    def reconcile(
+        self, desired: list, name_prefix: str, dry_run: bool = False
+    ) -> tuple:
+        """
+        Make the interfaces whose names start with a prefix match a
+        desired set with one read, one edit and one commit
+        Interfaces with the prefix that are not desired are deleted and
+        desired ones that are missing or have another address are
+        created or updated, nothing is sent if nothing differs
+        Args:
+            desired (list): InterfaceConfig of every interface wanted
+            name_prefix (str): only interfaces with it are managed
+            dry_run (bool): work out the diff but dont edit
+        Returns:
+            tuple (InterfaceDiff, list of rendered configs)
+        """
+        interface_filter = InterfaceFilter(
+            name_prefix=name_prefix, fields=(InterfaceField.IPV4_NETWORK,)
+        )
+        with self.device.session() as ncclient_manager:
+            with self.write_lock(ncclient_manager, dry_run):
+                data = self.device.get_config_element(
+                    ncclient_manager, self.render_filter(interface_filter)
+                )
+                with self.device.phase("convert"):
+                    current = {
+                        record.interface_name: record
+                        for record in filter_records(
+                            parse_interfaces(data), interface_filter
+                        )
+                    }
+                diff = self.diff(current, desired)
+                rendered_configs = self.render_diff(diff, desired)
+                if rendered_configs and not dry_run:
+                    self.device.edit_config(
+                        ncclient_manager, *rendered_configs
+                    )
+        return diff, rendered_configs
+
+    @staticmethod
+    def diff(current: dict, desired: list) -> InterfaceDiff:
+        """
+        Compare the interfaces on a device with the desired ones
+        Args:
+            current (dict): InterfaceRecord on the device by name
+            desired (list): InterfaceConfig of every interface wanted
+        Returns:
+            InterfaceDiff
+        """
+        diff = InterfaceDiff()
+        for config in desired:
+            record = current.get(config.interface_name)
+            if record is None:
+                diff.added.append(config.interface_name)
+            elif (record.address, record.netmask) != (
+                config.address,
+                config.netmask,
+            ):
+                diff.changed.append(config.interface_name)
+            else:
+                diff.unchanged.append(config.interface_name)
+        wanted = {config.interface_name for config in desired}
+        diff.deleted = [name for name in current if name not in wanted]
+        return diff
+
+    def render_diff(self, diff: InterfaceDiff, desired: list) -> list:
+        """
+        Render the edits for a diff, creates also update in place as the
+        edit merges into the existing config
+        Returns:
+            list of rendered configs, empty when there is nothing to do
+        """
+        rendered_configs = []
+        upserts = set(diff.added) | set(diff.changed)
+        if upserts:
+            rendered_configs.append(
+                self.template(TemplateOperation.CREATE_INTERFACES).render(
+                    interfaces=[
+                        config
+                        for config in desired
+                        if config.interface_name in upserts
+                    ]
+                )
+            )
+        if diff.deleted:
+            rendered_configs.append(
+                self.template(TemplateOperation.DELETE_INTERFACES).render(
+                    interface_names=diff.deleted
+                )
+            )
+        return rendered_configs
+
+    async def create_many_async(
+        self, interface_configs: list, dry_run: bool = False
+    ) -> tuple:
+        """Awaitable create_many run on the netconf executor"""
+        return await run_blocking(self.create_many, interface_configs, dry_run)
+
+    async def delete_many_async(
+        self, interface_names: list, dry_run: bool = False
+    ) -> tuple:
+        """Awaitable delete_many run on the netconf executor"""
+        return await run_blocking(self.delete_many, interface_names, dry_run)
+
+    async def reconcile_async(
+        self, desired: list, name_prefix: str, dry_run: bool = False
+    ) -> tuple:
+        """Awaitable reconcile run on the netconf executor"""
+        return await run_blocking(
+            self.reconcile, desired, name_prefix, dry_run
+        )
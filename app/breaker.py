@@ -0,0 +1,199 @@
+"""
+Circuit breakers around connecting to devices
+
+Connecting to a host that is down holds a worker thread for the whole
+connect timeout. After BREAKER_FAILURES connects to a host fail in a
+row its breaker opens and connects are refused straight away with
+CircuitOpen, which the endpoints answer with 503 and Retry-After. Once
+BREAKER_RESET_TIMEOUT has passed the breaker is half open and lets a
+single connect through as a probe, if it works the breaker closes and
+if it fails the breaker opens again for twice as long, up to
+BREAKER_MAX_RESET_TIMEOUT
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from app import deadlines
+from app.exceptions import CircuitOpen
+from app.metrics import BREAKER_TRANSITIONS
+from app.models import BreakerState, BreakerStatus
+
+
+@dataclass
+class Breaker:
+    """
+    Consecutive connect failures to one host and what they led to
+    """
+
+    state: BreakerState = BreakerState.CLOSED
+    failures: int = 0
+    opened_at: float = 0
+    reset_timeout: float = 0
+    probing: bool = False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through"""
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+
+class CircuitBreakers:
+    """
+    A breaker per host, only hosts that have failed since their last
+    successful connect have one
+    """
+
+    def __init__(
+        self,
+        failures: int = 3,
+        reset_timeout: float = 30,
+        max_reset_timeout: float = 300,
+    ):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def check(self, host: str) -> None:
+        """
+        Fail fast if a connect to the host would be refused, without
+        claiming the probe of a half open breaker
+        Raises:
+            CircuitOpen
+        """
+        if host not in self.breakers:
+            return
+        with self._lock:
+            breaker = self.breakers.get(host)
+            if breaker is not None:
+                self._refuse(host, breaker)
+
+    def call(self, host: str, connect, /, *args, **kwargs):
+        """
+        Connect through the host's breaker
+        Args:
+            host (str): hostname of the device
+            connect (callable): opens the session
+        Returns:
+            whatever connect returns
+        Raises:
+            CircuitOpen if the breaker refuses, otherwise whatever
+            connect raised
+        """
+        if host in self.breakers:
+            with self._lock:
+                breaker = self.breakers.get(host)
+                if breaker is not None:
+                    self._refuse(host, breaker)
+                    if breaker.state == BreakerState.OPEN:
+                        self._transition(host, breaker, BreakerState.HALF_OPEN)
+                    if breaker.state == BreakerState.HALF_OPEN:
+                        breaker.probing = True
+        try:
+            result = connect(*args, **kwargs)
+        except Exception:
+            # running out of the request's deadline says nothing of the host
+            if deadlines.expired():
+                self.abandon(host)
+            else:
+                self.failure(host)
+            raise
+        self.success(host)
+        return result
+
+    def _refuse(self, host: str, breaker: Breaker) -> None:
+        """Raise if the breaker is open or its probe is out, lock held"""
+        if breaker.state == BreakerState.OPEN and breaker.retry_after() > 0:
+            raise CircuitOpen(
+                f"Circuit open for {host} after {breaker.failures} failed "
+                "connects",
+                breaker.retry_after(),
+            )
+        if breaker.state == BreakerState.HALF_OPEN and breaker.probing:
+            raise CircuitOpen(f"Circuit half open for {host}, probing", 1)
+
+    def success(self, host: str) -> None:
+        """Close the host's breaker after a successful connect"""
+        if host not in self.breakers:
+            return
+        with self._lock:
+            breaker = self.breakers.pop(host, None)
+            if breaker is not None and breaker.state != BreakerState.CLOSED:
+                self._transition(host, breaker, BreakerState.CLOSED)
+
+    def abandon(self, host: str) -> None:
+        """Let another probe through after one that was cut short"""
+        with self._lock:
+            breaker = self.breakers.get(host)
+            if breaker is not None:
+                breaker.probing = False
+
+    def failure(self, host: str) -> None:
+        """Count a failed connect, opening the breaker if need be"""
+        with self._lock:
+            breaker = self.breakers.setdefault(host, Breaker())
+            breaker.failures += 1
+            breaker.probing = False
+            if breaker.state == BreakerState.HALF_OPEN:
+                breaker.reset_timeout = min(
+                    breaker.reset_timeout * 2, self.max_reset_timeout
+                )
+            elif (
+                breaker.state == BreakerState.CLOSED
+                and breaker.failures >= self.failures
+            ):
+                breaker.reset_timeout = self.reset_timeout
+            else:
+                return
+            breaker.opened_at = time.monotonic()
+            self._transition(host, breaker, BreakerState.OPEN)
+
+    @staticmethod
+    def _transition(host: str, breaker: Breaker, state: BreakerState):
+        """Move a breaker to a state and count it, lock held"""
+        breaker.state = state
+        BREAKER_TRANSITIONS.inc(host, state.value)
+
+    def reset(self, host: str) -> bool:
+        """
+        Forget a host's failures and close its breaker
+        Returns:
+            boolean if the host had a breaker
+        """
+        with self._lock:
+            breaker = self.breakers.pop(host, None)
+            if breaker is None:
+                return False
+            if breaker.state != BreakerState.CLOSED:
+                self._transition(host, breaker, BreakerState.CLOSED)
+            return True
+
+    def statuses(self) -> list:
+        """
+        Returns:
+            list of BreakerStatus for every host with failures
+        """
+        with self._lock:
+            return [
+                BreakerStatus(
+                    host=host,
+                    state=breaker.state,
+                    failures=breaker.failures,
+                    retry_after=(
+                        breaker.retry_after()
+                        if breaker.state == BreakerState.OPEN
+                        else None
+                    ),
+                )
+                for host, breaker in self.breakers.items()
+            ]
+
+
+circuit_breakers = CircuitBreakers(
+    failures=int(os.getenv("BREAKER_FAILURES", "3")),
+    reset_timeout=float(os.getenv("BREAKER_RESET_TIMEOUT", "30")),
+    max_reset_timeout=float(os.getenv("BREAKER_MAX_RESET_TIMEOUT", "300")),
+)
@@ -0,0 +1,232 @@
+"""
+In-process caches used in front of slower stores and devices
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cached value and when it was stored
+    """
+
+    value: Any
+    stored_at: float = field(default_factory=time.monotonic)
+    ttl: float | None = None
+
+    @property
+    def age(self) -> float:
+        """Seconds since the value was stored"""
+        return time.monotonic() - self.stored_at
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries expire after ttl seconds
+
+    Lookups and inserts are O(1), once maxsize is reached the least
+    recently used entry is dropped
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_entry(self, key, max_age: float | None = None) -> CacheEntry:
+        """
+        Get the entry for a key if it is fresh enough
+        Args:
+            key: cache key
+            max_age (float): optional tighter limit than the ttl
+        Returns:
+            CacheEntry or None on a miss
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            ttl = self.ttl if entry.ttl is None else entry.ttl
+            if entry.age > ttl:
+                del self._data[key]
+                return None
+            if max_age is not None and entry.age > max_age:
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def get(self, key, default=None):
+        """
+        Get the value for a key if it has not expired
+        Returns:
+            cached value or default on a miss
+        """
+        entry = self.get_entry(key)
+        return default if entry is None else entry.value
+
+    def set(
+        self, key, value, age: float = 0, ttl: float | None = None
+    ) -> CacheEntry:
+        """
+        Store a value, evicting the least recently used entry if full
+        Args:
+            key: cache key
+            value: what to cache
+            age (float): seconds since the value was read elsewhere
+            ttl (float): optional ttl for this entry instead of the
+                cache wide one
+        Returns:
+            CacheEntry
+        """
+        entry = CacheEntry(value, time.monotonic() - age, ttl)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+    def invalidate(self, key) -> None:
+        """Drop a key if it is cached"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+
+@dataclass(frozen=True)
+class CachedRead:
+    """
+    Data read from a device and the ETag for it
+    """
+
+    data: Any
+    etag: str
+
+
+def make_etag(data) -> str:
+    """
+    Strong ETag for json serialisable data
+    Returns:
+        quoted sha1 of the data
+    """
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha1(encoded.encode()).hexdigest()}"'
+
+
+class ReadCache:
+    """
+    Reads from devices cached per host
+
+    Each host has a generation that is bumped when we write to it, reads
+    are stored under the generation they started in so a write that
+    lands mid read can not leave stale data behind. With a shared cache
+    the generations live there so a write in any worker retires reads
+    cached by every worker, and misses here are looked up there before
+    going to the device. Hosts that tell us when their config changes
+    are watched and their reads kept for longer
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 10, shared=None):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+        self.watched = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def watch(self, host: str, ttl: float) -> None:
+        """
+        Keep reads of a host for ttl seconds, while we are told about
+        every change to its config
+        """
+        self.watched[host] = ttl
+
+    def unwatch(self, host: str) -> None:
+        """Go back to the normal ttl for a host and drop its reads"""
+        if self.watched.pop(host, None) is not None:
+            self.invalidate(host)
+
+    def generation(self, host: str) -> int:
+        """Current generation of a host"""
+        if self.shared is not None:
+            return self.shared.generation(host)
+        return self._generations.get(host, 0)
+
+    def get(self, host: str, key: tuple, max_age: float | None = None):
+        """
+        Get a cached read for the host
+        Args:
+            host (str): hostname of the device
+            key (tuple): what was read
+            max_age (float): optional tighter limit than the ttl
+        Returns:
+            CachedRead or None on a miss
+        """
+        generation = self.generation(host)
+        entry = self.entries.get_entry((host, generation, key), max_age)
+        if entry is not None:
+            return entry.value
+        if self.shared is None or self.entries.ttl <= 0:
+            return None
+
+        limit = self.entries.ttl if max_age is None else max_age
+        shared = self.shared.get(
+            host, generation, repr(key), min(limit, self.entries.ttl)
+        )
+        if shared is None:
+            return None
+        data, etag, age = shared
+        cached = CachedRead(data, etag)
+        self.entries.set((host, generation, key), cached, age)
+        return cached
+
+    def set(
+        self, host: str, key: tuple, data, generation: int | None = None
+    ) -> CachedRead:
+        """
+        Cache a read for the host
+        Args:
+            host (str): hostname of the device
+            key (tuple): what was read
+            data: what the read returned
+            generation (int): generation when the read started
+        Returns:
+            CachedRead
+        """
+        if generation is None:
+            generation = self.generation(host)
+        cached = CachedRead(data, make_etag(data))
+        ttl = self.watched.get(host, self.entries.ttl)
+        if ttl > 0:
+            self.entries.set((host, generation, key), cached, ttl=ttl)
+        if self.shared is not None and self.entries.ttl > 0:
+            self.shared.set(host, generation, repr(key), data, cached.etag)
+        return cached
+
+    def invalidate(self, host: str) -> None:
+        """Drop every cached read for the host"""
+        if self.shared is not None:
+            self.shared.bump(host)
+            return
+        with self._lock:
+            self._generations[host] = self.generation(host) + 1
+
+    def clear(self) -> None:
+        """Drop every cached read"""
+        self.entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
@@ -0,0 +1,98 @@
+"""
+Deadlines for requests
+
+A request can give itself a budget in seconds with the
+X-Request-Timeout header or the timeout parameter. The deadline is held
+in a context variable, which run_blocking copies into the netconf
+executor, and is checked before each phase of the work: discovery,
+taking a session from the pool, each RPC and parsing. Connects and RPCs
+get no more than what is left of it as their timeout, so a request stops
+once nobody is waiting for its answer rather than finishing it anyway
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from app.exceptions import DeadlineExceeded
+
+# time.monotonic() the current request has to be answered by
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """
+    Returns:
+        seconds left before the deadline or None without one
+    """
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    """True once the current deadline has passed"""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(stage: str) -> None:
+    """
+    Stop the work if the deadline has passed
+    Args:
+        stage (str): what we were about to do, for the message
+    Raises:
+        DeadlineExceeded
+    """
+    if expired():
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+def timeout(default: float, stage: str) -> float:
+    """
+    Timeout for a blocking call, capped by what is left of the deadline
+    Args:
+        default (float): timeout without a deadline
+        stage (str): what the call is, for the message
+    Raises:
+        DeadlineExceeded if there is nothing left
+    """
+    check(stage)
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def connect_params(manager_params: dict) -> dict:
+    """
+    Params for manager.connect with the timeout capped by the deadline
+    Raises:
+        DeadlineExceeded if there is nothing left
+    """
+    if current_deadline.get() is None or "timeout" not in manager_params:
+        return manager_params
+    return {
+        **manager_params,
+        "timeout": timeout(manager_params["timeout"], "connect"),
+    }
+
+
+@contextmanager
+def use(deadline: float | None):
+    """
+    Run the block under a deadline, e.g. one a queued write came with
+    Args:
+        deadline (float): time.monotonic() to finish by or None
+    """
+    token = current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def within(seconds: float):
+    """
+    Run the block under a deadline seconds from now
+    Returns:
+        context manager
+    """
+    return use(time.monotonic() + seconds)
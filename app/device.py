@@ -0,0 +1,395 @@
+"""
+Devices and how to connect to, read from and edit them via NETCONF
+"""
+
+import asyncio
+import contextvars
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+
+from lxml import etree
+from ncclient import manager
+
+from app import deadlines
+from app.breaker import circuit_breakers
+from app.cache import ReadCache
+from app.exceptions import (
+    CannotEdit,
+    InvalidCredential,
+    InvalidDeviceType,
+    UnknownDevice,
+)
+from app.models import DeviceCapability, OutputFormat
+from app.parsers import InterfaceRecord, element_to_dict, parse_xml
+from app.metrics import SESSIONS_OPENED, phase
+from app.pool import session_pool
+from app.profiling import active_profile
+from app.store import DeviceInfo, device_store, shared_cache
+
+# ncclient is blocking so device work runs here rather than in the
+# event loop or starlette's shared threadpool, a few slow devices can
+# then only queue work for other devices not stall the whole app
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("NETCONF_WORKERS", "64")),
+    thread_name_prefix="netconf",
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run blocking ncclient work on the netconf executor
+    Args:
+        func (callable): blocking function to run
+        *args, **kwargs: passed to func
+    Returns:
+        whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    profile = active_profile.get()
+    if profile is not None:
+        return await loop.run_in_executor(
+            executor, partial(context.run, profile.run, func, *args, **kwargs)
+        )
+    return await loop.run_in_executor(
+        executor, partial(context.run, func, *args, **kwargs)
+    )
+
+
+def get_credentials(credential: str) -> tuple:
+    """
+    Get credentials from environment base on a type
+    Args:
+        credential (str): type of credential to retreive
+    Returns:
+        tuple (username, password)
+    """
+    try:
+        return (
+            os.environ[f"{credential.upper()}_USERNAME"],
+            os.environ[f"{credential.upper()}_PASSWORD"],
+        )
+    except KeyError as e:
+        raise InvalidCredential(credential) from e
+
+
+@dataclass
+class ConnectionManager:
+    """
+    Class to manage how to connect to the device via ncclient
+    """
+
+    timeout: int = 30
+    hostkey_verify: bool = False
+    look_for_keys: bool = False
+    port: int = field(
+        default_factory=lambda: int(os.getenv("NETCONF_PORT", "830"))
+    )
+
+    def format_params(
+        self, host: str, device_type: str, username: str, password: str
+    ) -> dict:
+        """Format the manager params dict for ncclient manager.connect"""
+        return {
+            "host": host,
+            "port": self.port,
+            "username": username,
+            "password": password,
+            "timeout": self.timeout,
+            "hostkey_verify": self.hostkey_verify,
+            "look_for_keys": self.look_for_keys,
+            "device_params": {"name": device_type},
+        }
+
+
+read_cache = ReadCache(
+    maxsize=int(os.getenv("READ_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("READ_CACHE_TTL", "10")),
+    shared=shared_cache,
+)
+
+
+@dataclass
+class Device:
+    """
+    A class to manage parameters to connect to a device and
+    how to get/edit the config
+    """
+
+    host: str
+    credential: str
+    offline: bool = False
+
+    def __post_init__(self):
+        if self.offline:
+            self.device_type = self.fetch_device_type()
+            if self.device_type is None:
+                raise UnknownDevice(f"{self.host} has not been discovered")
+            self.manager_params = None
+            return
+
+        connection_manager = ConnectionManager()
+        username, password = get_credentials(self.credential)
+        self.device_type = self.get_device_type(
+            connection_manager, username, password
+        )
+        logging.info(
+            "Detected %s as device type: %s", self.host, self.device_type
+        )
+        self.manager_params = connection_manager.format_params(
+            self.host, self.device_type, username, password
+        )
+
+    @classmethod
+    async def load(
+        cls, host: str, credential: str, offline: bool = False
+    ) -> "Device":
+        """
+        Build a Device without blocking the event loop as working out
+        the device type can need a NETCONF session
+        Args:
+            host (str): hostname of the device
+            credential (str): type of credential to use
+            offline (bool): only use the stored device type, the device
+                can then not open sessions
+        Returns:
+            Device
+        """
+        return await run_blocking(cls, host, credential, offline)
+
+    def phase(self, name: str):
+        """
+        Time a phase of the current request against this device
+        Raises:
+            DeadlineExceeded if the request is out of time
+        """
+        deadlines.check(f"{name} on {self.host}")
+        return phase(name, self.host, self.device_type)
+
+    @contextmanager
+    def rpc(self, ncclient_manager: manager.Manager, name: str):
+        """
+        Time an RPC, giving it what is left of the request deadline as
+        its timeout. Outside of this lock, unlock and discard-changes
+        keep the full timeout so a write cut short is still cleaned up
+        Args:
+            ncclient_manager (manager.Manager): session the RPC is sent on
+            name (str): phase name of the RPC
+        """
+        default = self.manager_params["timeout"]
+        ncclient_manager.timeout = deadlines.timeout(
+            default, f"{name} on {self.host}"
+        )
+        try:
+            with self.phase(name):
+                yield
+        finally:
+            ncclient_manager.timeout = default
+
+    @contextmanager
+    def session(self):
+        """
+        Borrow a NETCONF session to the device from the session pool
+        Yields:
+            manager.Manager
+        """
+        if self.offline:
+            raise CannotEdit(f"{self.host} is offline")
+        with session_pool.session(
+            (self.host, self.credential), self.manager_params
+        ) as ncclient_manager:
+            yield ncclient_manager
+
+    def supports(self, capability: str) -> bool:
+        """
+        Check the device advertised a capability when it was discovered
+        Args:
+            capability (str): e.g. :xpath or a full capability URN
+        Returns:
+            boolean
+        """
+        device_info = device_store.get(self.host)
+        if device_info is None:
+            return False
+        if capability.startswith(":"):
+            capability = f"urn:ietf:params:netconf:capability{capability}"
+        return any(
+            server_capability.startswith(capability)
+            for server_capability in device_info.capabilities
+        )
+
+    def save_device_type(
+        self, device_type: str, capabilities: tuple = ()
+    ) -> None:
+        """
+        Store the device type so we dont need determine it again
+        Args:
+            device_type (str): device type to store with self.host
+            capabilities (tuple): capabilities the device advertised
+        """
+        device_store.save(DeviceInfo(self.host, device_type, capabilities))
+
+    def fetch_device_type(self) -> str | None:
+        """
+        Fetch device type from the store if we have discovered it
+        Returns:
+            device type (str) or None
+        """
+        with phase("store", self.host):
+            device_info = device_store.get(self.host)
+        return None if device_info is None else device_info.device_type
+
+    def get_device_type(
+        self,
+        connection_manager: ConnectionManager,
+        username: str,
+        password: str,
+    ) -> str:
+        """
+        Determine the ncclient device type from the NETCONF capabilities
+        Args:
+            connection_manager (ConnectionManager): used for manager params
+            username (str): to connect to device
+            password (str): to connect to device
+        Returns:
+            device_type (str): ncclient device type
+        Raises:
+            InvalidDeviceType if we can't get a device type
+        """
+        device_type = self.fetch_device_type()
+        if device_type is not None:
+            return device_type
+
+        default_manager_params = connection_manager.format_params(
+            self.host, "default", username, password
+        )
+        device_info = self.discover(self.host, default_manager_params)
+        self.save_device_type(
+            device_info.device_type, device_info.capabilities
+        )
+        return device_info.device_type
+
+    @staticmethod
+    def discover(host: str, manager_params: dict) -> DeviceInfo:
+        """
+        Open a session with the default device handler and work out the
+        device type from the capabilities, nothing is stored
+        Args:
+            host (str): hostname of the device
+            manager_params (dict): params for manager.connect
+        Returns:
+            DeviceInfo
+        Raises:
+            InvalidDeviceType if we can't get a device type
+        """
+        with phase("discovery", host):
+            with circuit_breakers.call(
+                host,
+                manager.connect,
+                **deadlines.connect_params(manager_params),
+            ) as mgr:
+                server_capabilities = tuple(mgr.server_capabilities)
+        SESSIONS_OPENED.inc(host)
+
+        for capability in DeviceCapability:
+            if any(
+                capability.value in server_capability
+                for server_capability in server_capabilities
+            ):
+                return DeviceInfo(
+                    host, capability.name.lower(), server_capabilities
+                )
+
+        raise InvalidDeviceType("Could not determine a device type for host")
+
+    def get_config(
+        self, ncclient_manager: manager.Manager, rendered_config: str
+    ) -> dict:
+        """
+        Get the running config with a filter
+        returns a dict from the xml data
+        """
+        data = self.get_config_element(ncclient_manager, rendered_config)
+        with self.phase("convert"):
+            return element_to_dict(data)
+
+    def get_config_element(
+        self, ncclient_manager: manager.Manager, rendered_config: str
+    ) -> etree._Element:
+        """
+        Get the running config with a filter
+        returns the data element parsed with lxml
+        """
+        xml_data = self.get_config_xml(ncclient_manager, rendered_config)
+        with self.phase("parse"):
+            return parse_xml(xml_data)
+
+    def get_config_xml(
+        self, ncclient_manager: manager.Manager, rendered_config: str
+    ) -> str:
+        """
+        Get the running config with a filter
+        returns the xml data as a string
+        """
+        with self.rpc(ncclient_manager, "get_config"):
+            response = ncclient_manager.get_config(
+                source="running", filter=rendered_config
+            )
+            return response.data_xml
+
+    @staticmethod
+    def iter_config(
+        xml_data: str, tag: str, output: OutputFormat = OutputFormat.RAW
+    ):
+        """
+        Parse the xml data one element at a time, each element is freed
+        once yielded so we never hold the whole tree as dicts
+        Args:
+            xml_data (str): xml data from get_config_xml
+            tag (str): namespaced tag of the elements to yield
+            output (OutputFormat): raw dicts or InterfaceRecord
+        Yields:
+            dict of each element in the same shape as get_config or
+            InterfaceRecord
+        """
+        for _, element in etree.iterparse(
+            io.BytesIO(xml_data.encode()), tag=tag
+        ):
+            if output == OutputFormat.RECORDS:
+                yield InterfaceRecord.from_element(element)
+            else:
+                _, data = element_to_dict(element).popitem()
+                for key in [key for key in data if key.startswith("@xmlns")]:
+                    del data[key]
+                yield data
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def edit_config(
+        self, ncclient_manager: manager.Manager, *rendered_configs: str
+    ) -> None:
+        """
+        Edit the candidate config with each rendered config in turn and
+        commit them together
+        If either fails the candidate is discarded so we dont leave
+        half applied changes behind for the next writer
+        """
+        try:
+            with self.rpc(ncclient_manager, "edit_config"):
+                for rendered_config in rendered_configs:
+                    ncclient_manager.edit_config(
+                        target="candidate", config=rendered_config
+                    )
+            with self.rpc(ncclient_manager, "commit"):
+                ncclient_manager.commit()
+        except Exception:
+            ncclient_manager.discard_changes()
+            raise
+        finally:
+            read_cache.invalidate(self.host)
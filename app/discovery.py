@@ -0,0 +1,264 @@
+"""
+Capability discovery for many devices at once from an inventory
+
+An inventory is a JSON list where each entry is a hostname or an object
+with host and credential, or a text file with one "host [credential]"
+per line. Hosts are discovered concurrently up to a cap and what we
+find is saved in one transaction. Discover ahead of time with
+    python -m app.discovery inventory.json --concurrency 50
+or set NETCONF_INVENTORY to discover, and with NETCONF_PREWARM open a
+pooled session to each host, before the app starts taking requests
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from collections import Counter
+
+from app.device import (
+    ConnectionManager,
+    Device,
+    get_credentials,
+    run_blocking,
+)
+from app.exceptions import InvalidData
+from app.metrics import ERRORS
+from app.models import (
+    DiscoveryResult,
+    DiscoveryStatus,
+    InventoryEntry,
+)
+from app.store import device_store
+
+INVENTORY = os.getenv("NETCONF_INVENTORY", "")
+PREWARM = os.getenv("NETCONF_PREWARM", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+DISCOVERY_CONCURRENCY = int(os.getenv("DISCOVERY_CONCURRENCY", "50"))
+
+
+def parse_inventory(text: str) -> list:
+    """
+    Parse inventory file contents, JSON if it looks like JSON otherwise
+    one "host [credential]" per line with # comments
+    Args:
+        text (str): contents of the inventory file
+    Returns:
+        list of InventoryEntry
+    Raises:
+        InvalidData if the inventory can't be parsed
+    """
+    try:
+        if text.lstrip().startswith("["):
+            return [
+                (
+                    InventoryEntry(host=entry)
+                    if isinstance(entry, str)
+                    else InventoryEntry(**entry)
+                )
+                for entry in json.loads(text)
+            ]
+        entries = []
+        for line in text.splitlines():
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) > 2:
+                raise ValueError(f"Too many fields in {line!r}")
+            entries.append(
+                InventoryEntry(host=fields[0], credential=fields[1].upper())
+                if len(fields) == 2
+                else InventoryEntry(host=fields[0])
+            )
+        return entries
+    except (ValueError, TypeError) as e:
+        raise InvalidData(f"Invalid inventory: {e}") from e
+
+
+def load_inventory(path: str) -> list:
+    """
+    Read and parse an inventory file
+    Args:
+        path (str): path to the inventory
+    Returns:
+        list of InventoryEntry
+    """
+    with open(path, encoding="utf-8") as inventory_file:
+        return parse_inventory(inventory_file.read())
+
+
+def warm_session(device: Device) -> None:
+    """Open a pooled session to the device and leave it idle in the pool"""
+    with device.session():
+        pass
+
+
+async def discover_many(
+    inventory: list,
+    concurrency: int,
+    refresh: bool = False,
+    prewarm: bool = False,
+) -> list:
+    """
+    Discover the device type of every host in an inventory
+    Hosts already in the store are skipped unless refresh is set, what
+    is discovered is saved at the end in one transaction
+    Args:
+        inventory (list): InventoryEntry for each host, later entries
+            for the same host win
+        concurrency (int): most hosts to connect to at the same time
+        refresh (bool): discover hosts we already know again
+        prewarm (bool): open a pooled session to each host afterwards
+    Returns:
+        list of DiscoveryResult in inventory order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    connection_manager = ConnectionManager()
+    entries = {entry.host: entry for entry in inventory}
+
+    async def discover(entry: InventoryEntry) -> tuple:
+        async with semaphore:
+            try:
+                known = (
+                    None
+                    if refresh
+                    else await run_blocking(device_store.get, entry.host)
+                )
+                if known is not None:
+                    return (
+                        DiscoveryResult(
+                            host=entry.host,
+                            status=DiscoveryStatus.KNOWN,
+                            device_type=known.device_type,
+                        ),
+                        None,
+                    )
+                username, password = get_credentials(entry.credential.value)
+                device_info = await run_blocking(
+                    Device.discover,
+                    entry.host,
+                    connection_manager.format_params(
+                        entry.host, "default", username, password
+                    ),
+                )
+                return (
+                    DiscoveryResult(
+                        host=entry.host,
+                        status=DiscoveryStatus.DISCOVERED,
+                        device_type=device_info.device_type,
+                    ),
+                    device_info,
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning("Failed to discover %s: %r", entry.host, e)
+                ERRORS.inc(e.__class__.__name__)
+                return (
+                    DiscoveryResult(
+                        host=entry.host,
+                        status=DiscoveryStatus.FAILED,
+                        error=f"Exception {e.__class__.__name__}: {e}",
+                    ),
+                    None,
+                )
+
+    async def warm(result: DiscoveryResult) -> None:
+        async with semaphore:
+            try:
+                device = await Device.load(
+                    result.host, entries[result.host].credential.value
+                )
+                await run_blocking(warm_session, device)
+                result.warmed = True
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning("Failed to warm %s: %r", result.host, e)
+                ERRORS.inc(e.__class__.__name__)
+                result.error = f"Exception {e.__class__.__name__}: {e}"
+
+    discovered = await asyncio.gather(
+        *(discover(entry) for entry in entries.values())
+    )
+    device_infos = [info for _, info in discovered if info is not None]
+    if device_infos:
+        await run_blocking(device_store.save_many, device_infos)
+
+    results = [result for result, _ in discovered]
+    if prewarm:
+        await asyncio.gather(
+            *(
+                warm(result)
+                for result in results
+                if result.status != DiscoveryStatus.FAILED
+            )
+        )
+    return results
+
+
+def summarise(results: list) -> dict:
+    """Count results by status"""
+    counts = Counter(result.status.value for result in results)
+    return {status.value: counts[status.value] for status in DiscoveryStatus}
+
+
+async def warm_up() -> list:
+    """
+    Discover the NETCONF_INVENTORY hosts and, with NETCONF_PREWARM, open
+    a pooled session to each, called before the app takes requests
+    Returns:
+        list of DiscoveryResult, empty without an inventory
+    """
+    if not INVENTORY:
+        return []
+    results = await discover_many(
+        load_inventory(INVENTORY), DISCOVERY_CONCURRENCY, prewarm=PREWARM
+    )
+    logging.info("Discovered inventory %s: %s", INVENTORY, summarise(results))
+    return results
+
+
+def main() -> None:
+    """Discover an inventory from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Discover device types for every host in an inventory"
+    )
+    parser.add_argument("inventory", help="JSON or text inventory file")
+    parser.add_argument(
+        "--concurrency", type=int, default=DISCOVERY_CONCURRENCY
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="discover hosts that are already stored again",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        discover_many(
+            load_inventory(args.inventory),
+            args.concurrency,
+            refresh=args.refresh,
+        )
+    )
+    if args.json:
+        print(
+            json.dumps([result.model_dump(mode="json") for result in results])
+        )
+    else:
+        for result in results:
+            print(
+                f"{result.host:<40}{result.status.value:<12}"
+                f"{result.device_type or result.error}"
+            )
+        print(summarise(results))
+    sys.exit(
+        1 if any(r.status == DiscoveryStatus.FAILED for r in results) else 0
+    )
+
+
+if __name__ == "__main__":
+    main()
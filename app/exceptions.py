@@ -9,6 +9,12 @@ class CannotEdit(Exception):
     """
 
 
+class DeadlineExceeded(Exception):
+    """
+    Use when a request has run out of the time it was given
+    """
+
+
 class InvalidCredential(Exception):
     """
     Use when we cannot get credentials from the environment
@@ -25,3 +31,37 @@ class InvalidDeviceType(Exception):
     """
     Use when we cant determine the device type
     """
+
+
+class SessionPoolExhausted(Exception):
+    """
+    Use when every pooled session to a device is busy
+    """
+
+
+class CircuitOpen(SessionPoolExhausted):
+    """
+    Use when a host keeps failing to connect so we dont try for a while
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MissingTemplate(Exception):
+    """
+    Use when a device type is missing a template for an operation
+    """
+
+
+class UnknownDevice(Exception):
+    """
+    Use when a device has to have been discovered already
+    """
+
+
+class UnknownVersion(Exception):
+    """
+    Use when a config version is not one we hold
+    """
@@ -0,0 +1,166 @@
+"""
+Run device writes in the background
+
+A write sent with background=true is saved as a queued job and answered
+with 202 straight away. A fixed number of workers on the event loop
+take jobs off the queue and run the same code the endpoint would have,
+saving the status code and body it would have answered with. Jobs live
+in SQLite so GET /jobs/{id} keeps working across a restart, jobs still
+queued when the app stopped are run when it starts again
+
+Worker processes share the database, a job is claimed atomically by the
+one that runs it and records its pid, so a process starting up only
+fails running jobs whose owner has gone
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.device import run_blocking
+from app.metrics import ERRORS, current_operation
+from app.models import Job, JobStatus
+from app.store import job_store
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "16"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))
+
+
+def owner_alive(pid: int | None) -> bool:
+    """
+    Whether the worker process that claimed a job is still running, we
+    have only just started so a job claimed under our pid was not ours
+    """
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobRunner:
+    """
+    Queue of job ids and the workers that run them
+    """
+
+    def __init__(self, store, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.handlers = {}
+        self.queue = None
+        self.tasks = []
+
+    @property
+    def running(self) -> bool:
+        """True once start has been called"""
+        return bool(self.tasks)
+
+    async def start(self, handlers: dict) -> None:
+        """
+        Start the workers, running jobs whose worker process has gone
+        are failed as we cant know how far they got and queued jobs are
+        picked up again
+        Args:
+            handlers (dict): operation name to an async callable taking
+                the job params and returning the response body
+        """
+        self.handlers = handlers
+        self.queue = asyncio.Queue()
+        await run_blocking(self.store.purge, time.time() - JOB_RETENTION)
+        for job in await run_blocking(
+            self.store.with_status, JobStatus.RUNNING
+        ):
+            if owner_alive(job.owner):
+                continue
+            self.finish(
+                job, 500, {"detail": "Interrupted by a restart"}, failed=True
+            )
+            await run_blocking(self.store.save, job)
+        for job in await run_blocking(
+            self.store.with_status, JobStatus.QUEUED
+        ):
+            self.queue.put_nowait(job.job_id)
+        self.tasks = [
+            asyncio.create_task(self.work()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers, a job cut short stays running in the store"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def submit(self, operation: str, params: dict) -> Job:
+        """
+        Save a job and queue it
+        Args:
+            operation (str): name of a handler
+            params (dict): JSON serialisable arguments for the handler
+        Returns:
+            Job as queued
+        """
+        job = Job(
+            job_id=uuid.uuid4().hex,
+            operation=operation,
+            params=params,
+            created_at=time.time(),
+        )
+        await run_blocking(self.store.save, job)
+        self.queue.put_nowait(job.job_id)
+        return job
+
+    async def work(self) -> None:
+        """Run queued jobs one at a time until cancelled"""
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self.run(job_id)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception("Job %s could not be saved", job_id)
+
+    async def run(self, job_id: str) -> None:
+        """Run one job and save how it went"""
+        job = await run_blocking(self.store.claim, job_id, os.getpid())
+        if job is None:
+            return
+
+        current_operation.set(f"JOB {job.operation}")
+        try:
+            result = await self.handlers[job.operation](job.params)
+            self.finish(job, 200, jsonable_encoder(result))
+        except HTTPException as e:
+            ERRORS.inc((e.__cause__ or e).__class__.__name__)
+            self.finish(job, e.status_code, {"detail": e.detail}, failed=True)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.exception("Job %s failed", job_id)
+            ERRORS.inc(e.__class__.__name__)
+            self.finish(
+                job,
+                500,
+                {"detail": f"Exception {e.__class__.__name__}: {e}"},
+                failed=True,
+            )
+        await run_blocking(self.store.save, job)
+
+    @staticmethod
+    def finish(
+        job: Job, status_code: int, result: dict, failed: bool = False
+    ) -> None:
+        """Record the outcome of a job"""
+        job.status = JobStatus.FAILED if failed else JobStatus.SUCCEEDED
+        job.status_code = status_code
+        job.result = result
+        job.finished_at = time.time()
+
+
+job_runner = JobRunner(job_store)
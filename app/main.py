@@ -2,22 +2,394 @@
 Main fastapi app with endpoints
 """
 
+import cProfile
+import json
 import logging
+import math
 import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import (
+    Body,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
+from starlette.routing import Match
 
-from app.backend import Device, InterfaceManager
-from app.exceptions import CannotEdit, InvalidData
-from app.models import InterfaceConfig, CredentialType
+from app.backend import InterfaceManager, get_all_many
+from app.device import Device, run_blocking
+from app.offline import OfflineInterfaceManager
+from app.pool import session_pool
+from app.writes import (
+    JOB_HANDLERS,
+    run_create_interface,
+    run_create_interfaces,
+    run_delete_interface,
+    run_delete_interfaces,
+    run_reconcile_interfaces,
+)
+from app import admin, deadlines, discovery, notifications
+from app.jobs import job_runner
+from app.exceptions import (
+    CannotEdit,
+    CircuitOpen,
+    DeadlineExceeded,
+    InvalidData,
+    SessionPoolExhausted,
+    UnknownDevice,
+    UnknownVersion,
+)
+from app.metrics import (
+    DEADLINES_EXCEEDED,
+    ERRORS,
+    REQUEST_SECONDS,
+    current_operation,
+    phase,
+    registry,
+)
+from app.models import (
+    CredentialType,
+    InterfaceConfig,
+    InterfaceField,
+    InterfaceFilter,
+    OutputFormat,
+)
+from app import profiling
+from app.store import device_store
 
 load_dotenv()
 
 log_level = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper())
 logging.basicConfig(level=log_level)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    Discover and subscribe to the startup inventory, if any, before
+    taking requests and close NETCONF sessions when the app shuts down
+    Background job workers run for the life of the app
+    """
+    await job_runner.start(JOB_HANDLERS)
+    await discovery.warm_up()
+    await notifications.start()
+    yield
+    await job_runner.stop()
+    await run_blocking(notifications.subscription_manager.stop_all)
+    session_pool.close_all()
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records how long encoding took"""
+
+    def render(self, content) -> bytes:
+        with phase("encode"):
+            return super().render(content)
+
+
+class MetricsMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Time every request and label the work it does with its operation,
+    paths we dont serve are grouped so they cant grow the label set
+    """
+
+    def __init__(self, app):  # pylint: disable=redefined-outer-name
+        self.app = app
+
+    @staticmethod
+    def route_path(scope) -> str:
+        """
+        The path template of the route that will serve a request, so
+        /jobs/{job_id} is one label rather than one per job
+
+        The router only sets scope["route"] once it runs, after the
+        operation is needed, so the routes are matched here the same way
+        Returns:
+            str
+        """
+        path = "other"
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and path == "other":
+                path = route.path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        operation = f"{scope['method']} {self.route_path(scope)}"
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_operation.set(operation)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            current_operation.reset(token)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, operation, str(status)
+            )
+
+
+class ProfileMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Profile a request that carries the profiling token, the response
+    gets an X-Profile-Id header naming the saved stats
+
+    The event loop is shared so its profile also holds whatever other
+    requests did meanwhile, only one request profiles it at a time
+    """
+
+    def __init__(self, app):  # pylint: disable=redefined-outer-name
+        self.app = app
+        self.profiling_loop = False
+
+    @staticmethod
+    def token(scope) -> str | None:
+        """The token from the X-Profile header or profile parameter"""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value.decode()
+        values = parse_qs(scope["query_string"].decode()).get("profile")
+        return values[0] if values else None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not profiling.enabled()
+            or not profiling.token_matches(self.token(scope))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_profile = profiling.RequestProfile()
+
+        async def send_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", request_profile.profile_id.encode())
+                ]
+            await send(message)
+
+        loop_profile = None
+        if not self.profiling_loop:
+            self.profiling_loop = True
+            loop_profile = cProfile.Profile()
+            loop_profile.enable()
+        token = profiling.active_profile.set(request_profile)
+        try:
+            await self.app(scope, receive, send_profile_id)
+        finally:
+            profiling.active_profile.reset(token)
+            if loop_profile is not None:
+                loop_profile.disable()
+                self.profiling_loop = False
+                request_profile.add(loop_profile)
+            path = request_profile.save()
+            logging.info("Saved profile of %s to %s", scope["path"], path)
+
+
+class DeadlineMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Give a request that asks for one a deadline, from seconds in the
+    X-Request-Timeout header or timeout parameter. Background jobs run
+    outside the request and do not inherit it
+    """
+
+    def __init__(self, app):  # pylint: disable=redefined-outer-name
+        self.app = app
+
+    @staticmethod
+    def timeout(scope) -> str | None:
+        """The seconds from the X-Request-Timeout header or parameter"""
+        for name, value in scope["headers"]:
+            if name == b"x-request-timeout":
+                return value.decode()
+        values = parse_qs(scope["query_string"].decode()).get("timeout")
+        return values[0] if values else None
+
+    async def __call__(self, scope, receive, send):
+        timeout = self.timeout(scope) if scope["type"] == "http" else None
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            seconds = float(timeout)
+        except ValueError:
+            seconds = math.nan
+        if not 0 < seconds < math.inf:
+            response = JSONResponse(
+                {"detail": "timeout must be a positive number of seconds"},
+                status_code=422,
+            )
+            await response(scope, receive, send)
+            return
+        with deadlines.within(seconds):
+            await self.app(scope, receive, send)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=TimedJSONResponse)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfileMiddleware)
+app.include_router(admin.router)
+
+FLEET_CONCURRENCY = int(os.getenv("FLEET_CONCURRENCY", "50"))
+
+
+def ndjson_lines(items, batch_size: int = 100):
+    """
+    Encode items as NDJSON, a batch of lines per chunk so we dont hop
+    threads for every line
+    Args:
+        items (iterable): json serialisable items
+        batch_size (int): lines per chunk
+    Yields:
+        str
+    """
+    batch = []
+    for item in items:
+        batch.append(json.dumps(item))
+        if len(batch) >= batch_size:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag
+    Args:
+        if_none_match (str): header value, may list several ETags
+        etag (str): ETag of what we would return
+    Returns:
+        boolean
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@app.exception_handler(HTTPException)
+async def count_errors(request: Request, exc: HTTPException) -> Response:
+    """
+    Count errors by the exception behind them then answer as usual,
+    a refusal from a circuit breaker says when to try again. A failure
+    once the request's deadline has passed, whatever the device raised,
+    is answered 504 and counted apart from errors
+    """
+    cause = exc.__cause__ or exc
+    if exc.status_code >= 500 and (
+        isinstance(cause, DeadlineExceeded) or deadlines.expired()
+    ):
+        exc.status_code = 504
+        DEADLINES_EXCEEDED.inc(current_operation.get())
+        return await http_exception_handler(request, exc)
+    ERRORS.inc(cause.__class__.__name__)
+    if isinstance(cause, CircuitOpen) and not exc.headers:
+        exc.headers = {"Retry-After": str(math.ceil(cause.retry_after))}
+    return await http_exception_handler(request, exc)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """
+    Phase latencies, sessions opened, cache hits and errors in the
+    Prometheus text format
+    Returns:
+        str
+    """
+    return PlainTextResponse(
+        registry.expose(), media_type="text/plain; version=0.0.4"
+    )
+
+
+async def dry_run_offline(
+    host: str,
+    credential: CredentialType,
+    dry_run: bool,
+    render,
+    cannot_edit_status: int,
+) -> dict:
+    """
+    Dry run a write from the stored device type and cached reads alone,
+    no NETCONF session is opened so it can not reach the device
+    Args:
+        host (str): hostname of the device
+        credential (str): credential the write would use
+        dry_run (bool): must be true
+        render (callable): takes the OfflineInterfaceManager and returns the
+            rendered config and ExistenceCheck
+        cannot_edit_status (int): status when the cache shows the write
+            cant be made, the same as the endpoint answers online
+    Returns:
+        dict
+    """
+    if not dry_run:
+        raise HTTPException(
+            status_code=422, detail="offline is only allowed with dry_run"
+        )
+    try:
+        device = await Device.load(host, credential.value, offline=True)
+        data, existence_check = render(OfflineInterfaceManager(device))
+        return {"dry_run": data, "existence_check": existence_check}
+    except UnknownDevice as e:
+        logging.info(str(e))
+        raise HTTPException(
+            status_code=409, detail=f"Cannot dry run offline: {e}"
+        ) from e
+    except CannotEdit as e:
+        logging.info(str(e))
+        raise HTTPException(
+            status_code=cannot_edit_status, detail=f"Cannot edit: {e}"
+        ) from e
+
+
+async def queue_job(operation: str, params: dict) -> JSONResponse:
+    """
+    Queue a write to run in the background
+    Args:
+        operation (str): key in JOB_HANDLERS
+        params (dict): arguments for the handler
+    Returns:
+        JSONResponse 202 with the job id and where to poll it
+    """
+    if not job_runner.running:
+        raise HTTPException(
+            status_code=503, detail="Background jobs are not running"
+        )
+    job = await job_runner.submit(operation, params)
+    return JSONResponse(
+        {"job_id": job.job_id, "status": job.status.value},
+        status_code=202,
+        headers={"Location": f"/jobs/{job.job_id}"},
+    )
 
 
 @app.get("/healthz")
@@ -30,28 +402,63 @@ def healthz() -> dict:
     return {"detail": "Netconf is running"}
 
 
+@app.delete("/device", status_code=200)
+def forget_device(host: str) -> dict:
+    """
+    Forget the stored device type so it is discovered again on next use
+    If the device was never discovered it returns 404
+    Args:
+        host (str): hostname of the device
+    Returns:
+        dict
+    """
+    if not device_store.invalidate(host):
+        raise HTTPException(status_code=404, detail=f"Unknown device {host}")
+
+    return {"detail": f"Forgot device type for {host}"}
+
+
 @app.get("/interface")
-def get_interface(
+async def get_interface(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     host: str,
     interface_name: str,
+    response: Response,
     credential: CredentialType = CredentialType.DEFAULT,
+    max_age: float | None = Query(None, ge=0),
+    if_none_match: str | None = Header(None),
+    output: OutputFormat = OutputFormat.RAW,
 ) -> dict:
     """
     Get an interface via netconf
     If the interface does not exist it returns 404
+    If the cached read matches If-None-Match it returns 304
     Args:
         host (str): hostname of the device to connect to
         interface_name (str): name of the interface to get
         credential (str): optional credential to use
+        max_age (float): oldest cached read to accept in seconds,
+            0 always reads from the device
+        output (str): raw for the xml as a dict or records for a flat
+            object
     Returns:
         dict
     """
     try:
-        device = Device(host, credential.value)
+        device = await Device.load(host, credential.value)
         interface_manager = InterfaceManager(device)
-        return interface_manager.get_one(interface_name)
+        cached = await interface_manager.read_one_async(
+            interface_name, max_age, output
+        )
+        if etag_matches(if_none_match, cached.etag):
+            return Response(status_code=304, headers={"ETag": cached.etag})
+
+        response.headers["ETag"] = cached.etag
+        return cached.data
     except InvalidData as e:
         raise HTTPException(status_code=404, detail=str(e)) from e
+    except SessionPoolExhausted as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         logging.exception(e.__class__.__name__)
         raise HTTPException(
@@ -60,22 +467,101 @@ def get_interface(
 
 
 @app.get("/interfaces")
-def get_interfaces(
+async def get_interfaces(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
     host: str,
+    response: Response,
     credential: CredentialType = CredentialType.DEFAULT,
+    stream: bool = False,
+    max_age: float | None = Query(None, ge=0),
+    if_none_match: str | None = Header(None),
+    interface_name: list[str] = Query([]),
+    name_prefix: str | None = Query(None, pattern=r"^[\w/.:-]+$"),
+    fields: list[InterfaceField] = Query([]),
+    limit: int | None = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    output: OutputFormat = OutputFormat.RAW,
+    since: int | None = Query(None, ge=1),
 ) -> dict:
     """
     Get all interfaces on a device via netconf
+    If the cached read matches If-None-Match it returns 304, a full raw
+    read carries its config version in X-Config-Version
     Args:
         host (str): hostname of the device to connect to
         credential (str): optional credential to use
+        stream (bool): if true streams one NDJSON line per interface
+            as it is parsed instead of a single dict, this is never
+            served from the cache
+        max_age (float): oldest cached read to accept in seconds,
+            0 always reads from the device
+        interface_name (list): only get these interfaces
+        name_prefix (str): only get interfaces starting with this
+        fields (list): only get these parts of each interface
+        limit (int): most interfaces to return
+        offset (int): interfaces to skip before the limit
+        output (str): raw for the xml as a dict or records for a list
+            of flat objects under interfaces
+        since (int): only return interfaces added, changed or removed
+            since this config version, answers 410 once it is too old
     Returns:
-        dict
+        dict or StreamingResponse of application/x-ndjson
     """
+    filtered = any((interface_name, name_prefix, fields, offset))
+    if since is not None and (
+        stream or filtered or limit is not None or output != OutputFormat.RAW
+    ):
+        raise HTTPException(
+            status_code=422,
+            detail="since can't be combined with stream, filters or records",
+        )
     try:
-        device = Device(host, credential.value)
+        device = await Device.load(host, credential.value)
         interface_manager = InterfaceManager(device)
-        return interface_manager.get_all()
+        interface_filter = InterfaceFilter(
+            interface_names=tuple(interface_name),
+            name_prefix=name_prefix,
+            fields=tuple(fields),
+            limit=limit,
+            offset=offset,
+        )
+        if stream:
+            interfaces = await interface_manager.stream_all_async(
+                interface_filter, output
+            )
+            return StreamingResponse(
+                ndjson_lines(interfaces), media_type="application/x-ndjson"
+            )
+
+        if since is not None:
+            changes = await interface_manager.changes_since_async(
+                since, max_age
+            )
+            response.headers["X-Config-Version"] = str(changes.version)
+            return changes.model_dump()
+
+        headers = {}
+        if interface_filter.is_empty and output == OutputFormat.RAW:
+            cached, version = await interface_manager.read_versioned_async(
+                max_age
+            )
+            headers["X-Config-Version"] = str(version)
+        else:
+            cached = await interface_manager.read_all_async(
+                max_age, interface_filter, output
+            )
+        headers["ETag"] = cached.etag
+        if etag_matches(if_none_match, cached.etag):
+            return Response(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return cached.data
+    except UnknownVersion as e:
+        raise HTTPException(
+            status_code=410, detail=f"{e}, get the full interfaces again"
+        ) from e
+    except SessionPoolExhausted as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         logging.exception(e.__class__.__name__)
         raise HTTPException(
@@ -84,11 +570,14 @@ def get_interfaces(
 
 
 @app.post("/interface", status_code=200)
-def create_interface(
+async def create_interface(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     host: str,
     interface_config: InterfaceConfig,
     credential: CredentialType = CredentialType.DEFAULT,
     dry_run: bool = False,
+    background: bool = False,
+    offline: bool = False,
+    max_age: float | None = Query(None, ge=0),
 ) -> dict:
     """
     Create an interface on the device and commit
@@ -97,35 +586,47 @@ def create_interface(
         interface_config (InterfaceConfig): config of interface to create
         credential (str): optional credential to use
         dry_run (bool): if true returns what we would send to create
+        background (bool): if true answer 202 with a job to poll
+        offline (bool): dry run without connecting to the device
+        max_age (float): oldest cached read an offline dry run uses
     Returns:
         dict
     """
-    try:
-        device = Device(host, credential.value)
-        interface_manager = InterfaceManager(device)
-        data = interface_manager.create(interface_config, dry_run)
-        if dry_run:
-            return {"dry_run": data}
-
-        return {
-            "detail": f"Successfully created {interface_config.interface_name}"
-        }
-    except CannotEdit as e:
-        logging.info(str(e))
-        raise HTTPException(status_code=409, detail=f"Cannot edit: {e}") from e
-    except Exception as e:
-        logging.exception(e.__class__.__name__)
-        raise HTTPException(
-            status_code=500, detail=f"Exception {e.__class__.__name__}: {e}"
-        ) from e
+    if offline:
+        return await dry_run_offline(
+            host,
+            credential,
+            dry_run,
+            lambda manager: manager.create_offline(interface_config, max_age),
+            409,
+        )
+    if background:
+        return await queue_job(
+            "create_interface",
+            {
+                "host": host,
+                "interface_config": interface_config.model_dump(),
+                "credential": credential.value,
+                "dry_run": dry_run,
+            },
+        )
+    return await run_create_interface(
+        host=host,
+        interface_config=interface_config,
+        credential=credential,
+        dry_run=dry_run,
+    )
 
 
 @app.delete("/interface", status_code=200)
-def delete_interface(
+async def delete_interface(  # pylint: disable=too-many-arguments,too-many-positional-arguments
     host: str,
     interface_name: str,
     credential: CredentialType = CredentialType.DEFAULT,
     dry_run: bool = False,
+    background: bool = False,
+    offline: bool = False,
+    max_age: float | None = Query(None, ge=0),
 ) -> dict:
     """
     Delete an interface from the device config and commit
@@ -134,22 +635,192 @@ def delete_interface(
         interface_name (str): name of the interface to delete
         credential (str): optional credential to use
         dry_run (bool): if true returns what we would send to create
+        background (bool): if true answer 202 with a job to poll
+        offline (bool): dry run without connecting to the device
+        max_age (float): oldest cached read an offline dry run uses
     Returns:
         dict
     """
-    try:
-        device = Device(host, credential.value)
-        interface_manager = InterfaceManager(device)
-        data = interface_manager.delete(interface_name, dry_run)
-        if dry_run:
-            return {"dry_run": data}
+    if offline:
+        return await dry_run_offline(
+            host,
+            credential,
+            dry_run,
+            lambda manager: manager.delete_offline(interface_name, max_age),
+            404,
+        )
+    if background:
+        return await queue_job(
+            "delete_interface",
+            {
+                "host": host,
+                "interface_name": interface_name,
+                "credential": credential.value,
+                "dry_run": dry_run,
+            },
+        )
+    return await run_delete_interface(
+        host=host,
+        interface_name=interface_name,
+        credential=credential,
+        dry_run=dry_run,
+    )
 
-        return {"detail": f"Successfully deleted {interface_name}"}
-    except CannotEdit as e:
-        logging.info(str(e))
-        raise HTTPException(status_code=404, detail=f"Cannot edit: {e}") from e
-    except Exception as e:
-        logging.exception(e.__class__.__name__)
+
+@app.post("/interfaces/batch", status_code=200)
+async def create_interfaces(
+    host: str,
+    interface_configs: list[InterfaceConfig],
+    credential: CredentialType = CredentialType.DEFAULT,
+    dry_run: bool = False,
+    background: bool = False,
+) -> dict:
+    """
+    Create several interfaces on the device with a single commit
+    Interfaces that already exist are reported and skipped
+    Args:
+        host (str): hostname of the device to connect to
+        interface_configs (list): config of each interface to create
+        credential (str): optional credential to use
+        dry_run (bool): if true also returns what we would send to create
+        background (bool): if true answer 202 with a job to poll
+    Returns:
+        dict
+    """
+    if background:
+        return await queue_job(
+            "create_interfaces",
+            {
+                "host": host,
+                "interface_configs": [
+                    config.model_dump() for config in interface_configs
+                ],
+                "credential": credential.value,
+                "dry_run": dry_run,
+            },
+        )
+    return await run_create_interfaces(
+        host=host,
+        interface_configs=interface_configs,
+        credential=credential,
+        dry_run=dry_run,
+    )
+
+
+@app.delete("/interfaces/batch", status_code=200)
+async def delete_interfaces(
+    host: str,
+    interface_names: list[str] = Body(),
+    credential: CredentialType = CredentialType.DEFAULT,
+    dry_run: bool = False,
+    background: bool = False,
+) -> dict:
+    """
+    Delete several interfaces from the device config with a single commit
+    Interfaces that do not exist are reported and skipped
+    Args:
+        host (str): hostname of the device to connect to
+        interface_names (list): names of the interfaces to delete
+        credential (str): optional credential to use
+        dry_run (bool): if true also returns what we would send to delete
+        background (bool): if true answer 202 with a job to poll
+    Returns:
+        dict
+    """
+    if background:
+        return await queue_job(
+            "delete_interfaces",
+            {
+                "host": host,
+                "interface_names": interface_names,
+                "credential": credential.value,
+                "dry_run": dry_run,
+            },
+        )
+    return await run_delete_interfaces(
+        host=host,
+        interface_names=interface_names,
+        credential=credential,
+        dry_run=dry_run,
+    )
+
+
+@app.put("/interfaces", status_code=200)
+async def reconcile_interfaces(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    host: str,
+    interface_configs: list[InterfaceConfig],
+    credential: CredentialType = CredentialType.DEFAULT,
+    name_prefix: str = Query("Loopback", pattern=r"^[\w/.:-]+$"),
+    dry_run: bool = False,
+    background: bool = False,
+) -> dict:
+    """
+    Make the interfaces whose names start with name_prefix match the
+    desired set with a single commit, those not in the set are deleted
+    Nothing is sent to the device if it already matches
+    Args:
+        host (str): hostname of the device to connect to
+        interface_configs (list): config of every interface wanted
+        credential (str): optional credential to use
+        name_prefix (str): only interfaces with it are managed
+        dry_run (bool): if true returns the diff and what we would send
+        background (bool): if true answer 202 with a job to poll
+    Returns:
+        dict
+    """
+    names = [config.interface_name for config in interface_configs]
+    if len(set(names)) != len(names):
         raise HTTPException(
-            status_code=500, detail=f"Exception {e.__class__.__name__}: {e}"
-        ) from e
+            status_code=422, detail="Interface names must be unique"
+        )
+    outside = [name for name in names if not name.startswith(name_prefix)]
+    if outside:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Interfaces {outside} do not start with {name_prefix}",
+        )
+    if background:
+        return await queue_job(
+            "reconcile_interfaces",
+            {
+                "host": host,
+                "interface_configs": [
+                    config.model_dump() for config in interface_configs
+                ],
+                "credential": credential.value,
+                "name_prefix": name_prefix,
+                "dry_run": dry_run,
+            },
+        )
+    return await run_reconcile_interfaces(
+        host=host,
+        interface_configs=interface_configs,
+        credential=credential,
+        name_prefix=name_prefix,
+        dry_run=dry_run,
+    )
+
+
+@app.post("/fleet/interfaces", status_code=200)
+async def get_fleet_interfaces(
+    hosts: list[str] = Body(),
+    credential: CredentialType = CredentialType.DEFAULT,
+    concurrency: int = Query(FLEET_CONCURRENCY, ge=1, le=1000),
+) -> StreamingResponse:
+    """
+    Get all interfaces on many devices concurrently
+    Streams one NDJSON line per host as soon as it answers, failed hosts
+    get a line with an error instead of data
+    Args:
+        hosts (list): hostnames of the devices to connect to
+        credential (str): optional credential to use
+        concurrency (int): most devices to read at the same time
+    Returns:
+        StreamingResponse of application/x-ndjson
+    """
+
+    async def lines():
+        async for result in get_all_many(hosts, credential.value, concurrency):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,292 @@
+"""
+Metrics kept in process and served in the Prometheus text format
+
+Recording is a dict lookup and an increment under a lock, the text is
+only built when /metrics is scraped. METRICS_ENABLED=false turns
+recording off entirely
+"""
+
+import abc
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# METHOD /path of the request being served, set by the app middleware
+# and copied into the netconf executor by run_blocking
+current_operation = contextvars.ContextVar("current_operation", default="")
+
+
+def escape(value: str) -> str:
+    """Escape a label value for the text format"""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+class Metric(abc.ABC):
+    """
+    Base for a metric with values keyed by a tuple of label values
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.enabled = ENABLED
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def labels(self, values: tuple, extra: tuple = ()) -> str:
+        """Render label names and values as {a="1",b="2"}"""
+        pairs = [
+            f'{name}="{escape(value)}"'
+            for name, value in zip(self.labelnames, values)
+        ]
+        pairs.extend(f'{name}="{escape(value)}"' for name, value in extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def expose(self) -> list:
+        """Lines of the text format for this metric"""
+        with self._lock:
+            values = {
+                labels: self.copy(value)
+                for labels, value in self._values.items()
+            }
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, value in values.items():
+            lines.extend(self.samples(labels, value))
+        return lines
+
+    @staticmethod
+    def copy(value):
+        """Copy a value so it can be rendered outside the lock"""
+        return value
+
+    @abc.abstractmethod
+    def samples(self, labels: tuple, value) -> list:
+        """Lines for one set of label values"""
+
+    def clear(self) -> None:
+        """Drop every value"""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    """
+    A count that only goes up
+    """
+
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """Add to the count for the label values"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        """Current count for the label values"""
+        return self._values.get(labels, 0)
+
+    def samples(self, labels: tuple, value) -> list:
+        return [f"{self.name}{self.labels(labels)} {value}"]
+
+
+class Histogram(Metric):
+    """
+    Observations counted into buckets with their sum
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels) -> None:
+        """Count an observation for the label values"""
+        if not self.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # one count per bucket, one for +Inf and the sum last
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *labels):
+        """Context manager that observes how long its block took"""
+        if not self.enabled:
+            return nullcontext()
+        return self._time(labels)
+
+    @contextmanager
+    def _time(self, labels: tuple):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels) -> int:
+        """Number of observations for the label values"""
+        counts = self._values.get(labels)
+        return 0 if counts is None else sum(counts[:-1])
+
+    @staticmethod
+    def copy(value):
+        return list(value)
+
+    def samples(self, labels: tuple, value) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), value[:-1]):
+            cumulative += count
+            le = bound if bound == "+Inf" else repr(float(bound))
+            lines.append(
+                f"{self.name}_bucket{self.labels(labels, (('le', le),))} "
+                f"{cumulative}"
+            )
+        lines.append(f"{self.name}_sum{self.labels(labels)} {value[-1]}")
+        lines.append(f"{self.name}_count{self.labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics we serve on /metrics
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        """Create and register a Counter"""
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        """Create and register a Histogram"""
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        """Every metric in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Drop every value, used by tests"""
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+PHASE_SECONDS = registry.histogram(
+    "netconf_phase_seconds",
+    "Seconds spent in each phase of serving a request",
+    ("phase", "host", "device_type", "operation"),
+)
+REQUEST_SECONDS = registry.histogram(
+    "netconf_request_seconds",
+    "Seconds to answer each request",
+    ("operation", "status"),
+)
+SESSIONS_OPENED = registry.counter(
+    "netconf_sessions_opened_total",
+    "NETCONF sessions opened to devices",
+    ("host",),
+)
+CACHE_REQUESTS = registry.counter(
+    "netconf_cache_requests_total",
+    "Cache lookups by cache and whether they hit",
+    ("cache", "result"),
+)
+COMMIT_BATCH_SIZE = registry.histogram(
+    "netconf_commit_batch_size",
+    "Writes applied by each coalesced commit",
+    ("host",),
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+BREAKER_TRANSITIONS = registry.counter(
+    "netconf_breaker_transitions_total",
+    "Circuit breaker state changes by host and the state entered",
+    ("host", "state"),
+)
+NOTIFICATIONS = registry.counter(
+    "netconf_notifications_total",
+    "NETCONF notifications received by host and event",
+    ("host", "event"),
+)
+DEADLINES_EXCEEDED = registry.counter(
+    "netconf_deadlines_exceeded_total",
+    "Requests answered 504 as their deadline passed, not counted as errors",
+    ("operation",),
+)
+ERRORS = registry.counter(
+    "netconf_errors_total",
+    "Errors returned to clients by exception class",
+    ("exception",),
+)
+
+
+def phase(name: str, host: str = "", device_type: str = ""):
+    """
+    Time a phase of the current request
+    Args:
+        name (str): e.g. get_config, parse or commit
+        host (str): hostname of the device
+        device_type (str): device type if known
+    Returns:
+        context manager
+    """
+    return PHASE_SECONDS.time(
+        name, host, device_type or "", current_operation.get()
+    )
@@ -4,7 +4,7 @@ Holds custom models that we use in the fastapi frontend endpoints
 
 from enum import Enum
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class InterfaceConfig(BaseModel):
@@ -18,6 +18,141 @@ class InterfaceConfig(BaseModel):
     active: str = "act"
 
 
+class InterfaceField(str, Enum):
+    """
+    Optional parts of an interface config that can be selected,
+    interface-name and active are always returned
+    """
+
+    DESCRIPTION = "description"
+    IPV4_NETWORK = "ipv4-network"
+    INTERFACE_VIRTUAL = "interface-virtual"
+    SHUTDOWN = "shutdown"
+    VRF = "vrf"
+
+
+class InterfaceFilter(BaseModel):
+    """
+    Which interfaces and which parts of them to get
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    interface_names: tuple[str, ...] = ()
+    name_prefix: str | None = None
+    fields: tuple[InterfaceField, ...] = ()
+    limit: int | None = None
+    offset: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        """True when nothing is filtered so we get everything"""
+        return self == InterfaceFilter()
+
+
+class OutputFormat(str, Enum):
+    """
+    Shape of the interface data we return, raw is the xml as a dict and
+    records is one flat object per interface
+    """
+
+    RAW = "raw"
+    RECORDS = "records"
+
+
+class ExistenceCheck(str, Enum):
+    """
+    How a dry run found out whether the interface exists, an offline dry
+    run uses cached reads when it can and otherwise skips the check
+    """
+
+    DEVICE = "device"
+    CACHED = "cached"
+    SKIPPED = "skipped"
+
+
+class BatchStatus(str, Enum):
+    """
+    Outcome for one interface in a batch create or delete
+    """
+
+    CREATED = "created"
+    DELETED = "deleted"
+    PLANNED = "planned"
+    EXISTS = "exists"
+    MISSING = "missing"
+    DUPLICATE = "duplicate"
+
+
+class BatchResult(BaseModel):
+    """
+    Result for one interface in a batch create or delete
+    """
+
+    interface_name: str
+    status: BatchStatus
+
+
+class JobStatus(str, Enum):
+    """
+    Where a background write is up to
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(BaseModel):
+    """
+    A write run in the background, result is the body the endpoint
+    would have answered with and status_code its status
+    """
+
+    job_id: str
+    operation: str
+    params: dict
+    status: JobStatus = JobStatus.QUEUED
+    status_code: int | None = None
+    result: dict | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    # pid of the worker process that claimed the job
+    owner: int | None = None
+
+
+class InterfaceDiff(BaseModel):
+    """
+    What has to change for a device to match a desired set of interfaces
+    """
+
+    added: list[str] = []
+    changed: list[str] = []
+    deleted: list[str] = []
+    unchanged: list[str] = []
+
+    @property
+    def is_empty(self) -> bool:
+        """True when the device already matches"""
+        return not (self.added or self.changed or self.deleted)
+
+
+class InterfaceChanges(BaseModel):
+    """
+    How the interfaces on a device changed between two config versions,
+    added and changed are raw dicts of the interfaces as they are now
+    """
+
+    host: str
+    since: int
+    version: int
+    added: list[dict] = []
+    changed: list[dict] = []
+    removed: list[str] = []
+
+
 class CredentialType(str, Enum):
     """
     Valid credential types you can use
@@ -30,6 +165,82 @@ class CredentialType(str, Enum):
     NEXUS = "NEXUS"
 
 
+class InventoryEntry(BaseModel):
+    """
+    A host to discover and the credential to discover it with
+    """
+
+    host: str
+    credential: CredentialType = CredentialType.DEFAULT
+
+
+class DiscoveryStatus(str, Enum):
+    """
+    Outcome for one host in a bulk discovery
+    """
+
+    DISCOVERED = "discovered"
+    KNOWN = "known"
+    FAILED = "failed"
+
+
+class DiscoveryResult(BaseModel):
+    """
+    Result for one host in a bulk discovery
+    """
+
+    host: str
+    status: DiscoveryStatus
+    device_type: str | None = None
+    warmed: bool = False
+    error: str | None = None
+
+
+class SubscriptionState(str, Enum):
+    """
+    Where a notification subscription to a host is up to
+    """
+
+    CONNECTING = "connecting"
+    SUBSCRIBED = "subscribed"
+    RETRYING = "retrying"
+    UNSUPPORTED = "unsupported"
+    STOPPED = "stopped"
+
+
+class SubscriptionStatus(BaseModel):
+    """
+    A notification subscription to a host and what it has received
+    """
+
+    host: str
+    state: SubscriptionState = SubscriptionState.CONNECTING
+    notifications: int = 0
+    last_event_time: str | None = None
+    error: str | None = None
+
+
+class BreakerState(str, Enum):
+    """
+    State of the circuit breaker around connecting to a host
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class BreakerStatus(BaseModel):
+    """
+    A host's circuit breaker and when it next lets a connect through
+    """
+
+    host: str
+    state: BreakerState
+    failures: int
+    retry_after: float | None = None
+
+
 class DeviceCapability(Enum):
     """
     Valid device capabilities with NETCONF
@@ -0,0 +1,260 @@
+"""
+Keep cached reads fresh from NETCONF notifications
+
+A watched host gets a long lived session of its own, outside the pool,
+that subscribes to the device's notifications with create-subscription.
+A netconf-config-change for running drops our cached reads of the host,
+or with NOTIFICATION_REFRESH reads the interfaces again straight away,
+so while subscribed its reads are kept for NOTIFICATION_CACHE_TTL
+instead of polling the device every READ_CACHE_TTL. If the session
+drops the host goes back to the normal ttl until we have subscribed
+again. The session sends keepalives every NOTIFICATION_KEEPALIVE
+seconds so a connection that silently went away counts as a drop too.
+With NETCONF_NOTIFICATIONS every host in NETCONF_INVENTORY is watched
+from startup, others are added with POST /admin/subscriptions
+"""
+
+import logging
+import os
+import threading
+
+from lxml import etree
+from ncclient import manager
+
+from app.backend import InterfaceManager
+from app.device import Device, read_cache
+from app.breaker import circuit_breakers
+from app.discovery import INVENTORY, load_inventory
+from app.metrics import ERRORS, NOTIFICATIONS, SESSIONS_OPENED
+from app.models import (
+    InterfaceFilter,
+    SubscriptionState,
+    SubscriptionStatus,
+)
+from app.pool import set_keepalive
+
+NOTIFICATIONS_ENABLED = os.getenv(
+    "NETCONF_NOTIFICATIONS", "false"
+).lower() in ("1", "true", "yes")
+NOTIFICATION_CACHE_TTL = float(os.getenv("NOTIFICATION_CACHE_TTL", "300"))
+NOTIFICATION_REFRESH = os.getenv("NOTIFICATION_REFRESH", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+NOTIFICATION_RETRY_MAX = float(os.getenv("NOTIFICATION_RETRY_MAX", "60"))
+NOTIFICATION_KEEPALIVE = int(os.getenv("NOTIFICATION_KEEPALIVE", "10"))
+
+CONFIG_CHANGE_NS = "urn:ietf:params:xml:ns:yang:ietf-netconf-notifications"
+CONFIG_CHANGE = f"{{{CONFIG_CHANGE_NS}}}netconf-config-change"
+
+
+class Subscription:
+    """
+    A thread holding the notification session to one host, subscribing
+    again with backoff whenever the session drops
+    """
+
+    def __init__(self, device: Device, poll: float = 1):
+        self.device = device
+        self.poll = poll
+        self.status = SubscriptionStatus(host=device.host)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self.run, name=f"subscription-{device.host}", daemon=True
+        )
+
+    @property
+    def alive(self) -> bool:
+        """True while the thread is running"""
+        return self._thread.is_alive()
+
+    def start(self) -> "Subscription":
+        """Start the thread"""
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop the thread, it closes the session on the way out"""
+        self._stop.set()
+        self.status.state = SubscriptionState.STOPPED
+        if wait and self._thread.is_alive():
+            self._thread.join()
+
+    def run(self) -> None:
+        """Subscribe and handle notifications until stopped"""
+        if not self.device.supports(":notification"):
+            self.status.state = SubscriptionState.UNSUPPORTED
+            return
+
+        delay = 1
+        while not self._stop.is_set():
+            self.status.state = SubscriptionState.CONNECTING
+            try:
+                self.listen()
+                delay = 1
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                if not self._stop.is_set():
+                    logging.warning(
+                        "Subscription to %s failed: %r", self.device.host, e
+                    )
+                    ERRORS.inc(e.__class__.__name__)
+                    self.status.error = (
+                        f"Exception {e.__class__.__name__}: {e}"
+                    )
+            finally:
+                read_cache.unwatch(self.device.host)
+            if self._stop.is_set():
+                break
+            self.status.state = SubscriptionState.RETRYING
+            self._stop.wait(delay)
+            delay = min(delay * 2, NOTIFICATION_RETRY_MAX)
+        self.status.state = SubscriptionState.STOPPED
+
+    def listen(self) -> None:
+        """Hold one subscribed session until it drops or we are stopped"""
+        # the iosxr handler skips the check that a message is an
+        # rpc-reply, so the first notification would break its session
+        params = {
+            **self.device.manager_params,
+            "device_params": {"name": "default"},
+        }
+        with circuit_breakers.call(
+            self.device.host, manager.connect, **params
+        ) as session:
+            SESSIONS_OPENED.inc(self.device.host)
+            # without them a half open connection would keep the host's
+            # reads cached for NOTIFICATION_CACHE_TTL with nothing to
+            # invalidate them, once they fail the session closes
+            set_keepalive(session, NOTIFICATION_KEEPALIVE)
+            session.create_subscription()
+            # we may have missed changes while not subscribed
+            read_cache.invalidate(self.device.host)
+            read_cache.watch(self.device.host, NOTIFICATION_CACHE_TTL)
+            self.status.state = SubscriptionState.SUBSCRIBED
+            self.status.error = None
+            while not self._stop.is_set():
+                if not session.connected:
+                    raise ConnectionError("Notification session closed")
+                notification = session.take_notification(timeout=self.poll)
+                if notification is not None:
+                    self.handle(notification.notification_ele)
+
+    def handle(self, notification: etree._Element) -> None:
+        """
+        Act on one notification, config changes to running invalidate
+        or refresh the cached reads of the host
+        Args:
+            notification (etree._Element): the notification element
+        """
+        event = next(
+            (
+                child
+                for child in notification
+                if etree.QName(child).localname != "eventTime"
+            ),
+            None,
+        )
+        name = "unknown" if event is None else etree.QName(event).localname
+        NOTIFICATIONS.inc(self.device.host, name)
+        self.status.notifications += 1
+        self.status.last_event_time = notification.findtext("{*}eventTime")
+        if event is None or event.tag != CONFIG_CHANGE:
+            return
+        datastore = event.findtext(f"{{{CONFIG_CHANGE_NS}}}datastore")
+        if datastore not in (None, "running"):
+            return
+
+        logging.info("Config of %s changed", self.device.host)
+        read_cache.invalidate(self.device.host)
+        if NOTIFICATION_REFRESH:
+            try:
+                InterfaceManager(self.device).read_all(0, InterfaceFilter())
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning(
+                    "Refresh of %s failed: %r", self.device.host, e
+                )
+                ERRORS.inc(e.__class__.__name__)
+
+
+class SubscriptionManager:
+    """
+    Notification subscriptions keyed by host
+    """
+
+    def __init__(self):
+        self.subscriptions = {}
+        self._lock = threading.Lock()
+
+    def watch(self, device: Device) -> SubscriptionStatus:
+        """
+        Subscribe to a host's notifications unless we already are
+        Args:
+            device (Device): the device to watch
+        Returns:
+            SubscriptionStatus
+        """
+        with self._lock:
+            subscription = self.subscriptions.get(device.host)
+            if subscription is None or not subscription.alive:
+                subscription = Subscription(device).start()
+                self.subscriptions[device.host] = subscription
+            return subscription.status
+
+    def unwatch(self, host: str) -> bool:
+        """
+        Stop watching a host
+        Returns:
+            boolean if the host was watched
+        """
+        with self._lock:
+            subscription = self.subscriptions.pop(host, None)
+        if subscription is None:
+            return False
+        subscription.stop()
+        return True
+
+    def statuses(self) -> list:
+        """
+        Returns:
+            list of SubscriptionStatus
+        """
+        with self._lock:
+            return [
+                subscription.status
+                for subscription in self.subscriptions.values()
+            ]
+
+    def stop_all(self) -> None:
+        """Stop every subscription, used when the app shuts down"""
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+            self.subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.stop(wait=False)
+        for subscription in subscriptions:
+            subscription.stop()
+
+
+subscription_manager = SubscriptionManager()
+
+
+async def start() -> list:
+    """
+    With NETCONF_NOTIFICATIONS watch every host in NETCONF_INVENTORY,
+    called before the app takes requests
+    Returns:
+        list of SubscriptionStatus
+    """
+    if not NOTIFICATIONS_ENABLED or not INVENTORY:
+        return []
+    statuses = []
+    for entry in load_inventory(INVENTORY):
+        try:
+            device = await Device.load(entry.host, entry.credential.value)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logging.warning("Cannot watch %s: %r", entry.host, e)
+            ERRORS.inc(e.__class__.__name__)
+            continue
+        statuses.append(subscription_manager.watch(device))
+    return statuses
@@ -0,0 +1,106 @@
+"""
+Dry runs of writes from cached reads alone, without a NETCONF session
+"""
+
+from app.backend import InterfaceManager
+from app.device import read_cache
+from app.exceptions import CannotEdit
+from app.metrics import CACHE_REQUESTS
+from app.models import (
+    ExistenceCheck,
+    InterfaceConfig,
+    InterfaceFilter,
+    OutputFormat,
+)
+from app.registry import TemplateOperation
+
+
+class OfflineInterfaceManager(InterfaceManager):
+    """Dry runs of writes to a device that may be offline"""
+
+    def create_offline(
+        self, interface_config: InterfaceConfig, max_age: float | None = None
+    ) -> tuple:
+        """
+        Dry run a create without a NETCONF session, the existence check
+        comes from cached reads if there are any
+        Args:
+            interface_config (InterfaceConfig): config of interface to add
+            max_age (float): oldest cached read we accept in seconds
+        Returns:
+            tuple (rendered config, ExistenceCheck)
+        """
+        interface_name = interface_config.interface_name
+        exists = self.cached_exists(interface_name, max_age)
+        if exists:
+            raise CannotEdit(f"Interface {interface_name} already exists")
+        template = self.template(TemplateOperation.CREATE_INTERFACE)
+        return template.render(**interface_config.__dict__), (
+            ExistenceCheck.SKIPPED if exists is None else ExistenceCheck.CACHED
+        )
+
+    def delete_offline(
+        self, interface_name: str, max_age: float | None = None
+    ) -> tuple:
+        """
+        Dry run a delete without a NETCONF session, the existence check
+        comes from cached reads if there are any
+        Args:
+            interface_name (str): name of the interface to delete
+            max_age (float): oldest cached read we accept in seconds
+        Returns:
+            tuple (rendered config, ExistenceCheck)
+        """
+        exists = self.cached_exists(interface_name, max_age)
+        if exists is False:
+            raise CannotEdit(f"Interface {interface_name} does not exist")
+        template = self.template(TemplateOperation.DELETE_INTERFACE)
+        return template.render(interface_name=interface_name), (
+            ExistenceCheck.SKIPPED if exists is None else ExistenceCheck.CACHED
+        )
+
+    def cached_exists(
+        self, interface_name: str, max_age: float | None = None
+    ) -> bool | None:
+        """
+        Whether an interface exists going by cached reads of the device,
+        a full read answers either way and a read of the interface
+        itself only shows it exists as misses are not cached
+        Args:
+            interface_name (str): name of the interface to check
+            max_age (float): oldest cached read we accept in seconds
+        Returns:
+            boolean or None if no cached read can tell
+        """
+        for output in OutputFormat:
+            cached = read_cache.get(
+                self.device.host,
+                ("interfaces", InterfaceFilter(), output),
+                max_age,
+            )
+            if cached is not None:
+                CACHE_REQUESTS.inc("read", "hit")
+                return interface_name in self.cached_names(cached.data)
+        for output in OutputFormat:
+            if read_cache.get(
+                self.device.host,
+                ("interface", interface_name, output),
+                max_age,
+            ):
+                CACHE_REQUESTS.inc("read", "hit")
+                return True
+        CACHE_REQUESTS.inc("read", "miss")
+        return None
+
+    @staticmethod
+    def cached_names(data: dict) -> set:
+        """
+        Interface names in a cached get_all response
+        Args:
+            data (dict): raw dict of the xml or records
+        Returns:
+            set of names
+        """
+        if "interfaces" in data:
+            return {record["interface_name"] for record in data["interfaces"]}
+        return set(InterfaceManager.snapshot_interfaces(data))
@@ -0,0 +1,217 @@
+"""
+Parse NETCONF replies with lxml straight from the element tree
+"""
+
+import dataclasses
+from dataclasses import dataclass
+
+from lxml import etree
+
+from app.models import InterfaceField
+
+IFMGR_NS = "http://cisco.com/ns/yang/Cisco-IOS-XR-ifmgr-cfg"
+IPV4_NS = "http://cisco.com/ns/yang/Cisco-IOS-XR-ipv4-io-cfg"
+RSI_NS = "http://cisco.com/ns/yang/Cisco-IOS-XR-infra-rsi-cfg"
+NAMESPACES = {"ifmgr": IFMGR_NS, "ipv4": IPV4_NS, "rsi": RSI_NS}
+
+INTERFACE_TAG = f"{{{IFMGR_NS}}}interface-configuration"
+NAME_TAG = f"{{{IFMGR_NS}}}interface-name"
+ACTIVE_TAG = f"{{{IFMGR_NS}}}active"
+DESCRIPTION_TAG = f"{{{IFMGR_NS}}}description"
+SHUTDOWN_TAG = f"{{{IFMGR_NS}}}shutdown"
+VIRTUAL_TAG = f"{{{IFMGR_NS}}}interface-virtual"
+VRF_TAG = f"{{{RSI_NS}}}vrf"
+IPV4_TAG = f"{{{IPV4_NS}}}ipv4-network"
+ADDRESS_TAG = f"{{{IPV4_NS}}}address"
+NETMASK_TAG = f"{{{IPV4_NS}}}netmask"
+
+has_interface_configurations = etree.XPath(
+    "boolean(ifmgr:interface-configurations)", namespaces=NAMESPACES
+)
+find_interfaces = etree.XPath(
+    "ifmgr:interface-configurations/ifmgr:interface-configuration",
+    namespaces=NAMESPACES,
+)
+find_interface_names = etree.XPath(
+    "ifmgr:interface-configurations/ifmgr:interface-configuration"
+    "/ifmgr:interface-name/text()",
+    namespaces=NAMESPACES,
+)
+
+
+def parse_xml(xml_data: str) -> etree._Element:
+    """
+    Parse xml data into an element tree
+    Args:
+        xml_data (str): xml from the device
+    Returns:
+        root element
+    """
+    parser = etree.XMLParser(remove_blank_text=True, huge_tree=True)
+    return etree.fromstring(xml_data.encode(), parser)
+
+
+def tag_name(element: etree._Element) -> str:
+    """
+    Turn an lxml {namespace}tag into prefix:tag as written in the xml
+    """
+    tag = element.tag
+    if tag[0] == "{":
+        tag = tag.split("}", 1)[1]
+    prefix = element.prefix
+    return f"{prefix}:{tag}" if prefix else tag
+
+
+def attribute_name(name: str, nsmap: dict) -> str:
+    """
+    Turn an lxml {namespace}name attribute into prefix:name, attributes
+    never use the default namespace so we look for a named prefix
+    """
+    if name[0] != "{":
+        return name
+    namespace, local = name[1:].split("}", 1)
+    for prefix, uri in nsmap.items():
+        if uri == namespace and prefix is not None:
+            return f"{prefix}:{local}"
+    return local
+
+
+def element_to_dict(element: etree._Element) -> dict:
+    """
+    Convert an element to the same shape xmltodict.parse gives, so the
+    responses dont change, walking the tree lxml already built instead
+    of re-parsing with python callbacks for every node
+    Args:
+        element (etree._Element): element to convert
+    Returns:
+        dict keyed by the element tag
+    """
+    stack = [{}]
+    declared = []
+    for event, item in etree.iterwalk(
+        element, events=("start-ns", "start", "end")
+    ):
+        if event == "start-ns":
+            declared.append(item)
+        elif event == "start":
+            node = {}
+            for prefix, uri in declared:
+                node[f"@xmlns:{prefix}" if prefix else "@xmlns"] = uri
+            declared.clear()
+            for name, value in item.attrib.items():
+                if name[0] == "{":
+                    name = attribute_name(name, item.nsmap)
+                node[f"@{name}"] = value
+            stack.append(node)
+        else:
+            node = stack.pop()
+            text = item.text.strip() if item.text else None
+            if node:
+                if text:
+                    node["#text"] = text
+                value = node
+            else:
+                value = text or None
+
+            add_child(stack[-1], tag_name(item), value)
+    return stack[0]
+
+
+def add_child(parent: dict, key: str, value) -> None:
+    """
+    Add a child to its parent dict, repeated tags become a list
+    """
+    if key not in parent:
+        parent[key] = value
+    elif isinstance(parent[key], list):
+        parent[key].append(value)
+    else:
+        parent[key] = [parent[key], value]
+
+
+@dataclass(slots=True)
+class InterfaceRecord:  # pylint: disable=too-many-instance-attributes
+    """
+    Compact typed view of one interface-configuration
+    """
+
+    interface_name: str
+    active: str = "act"
+    description: str | None = None
+    address: str | None = None
+    netmask: str | None = None
+    vrf: str | None = None
+    shutdown: bool = False
+    virtual: bool = False
+
+    @classmethod
+    def from_element(cls, element: etree._Element) -> "InterfaceRecord":
+        """
+        Build a record from an interface-configuration element
+        """
+        record = cls(interface_name="")
+        for child in element:
+            tag = child.tag
+            if tag == NAME_TAG:
+                record.interface_name = child.text
+            elif tag == ACTIVE_TAG:
+                record.active = child.text
+            elif tag == DESCRIPTION_TAG:
+                record.description = child.text
+            elif tag == SHUTDOWN_TAG:
+                record.shutdown = True
+            elif tag == VIRTUAL_TAG:
+                record.virtual = True
+            elif tag == VRF_TAG:
+                record.vrf = child.text
+            elif tag == IPV4_TAG:
+                record.address = next(child.iter(ADDRESS_TAG), None)
+                record.netmask = next(child.iter(NETMASK_TAG), None)
+                if record.address is not None:
+                    record.address = record.address.text
+                if record.netmask is not None:
+                    record.netmask = record.netmask.text
+        return record
+
+    def project(self, fields: tuple) -> "InterfaceRecord":
+        """
+        Keep only the selected fields, name and active are always kept
+        Args:
+            fields (tuple): InterfaceField to keep
+        Returns:
+            InterfaceRecord
+        """
+        if not fields:
+            return self
+        record = InterfaceRecord(self.interface_name, self.active)
+        for field in fields:
+            for name in RECORD_FIELDS[field]:
+                setattr(record, name, getattr(self, name))
+        return record
+
+    def as_dict(self) -> dict:
+        """Plain dict for json encoding"""
+        return {name: getattr(self, name) for name in RECORD_NAMES}
+
+
+RECORD_NAMES = tuple(
+    field.name for field in dataclasses.fields(InterfaceRecord)
+)
+RECORD_FIELDS = {
+    InterfaceField.DESCRIPTION: ("description",),
+    InterfaceField.IPV4_NETWORK: ("address", "netmask"),
+    InterfaceField.INTERFACE_VIRTUAL: ("virtual",),
+    InterfaceField.SHUTDOWN: ("shutdown",),
+    InterfaceField.VRF: ("vrf",),
+}
+
+
+def parse_interfaces(root: etree._Element) -> list:
+    """
+    Get a record for every interface-configuration in a reply
+    Args:
+        root (etree._Element): data element of the reply
+    Returns:
+        list of InterfaceRecord
+    """
+    return [InterfaceRecord.from_element(ele) for ele in find_interfaces(root)]
@@ -0,0 +1,243 @@
+"""
+Pool of open NETCONF sessions shared by every request
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from ncclient import manager
+
+from app import deadlines
+from app.breaker import circuit_breakers
+from app.exceptions import SessionPoolExhausted
+from app.metrics import SESSIONS_OPENED, phase
+
+
+def set_keepalive(ncclient_manager: manager.Manager, interval: int) -> None:
+    """
+    Have paramiko send SSH keepalives every interval seconds so idle
+    sessions stay up. On Linux the kernel also drops the connection once
+    sent data goes unacknowledged for a few intervals, so a half open
+    connection ends the session rather than leaving it waiting forever
+    Args:
+        ncclient_manager (manager.Manager): an open session
+        interval (int): seconds between keepalives, 0 for none
+    """
+    # pylint: disable=protected-access
+    transport = getattr(ncclient_manager._session, "_transport", None)
+    if transport is None or not interval:
+        return
+    transport.set_keepalive(interval)
+    sock = getattr(transport, "sock", None)
+    if isinstance(sock, socket.socket) and hasattr(socket, "TCP_USER_TIMEOUT"):
+        sock.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, interval * 3000
+        )
+
+
+@dataclass
+class PooledSession:
+    """
+    An open ncclient session held by the SessionPool
+    """
+
+    manager: manager.Manager
+    created: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SessionPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Pool of open NETCONF sessions keyed by (host, credential)
+
+    Borrowing a session skips the SSH handshake, auth and hello that
+    manager.connect does, and caps how many sessions we hold open to
+    each device
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 4,
+        idle_timeout: float = 300,
+        max_lifetime: float = 3600,
+        keepalive: int = 30,
+        acquire_timeout: float = 30,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.keepalive = keepalive
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Condition()
+        self._idle = defaultdict(list)
+        self._open = defaultdict(int)
+
+    def is_usable(self, pooled: PooledSession) -> bool:
+        """
+        Check a session is still connected and within its idle and
+        lifetime limits
+        Args:
+            pooled (PooledSession): session to check
+        Returns:
+            boolean
+        """
+        now = time.monotonic()
+        return (
+            pooled.manager.connected
+            and now - pooled.created < self.max_lifetime
+            and now - pooled.last_used < self.idle_timeout
+        )
+
+    @contextmanager
+    def session(self, key: tuple, manager_params: dict):
+        """
+        Borrow a session for the block and return it to the pool after
+        Args:
+            key (tuple): (host, credential) the session belongs to
+            manager_params (dict): params for manager.connect if we
+                need a new session
+        Yields:
+            manager.Manager
+        """
+        pooled = self.acquire(key, manager_params)
+        try:
+            yield pooled.manager
+        finally:
+            self.release(key, pooled)
+
+    def acquire(self, key: tuple, manager_params: dict) -> PooledSession:
+        """
+        Take an idle session for the key or open a new one if we are
+        below max_sessions, otherwise wait for one to be released
+        Raises:
+            SessionPoolExhausted if no session is free in time
+            CircuitOpen if connects to the host keep failing
+            DeadlineExceeded if the request runs out of time first
+        """
+        deadline = time.monotonic() + deadlines.timeout(
+            self.acquire_timeout, "acquire"
+        )
+        stale = []
+        try:
+            with self._lock:
+                while True:
+                    evicted = self._evict_idle()
+                    if evicted:
+                        # evicting frees slots of other keys too
+                        stale.extend(evicted)
+                        self._lock.notify_all()
+                    idle = self._idle[key]
+                    if idle:
+                        pooled = idle.pop()
+                        pooled.last_used = time.monotonic()
+                        break
+                    # waiters give up as soon as the breaker opens
+                    circuit_breakers.check(key[0])
+                    if self._open[key] < self.max_sessions:
+                        self._open[key] += 1
+                        pooled = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        deadlines.check("acquire")
+                        raise SessionPoolExhausted(
+                            f"No free NETCONF session for {key[0]} after "
+                            f"{self.acquire_timeout}s"
+                        )
+                    self._lock.wait(remaining)
+        finally:
+            # evicted sessions are no longer counted, close them even
+            # if we give up
+            self._close(stale)
+
+        if pooled is not None:
+            return pooled
+
+        try:
+            with phase(
+                "connect",
+                key[0],
+                manager_params.get("device_params", {}).get("name"),
+            ):
+                ncclient_manager = circuit_breakers.call(
+                    key[0],
+                    manager.connect,
+                    **deadlines.connect_params(manager_params),
+                )
+        except Exception:
+            with self._lock:
+                self._open[key] -= 1
+                # the failure may have opened the breaker, every waiter
+                # for the host has to check it
+                self._lock.notify_all()
+            raise
+
+        logging.debug("Opened NETCONF session to %s", key[0])
+        SESSIONS_OPENED.inc(key[0])
+        if "timeout" in manager_params:
+            # outlives this request, so not its deadline
+            ncclient_manager.timeout = manager_params["timeout"]
+        set_keepalive(ncclient_manager, self.keepalive)
+        return PooledSession(ncclient_manager)
+
+    def release(self, key: tuple, pooled: PooledSession) -> None:
+        """
+        Return a session to the pool, closing it if it is no longer usable
+        """
+        pooled.last_used = time.monotonic()
+        usable = self.is_usable(pooled)
+        with self._lock:
+            if usable:
+                self._idle[key].append(pooled)
+            else:
+                self._open[key] -= 1
+            # waiters for every key share the condition
+            self._lock.notify_all()
+
+        if not usable:
+            self._close([pooled])
+
+    def close_all(self) -> None:
+        """Close every idle session, e.g. on shutdown"""
+        with self._lock:
+            stale = [pooled for idle in self._idle.values() for pooled in idle]
+            for key, idle in self._idle.items():
+                self._open[key] -= len(idle)
+            self._idle.clear()
+            self._lock.notify_all()
+
+        self._close(stale)
+
+    def _evict_idle(self) -> list:
+        """Pull unusable sessions out of the idle lists, lock must be held"""
+        stale = []
+        for key, idle in self._idle.items():
+            usable = [pooled for pooled in idle if self.is_usable(pooled)]
+            if len(usable) != len(idle):
+                stale.extend(pooled for pooled in idle if pooled not in usable)
+                self._open[key] -= len(idle) - len(usable)
+                self._idle[key] = usable
+        return stale
+
+    @staticmethod
+    def _close(sessions: list) -> None:
+        """Close sessions outside the lock as it is a round trip"""
+        for pooled in sessions:
+            try:
+                pooled.manager.close_session()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.debug("Failed to close NETCONF session", exc_info=True)
+
+
+session_pool = SessionPool(
+    max_sessions=int(os.getenv("NETCONF_POOL_MAX_SESSIONS", "4")),
+    idle_timeout=float(os.getenv("NETCONF_POOL_IDLE_TIMEOUT", "300")),
+    max_lifetime=float(os.getenv("NETCONF_POOL_MAX_LIFETIME", "3600")),
+    keepalive=int(os.getenv("NETCONF_POOL_KEEPALIVE", "30")),
+)
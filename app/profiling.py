@@ -0,0 +1,114 @@
+"""
+Opt-in profiling of single requests
+
+A request with the PROFILE_TOKEN secret in the X-Profile header or the
+profile query parameter is profiled with cProfile on the event loop and
+on every netconf executor thread it runs work on. The stats are saved
+to PROFILE_DIR as <profile id>.prof, readable with pstats or snakeviz
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import threading
+import uuid
+
+from app.exceptions import InvalidData
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# set only while a profiled request is being served, run_blocking
+# checks it so other requests pay a single lookup
+active_profile = contextvars.ContextVar("active_profile", default=None)
+
+
+def enabled() -> bool:
+    """Profiling is only possible once PROFILE_TOKEN is set"""
+    return bool(PROFILE_TOKEN)
+
+
+def token_matches(token: str | None) -> bool:
+    """Check a token against PROFILE_TOKEN, profiling is off if unset"""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def profile_path(profile_id: str) -> str:
+    """
+    Where the stats for a profile id are saved
+    Raises:
+        InvalidData if the id is not one we generate
+    """
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id):
+        raise InvalidData(f"Invalid profile id {profile_id}")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+
+
+class RequestProfile:
+    """
+    cProfile stats from every thread that worked on one request
+    """
+
+    def __init__(self):
+        self.profile_id = uuid.uuid4().hex
+        self.profiles = []
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, **kwargs):
+        """Run func under a profiler of its own and keep the stats"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.add(profile)
+
+    def add(self, profile: cProfile.Profile) -> None:
+        """Keep the stats of a finished profiler"""
+        with self._lock:
+            self.profiles.append(profile)
+
+    def save(self) -> str | None:
+        """
+        Merge the stats and write them to PROFILE_DIR
+        Returns:
+            path written or None if nothing was profiled
+        """
+        with self._lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        path = profile_path(self.profile_id)
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stats.dump_stats(path)
+        return path
+
+
+def report(profile_id: str, sort: str = "cumulative", limit: int = 50) -> str:
+    """
+    Text report of a saved profile
+    Args:
+        profile_id (str): id from the X-Profile-Id response header
+        sort (str): pstats sort key
+        limit (int): most functions to list
+    Returns:
+        str
+    Raises:
+        InvalidData if the id is invalid
+        FileNotFoundError if there is no such profile
+    """
+    stream = io.StringIO()
+    pstats.Stats(profile_path(profile_id), stream=stream).sort_stats(
+        sort
+    ).print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,131 @@
+"""
+Registry of the jinja templates we render for each device type
+"""
+
+from enum import Enum
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from jinja2 import Environment, FileSystemLoader, Template
+
+from app.exceptions import InvalidDeviceType, MissingTemplate
+from app.models import DeviceCapability
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+class TemplateOperation(str, Enum):
+    """
+    Operations that need a template, the file for each one is
+    <device_type>_<operation>.xml.j2
+    """
+
+    GET_INTERFACE = "get_interface"
+    GET_INTERFACES = "get_interfaces"
+    CREATE_INTERFACE = "create_interface"
+    CREATE_INTERFACES = "create_interfaces"
+    DELETE_INTERFACE = "delete_interface"
+    DELETE_INTERFACES = "delete_interfaces"
+
+
+def xpath_literal(value: str) -> str:
+    """
+    Quote a string as an XPath 1.0 literal, which has no escapes so a
+    string with both kinds of quote is joined up with concat()
+    """
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    return "concat('" + "', \"'\", '".join(value.split("'")) + "')"
+
+
+def xml_attr(value: str) -> str:
+    """Escape a string for a double quoted XML attribute"""
+    return escape(value, {'"': "&quot;"})
+
+
+class TemplateRegistry:
+    """
+    Compiled templates keyed by device type and operation
+
+    Every template is loaded and compiled once up front so a missing or
+    broken template stops the app starting instead of failing a request,
+    lookups afterwards are a dict get with no filesystem access
+    """
+
+    def __init__(self, template_dir: Path = TEMPLATE_DIR):
+        self.template_dir = Path(template_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(self.template_dir), auto_reload=False
+        )
+        self.env.filters["xpath_literal"] = xpath_literal
+        self.env.filters["xml_attr"] = xml_attr
+        self._templates = {}
+
+    def load(self, device_types: tuple | None = None) -> "TemplateRegistry":
+        """
+        Compile the full set of templates for each device type
+        Args:
+            device_types (tuple): device types to load, defaults to every
+                DeviceCapability
+        Returns:
+            TemplateRegistry
+        Raises:
+            MissingTemplate if a device type is missing any operation
+        """
+        if device_types is None:
+            device_types = tuple(
+                capability.name.lower() for capability in DeviceCapability
+            )
+
+        missing = [
+            self.template_name(device_type, operation)
+            for device_type in device_types
+            for operation in TemplateOperation
+            if not (
+                self.template_dir / self.template_name(device_type, operation)
+            ).is_file()
+        ]
+        if missing:
+            raise MissingTemplate(
+                f"Missing templates in {self.template_dir}: "
+                f"{', '.join(missing)}"
+            )
+
+        self._templates = {
+            (device_type, operation): self.env.get_template(
+                self.template_name(device_type, operation)
+            )
+            for device_type in device_types
+            for operation in TemplateOperation
+        }
+        return self
+
+    @staticmethod
+    def template_name(device_type: str, operation: TemplateOperation) -> str:
+        """File name of the template for a device type and operation"""
+        return f"{device_type}_{operation.value}.xml.j2"
+
+    def get(self, device_type: str, operation: TemplateOperation) -> Template:
+        """
+        Get the compiled template for a device type and operation
+        Raises:
+            InvalidDeviceType if we have no templates for the device type
+        """
+        try:
+            return self._templates[(device_type, operation)]
+        except KeyError as e:
+            raise InvalidDeviceType(
+                f"No {operation.value} template for device type "
+                f"{device_type}"
+            ) from e
+
+    def render(
+        self, device_type: str, operation: TemplateOperation, **kwargs
+    ) -> str:
+        """Render the template for a device type and operation"""
+        return self.get(device_type, operation).render(**kwargs)
+
+
+template_registry = TemplateRegistry().load()
@@ -0,0 +1,204 @@
+"""
+Coalesce writes to a device so many of them share one commit
+
+Commits are slow and serialised on the device, so rather than every
+write taking the candidate lock and committing on its own, writes to the
+same device queue here. The first writer waits a short window for
+others, then applies everything queued with one edit and one commit on
+behalf of the rest. Writes that arrive while that commit runs go in the
+next batch, led by the oldest of them once the current leader is done.
+Every writer still gets its own result or exception back
+
+Writers wait in the event loop rather than in a thread, only the one
+leading a batch needs a thread to do the blocking work. A writer
+with a deadline stops waiting once it passes and its write is taken out
+of the queue, as is the write of a cancelled writer, unless a batch is
+already applying it
+"""
+
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+
+from app.exceptions import DeadlineExceeded
+
+
+@dataclass(eq=False)
+class PendingWrite:  # pylint: disable=too-many-instance-attributes
+    """
+    One queued write and, once applied, its outcome
+    """
+
+    operation: str
+    name: str
+    data: object = None
+    result: object = None
+    error: BaseException | None = None
+    done: bool = False
+    leader: bool = False
+    # time.monotonic() the writer gives up by, if it set a deadline
+    deadline: float | None = None
+    # called once the write is done or leads, wakes its writer's loop
+    wake: Callable[[], None] | None = None
+
+    def resolve(self, result=None, error: BaseException | None = None):
+        """Record the outcome of the write"""
+        self.result = result
+        self.error = error
+        self.done = True
+
+    def outcome(self):
+        """
+        Returns:
+            the result of the write
+        Raises:
+            whatever the write raised
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class CommitScheduler:  # pylint: disable=too-few-public-methods
+    """
+    Queues of pending writes keyed by device, a key only has a queue
+    while one of its writers is leading
+    """
+
+    def __init__(self, window: float = 0.01, max_batch: int = 100):
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    async def submit_async(self, key: tuple, write: PendingWrite, apply, run):
+        """
+        Queue a write and wait in the event loop until it has been
+        applied, leading a batch on a thread if no other writer to the
+        device is
+        Args:
+            key (tuple): (host, credential) of the device
+            write (PendingWrite): the write to apply
+            apply (callable): takes a batch of writes, resolves each it
+                applies and returns those to put back for the next batch
+            run (callable): awaits a blocking call on a worker thread
+        Returns:
+            the result of the write
+        Raises:
+            whatever the write raised
+        """
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        write.wake = partial(loop.call_soon_threadsafe, woken.set)
+        with self._lock:
+            self._enqueue(key, write)
+        try:
+            while not write.done and not write.leader:
+                try:
+                    await asyncio.wait_for(
+                        woken.wait(), self._remaining(write)
+                    )
+                except TimeoutError as e:
+                    with self._lock:
+                        if not write.done and not write.leader:
+                            raise DeadlineExceeded(
+                                "Deadline exceeded waiting to commit to "
+                                f"{key[0]}"
+                            ) from e
+                woken.clear()
+        except BaseException:
+            # timed out or cancelled, the writes behind must not wait on us
+            with self._lock:
+                self._withdraw(key, write)
+            raise
+
+        if not write.done:
+            # a cancelled writer still leads so the queue is not left
+            # without a leader
+            await asyncio.shield(run(self._lead, key, write, apply))
+        return write.outcome()
+
+    def _enqueue(self, key: tuple, write: PendingWrite) -> None:
+        """Queue a write, it leads if the device has no queue yet"""
+        if key not in self.pending:
+            self.pending[key] = []
+            write.leader = True
+        self.pending[key].append(write)
+
+    @staticmethod
+    def _remaining(write: PendingWrite) -> float | None:
+        """Seconds until the write's deadline, None if it has none"""
+        if write.deadline is None:
+            return None
+        return write.deadline - time.monotonic()
+
+    def _withdraw(self, key: tuple, write: PendingWrite) -> None:
+        """
+        Take a write out of the queue once its writer stops waiting,
+        called with the lock held. If it had been handed the lead the
+        next write leads instead
+        """
+        pending = self.pending.get(key, [])
+        if write not in pending:
+            return
+        pending.remove(write)
+        if write.leader:
+            self._hand_over(key)
+
+    def _hand_over(self, key: tuple) -> None:
+        """
+        Make the oldest queued write lead, or drop the queue if there is
+        none, called with the lock held
+        """
+        pending = self.pending[key]
+        if pending:
+            pending[0].leader = True
+            self._wake(pending[0])
+        else:
+            del self.pending[key]
+
+    @staticmethod
+    def _wake(write: PendingWrite) -> None:
+        """Wake a writer waiting in an event loop"""
+        if write.wake is None:
+            return
+        try:
+            write.wake()
+        except RuntimeError:
+            # its event loop has closed, nobody is waiting any more
+            pass
+
+    def _lead(self, key: tuple, own: PendingWrite, apply) -> None:
+        """Apply batches until our own write is done then hand over"""
+        if self.window > 0:
+            time.sleep(self.window)
+        while not own.done:
+            with self._lock:
+                pending = self.pending[key]
+                batch = pending[: self.max_batch]
+                del pending[: len(batch)]
+            try:
+                deferred = apply(batch)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                deferred = []
+                for write in batch:
+                    if not write.done:
+                        write.resolve(error=e)
+            with self._lock:
+                self.pending[key][:0] = deferred
+            for write in batch:
+                if write.done and write is not own:
+                    self._wake(write)
+
+        with self._lock:
+            self._hand_over(key)
+
+
+commit_scheduler = CommitScheduler(
+    window=float(os.getenv("COMMIT_WINDOW", "0.01")),
+    max_batch=int(os.getenv("COMMIT_MAX_BATCH", "100")),
+)
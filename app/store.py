@@ -0,0 +1,757 @@
+"""
+SQLite stores for what we have discovered about devices, for background
+jobs, for the cache shared by every worker on a host and for versioned
+snapshots of device config
+"""
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from app.cache import TTLCache
+from app.metrics import CACHE_REQUESTS
+from app.models import Job, JobStatus
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """
+    What capability discovery found out about a host
+    """
+
+    host: str
+    device_type: str
+    capabilities: tuple = ()
+
+
+class SQLiteStore(abc.ABC):
+    """
+    A long lived SQLite connection in WAL mode shared between threads
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Open the long lived connection on first use and make sure the
+        schema is current
+        Returns:
+            sqlite3.Connection
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    @abc.abstractmethod
+    def migrate(conn: sqlite3.Connection) -> None:
+        """Create or update the tables this store needs"""
+
+    def close(self) -> None:
+        """Close the connection, it is reopened on next use"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class DeviceStore(SQLiteStore):
+    """
+    Device types and capabilities keyed by host
+
+    Reads are served from an in-process LRU/TTL cache so the hot path
+    does not touch SQLite, the table itself has a unique index on host
+    and saves are upserts. With a shared cache an in-process entry is
+    only trusted while the host is at the generation it was cached at,
+    so a save or invalidate in one worker is seen by every worker
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int = 10000,
+        cache_ttl: float = 3600,
+        shared=None,
+    ):
+        super().__init__(path)
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.shared = shared
+
+    def generation(self, host: str) -> int | None:
+        """Shared generation of a host, None without a shared cache"""
+        return None if self.shared is None else self.shared.generation(host)
+
+    @staticmethod
+    def migrate(conn: sqlite3.Connection) -> None:
+        """
+        Create the device_info table or bring an older one up to date,
+        older versions inserted a row per discovery so keep the newest
+        row per host before adding the unique index
+        """
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS device_info ( "
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "host TEXT NOT NULL, "
+                "device_type TEXT NOT NULL, "
+                "capabilities TEXT NOT NULL DEFAULT '[]', "
+                "updated_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {
+                row[1]
+                for row in conn.execute("PRAGMA table_info(device_info)")
+            }
+            if "capabilities" not in columns:
+                conn.execute(
+                    "ALTER TABLE device_info "
+                    "ADD COLUMN capabilities TEXT NOT NULL DEFAULT '[]'"
+                )
+            if "updated_at" not in columns:
+                conn.execute(
+                    "ALTER TABLE device_info "
+                    "ADD COLUMN updated_at REAL NOT NULL DEFAULT 0"
+                )
+            conn.execute(
+                "DELETE FROM device_info WHERE id NOT IN "
+                "(SELECT MAX(id) FROM device_info GROUP BY host)"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS device_info_host "
+                "ON device_info (host)"
+            )
+
+    def get(self, host: str) -> DeviceInfo:
+        """
+        Get what we know about a host
+        Args:
+            host (str): hostname of the device
+        Returns:
+            DeviceInfo or None if the host has not been discovered
+        """
+        generation = self.generation(host)
+        cached = self.cache.get(host)
+        if cached is not None and cached[0] == generation:
+            CACHE_REQUESTS.inc("device", "hit")
+            return cached[1]
+
+        CACHE_REQUESTS.inc("device", "miss")
+
+        with self._lock:
+            row = (
+                self.connection()
+                .execute(
+                    "SELECT device_type, capabilities FROM device_info "
+                    "WHERE host = ?",
+                    (host,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+
+        device_info = DeviceInfo(host, row[0], tuple(json.loads(row[1])))
+        self.cache.set(host, (generation, device_info))
+        return device_info
+
+    def save(self, device_info: DeviceInfo) -> None:
+        """
+        Insert or update a host
+        Args:
+            device_info (DeviceInfo): what we discovered
+        """
+        self.save_many([device_info])
+
+    def save_many(self, device_infos: list) -> None:
+        """
+        Insert or update many hosts in one transaction
+        Args:
+            device_infos (list): DeviceInfo for each host
+        """
+        now = time.time()
+        with self._lock:
+            with self.connection() as conn:
+                conn.executemany(
+                    "INSERT INTO device_info "
+                    "(host, device_type, capabilities, updated_at) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (host) DO UPDATE SET "
+                    "device_type = excluded.device_type, "
+                    "capabilities = excluded.capabilities, "
+                    "updated_at = excluded.updated_at",
+                    [
+                        (
+                            device_info.host,
+                            device_info.device_type,
+                            json.dumps(list(device_info.capabilities)),
+                            now,
+                        )
+                        for device_info in device_infos
+                    ],
+                )
+        if self.shared is not None:
+            self.shared.bump(*(info.host for info in device_infos))
+        for device_info in device_infos:
+            self.cache.set(
+                device_info.host,
+                (self.generation(device_info.host), device_info),
+            )
+
+    def invalidate(self, host: str) -> bool:
+        """
+        Forget a host so it is discovered again on next use
+        Args:
+            host (str): hostname of the device
+        Returns:
+            boolean if the host was stored
+        """
+        self.cache.invalidate(host)
+        with self._lock:
+            with self.connection() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM device_info WHERE host = ?", (host,)
+                )
+        if self.shared is not None:
+            self.shared.bump(host)
+        return cursor.rowcount > 0
+
+
+class JobStore(SQLiteStore):
+    """
+    Background jobs keyed by job id, kept in the same database as the
+    devices so they outlive a restart
+    """
+
+    COLUMNS = (
+        "job_id, operation, params, status, status_code, result, "
+        "created_at, started_at, finished_at, owner"
+    )
+
+    @staticmethod
+    def migrate(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ( "
+                "job_id TEXT PRIMARY KEY, "
+                "operation TEXT NOT NULL, "
+                "params TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "status_code INTEGER, "
+                "result TEXT, "
+                "created_at REAL NOT NULL, "
+                "started_at REAL, "
+                "finished_at REAL, "
+                "owner INTEGER)"
+            )
+            columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(jobs)")
+            }
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status "
+                "ON jobs (status, created_at)"
+            )
+
+    @staticmethod
+    def from_row(row: tuple) -> Job:
+        """Build a Job from a row of COLUMNS"""
+        return Job(
+            job_id=row[0],
+            operation=row[1],
+            params=json.loads(row[2]),
+            status=row[3],
+            status_code=row[4],
+            result=None if row[5] is None else json.loads(row[5]),
+            created_at=row[6],
+            started_at=row[7],
+            finished_at=row[8],
+            owner=row[9],
+        )
+
+    def save(self, job: Job) -> None:
+        """
+        Insert or update a job
+        Args:
+            job (Job): the job as it is now
+        """
+        with self._lock:
+            with self.connection() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO jobs ({self.COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job.job_id,
+                        job.operation,
+                        json.dumps(job.params),
+                        job.status.value,
+                        job.status_code,
+                        None if job.result is None else json.dumps(job.result),
+                        job.created_at,
+                        job.started_at,
+                        job.finished_at,
+                        job.owner,
+                    ),
+                )
+
+    def claim(self, job_id: str, owner: int) -> Job | None:
+        """
+        Mark a queued job running for a worker process, only one of the
+        processes sharing the database can claim a job
+        Args:
+            job_id (str): id returned when the job was queued
+            owner (int): pid of the worker process that will run it
+        Returns:
+            Job as claimed or None if it was not queued
+        """
+        with self._lock:
+            with self.connection() as conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner = ? "
+                    "WHERE job_id = ? AND status = ?",
+                    (
+                        JobStatus.RUNNING.value,
+                        time.time(),
+                        owner,
+                        job_id,
+                        JobStatus.QUEUED.value,
+                    ),
+                )
+        if cursor.rowcount != 1:
+            return None
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        Get a job
+        Args:
+            job_id (str): id returned when the job was queued
+        Returns:
+            Job or None if there is no such job
+        """
+        with self._lock:
+            row = (
+                self.connection()
+                .execute(
+                    f"SELECT {self.COLUMNS} FROM jobs WHERE job_id = ?",
+                    (job_id,),
+                )
+                .fetchone()
+            )
+        return None if row is None else self.from_row(row)
+
+    def with_status(self, status: JobStatus) -> list:
+        """
+        Jobs with a status, oldest first
+        Returns:
+            list of Job
+        """
+        with self._lock:
+            rows = (
+                self.connection()
+                .execute(
+                    f"SELECT {self.COLUMNS} FROM jobs WHERE status = ? "
+                    "ORDER BY created_at",
+                    (status.value,),
+                )
+                .fetchall()
+            )
+        return [self.from_row(row) for row in rows]
+
+    def purge(self, before: float) -> int:
+        """
+        Delete jobs that finished before a time
+        Args:
+            before (float): unix time
+        Returns:
+            int number of jobs deleted
+        """
+        with self._lock:
+            with self.connection() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM jobs WHERE finished_at < ?", (before,)
+                )
+        return cursor.rowcount
+
+
+class SharedCache(SQLiteStore):
+    """
+    Cache state shared by every worker process on a host
+
+    Each device host has a generation that any worker bumps when it
+    writes to the device or forgets it, workers check the generation
+    before trusting what they cached in process. Reads are also kept
+    here so a worker can serve what another one fetched
+    """
+
+    def __init__(self, path: str, ttl: float = 10, prune_every: int = 1000):
+        super().__init__(path)
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._sets = 0
+
+    @staticmethod
+    def migrate(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_generations ( "
+                "host TEXT PRIMARY KEY, "
+                "generation INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_reads ( "
+                "host TEXT NOT NULL, "
+                "key TEXT NOT NULL, "
+                "generation INTEGER NOT NULL, "
+                "data TEXT NOT NULL, "
+                "etag TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, "
+                "PRIMARY KEY (host, key))"
+            )
+
+    def generation(self, host: str) -> int:
+        """Current generation of a host"""
+        with self._lock:
+            row = (
+                self.connection()
+                .execute(
+                    "SELECT generation FROM cache_generations "
+                    "WHERE host = ?",
+                    (host,),
+                )
+                .fetchone()
+            )
+        return 0 if row is None else row[0]
+
+    def bump(self, *hosts: str) -> None:
+        """Move hosts to a new generation and drop their cached reads"""
+        with self._lock:
+            with self.connection() as conn:
+                conn.executemany(
+                    "INSERT INTO cache_generations (host, generation) "
+                    "VALUES (?, 1) ON CONFLICT (host) DO UPDATE SET "
+                    "generation = generation + 1",
+                    [(host,) for host in hosts],
+                )
+                conn.executemany(
+                    "DELETE FROM cache_reads WHERE host = ?",
+                    [(host,) for host in hosts],
+                )
+
+    def get(
+        self, host: str, generation: int, key: str, max_age: float
+    ) -> tuple | None:
+        """
+        Get a read another worker may have cached
+        Args:
+            host (str): hostname of the device
+            generation (int): generation the read must be from
+            key (str): what was read
+            max_age (float): oldest read we accept in seconds
+        Returns:
+            tuple (data, etag, age in seconds) or None on a miss
+        """
+        with self._lock:
+            row = (
+                self.connection()
+                .execute(
+                    "SELECT data, etag, stored_at FROM cache_reads "
+                    "WHERE host = ? AND key = ? AND generation = ? "
+                    "AND stored_at >= ?",
+                    (host, key, generation, time.time() - max_age),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], time.time() - row[2]
+
+    def set(
+        self, host: str, generation: int, key: str, data, etag: str
+    ) -> None:
+        """
+        Share a read with the other workers, reads from an older
+        generation than the current one are dropped
+        Args:
+            host (str): hostname of the device
+            generation (int): generation when the read started
+            key (str): what was read
+            data: json serialisable result of the read
+            etag (str): ETag of the data
+        """
+        encoded = json.dumps(data)
+        now = time.time()
+        with self._lock:
+            with self.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_reads "
+                    "(host, key, generation, data, etag, stored_at) "
+                    "SELECT ?, ?, ?, ?, ?, ? WHERE ? = "
+                    "COALESCE((SELECT generation FROM cache_generations "
+                    "WHERE host = ?), 0)",
+                    (host, key, generation, encoded, etag, now)
+                    + (generation, host),
+                )
+                self._sets += 1
+                if self._sets % self.prune_every == 0:
+                    conn.execute(
+                        "DELETE FROM cache_reads WHERE stored_at < ?",
+                        (now - self.ttl,),
+                    )
+
+    def clear(self) -> None:
+        """Drop every shared read"""
+        with self._lock:
+            with self.connection() as conn:
+                conn.execute("DELETE FROM cache_reads")
+
+
+def pack(data) -> bytes:
+    """Compressed json of data"""
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def unpack(blob: bytes):
+    """Data from pack"""
+    return json.loads(zlib.decompress(blob))
+
+
+def compare_snapshots(old: dict, new: dict) -> tuple:
+    """
+    What changed between two snapshots of interfaces keyed by name
+    Returns:
+        tuple (names added, names changed, names removed)
+    """
+    added = [name for name in new if name not in old]
+    changed = [name for name in new if name in old and new[name] != old[name]]
+    removed = [name for name in old if name not in new]
+    return added, changed, removed
+
+
+class SnapshotStore(SQLiteStore):
+    """
+    Versioned snapshots of the interfaces on each host
+
+    A snapshot is the interfaces keyed by name and is identified by the
+    ETag of the read it came from. Content the same as the latest
+    version keeps that version, anything else is a new one even if an
+    older version held it, so versions only go up. Every full_every
+    versions is stored whole and the versions between as what was set
+    or removed since the version before, all compressed. Only the last
+    keep versions of a host are held
+
+    The ETag and version of the latest snapshot of each host are kept in
+    memory for latest_ttl seconds so reads of unchanged content dont
+    query SQLite, other workers may save newer versions meanwhile
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        path: str,
+        full_every: int = 20,
+        keep: int = 100,
+        cache_size: int = 64,
+        latest_ttl: float = 10,
+    ):
+        super().__init__(path)
+        self.full_every = full_every
+        self.keep = keep
+        self.states = TTLCache(maxsize=cache_size, ttl=3600)
+        self.latest = TTLCache(maxsize=10000, ttl=latest_ttl)
+
+    @staticmethod
+    def migrate(conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS config_snapshots ( "
+                "host TEXT NOT NULL, "
+                "version INTEGER NOT NULL, "
+                "base INTEGER NOT NULL, "
+                "digest TEXT NOT NULL, "
+                "data BLOB NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "PRIMARY KEY (host, version))"
+            )
+            # versions are no longer looked up by digest
+            conn.execute("DROP INDEX IF EXISTS config_snapshots_digest")
+
+    def version(self, host: str, digest: str) -> int | None:
+        """
+        Version of the latest snapshot of a host if it has this content
+        Args:
+            host (str): hostname of the device
+            digest (str): ETag of the read
+        Returns:
+            int or None if the content is not the latest
+        """
+        latest = self.latest.get(host)
+        if latest is None:
+            with self._lock:
+                row = self._latest(self.connection(), host)
+            if row is None:
+                return None
+            latest = self.latest.set(host, (row[2], row[0])).value
+        return latest[1] if latest[0] == digest else None
+
+    @staticmethod
+    def _latest(conn: sqlite3.Connection, host: str) -> tuple | None:
+        """(version, base, digest) of the latest snapshot of a host"""
+        return conn.execute(
+            "SELECT version, base, digest FROM config_snapshots "
+            "WHERE host = ? ORDER BY version DESC LIMIT 1",
+            (host,),
+        ).fetchone()
+
+    def save(self, host: str, digest: str, interfaces: dict) -> int:
+        """
+        Save a snapshot as the next version unless the latest version
+        already has this content
+        Args:
+            host (str): hostname of the device
+            digest (str): ETag of the read
+            interfaces (dict): json serialisable interfaces keyed by name
+        Returns:
+            int version of the snapshot
+        """
+        with self._lock:
+            conn = self.connection()
+            with conn:
+                # take the write lock up front so workers saving the same
+                # host at once cant both claim the next version
+                conn.execute("BEGIN IMMEDIATE")
+                latest = self._latest(conn, host)
+                if latest is not None and latest[2] == digest:
+                    self.latest.set(host, (digest, latest[0]))
+                    return latest[0]
+
+                if latest is None or latest[0] - latest[1] + 1 >= (
+                    self.full_every
+                ):
+                    version = 1 if latest is None else latest[0] + 1
+                    base, data = version, interfaces
+                else:
+                    previous = self._load(conn, host, latest[0])
+                    added, changed, removed = compare_snapshots(
+                        previous, interfaces
+                    )
+                    version, base = latest[0] + 1, latest[1]
+                    data = {
+                        "set": {
+                            name: interfaces[name] for name in added + changed
+                        },
+                        "removed": removed,
+                    }
+                conn.execute(
+                    "INSERT INTO config_snapshots "
+                    "(host, version, base, digest, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (host, version, base, digest, pack(data), time.time()),
+                )
+                self._prune(conn, host, version)
+        self.states.set((host, version), interfaces)
+        self.latest.set(host, (digest, version))
+        return version
+
+    def _prune(self, conn: sqlite3.Connection, host: str, latest: int):
+        """Drop versions older than keep and what only they depend on"""
+        row = conn.execute(
+            "SELECT base FROM config_snapshots "
+            "WHERE host = ? AND version = ?",
+            (host, latest - self.keep + 1),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "DELETE FROM config_snapshots "
+                "WHERE host = ? AND version < ?",
+                (host, row[0]),
+            )
+
+    def load(self, host: str, version: int) -> dict | None:
+        """
+        Interfaces as they were at a version
+        Returns:
+            dict keyed by name or None if we dont hold the version
+        """
+        with self._lock:
+            return self._load(self.connection(), host, version)
+
+    def _load(self, conn: sqlite3.Connection, host: str, version: int):
+        """Rebuild a version from its full snapshot and the deltas after"""
+        interfaces = self.states.get((host, version))
+        if interfaces is not None:
+            return interfaces
+
+        rows = conn.execute(
+            "SELECT data FROM config_snapshots WHERE host = ? AND version "
+            "BETWEEN (SELECT base FROM config_snapshots "
+            "WHERE host = ? AND version = ?) AND ? ORDER BY version",
+            (host, host, version, version),
+        ).fetchall()
+        if not rows:
+            return None
+        interfaces = unpack(rows[0][0])
+        for (blob,) in rows[1:]:
+            delta = unpack(blob)
+            interfaces.update(delta["set"])
+            for name in delta["removed"]:
+                del interfaces[name]
+        self.states.set((host, version), interfaces)
+        return interfaces
+
+    def changes(self, host: str, since: int, version: int) -> tuple | None:
+        """
+        What changed on a host between two versions
+        Args:
+            host (str): hostname of the device
+            since (int): version the caller has
+            version (int): version to bring them up to
+        Returns:
+            tuple (interfaces added, interfaces changed, names removed)
+            or None if we dont hold either version
+        """
+        with self._lock:
+            conn = self.connection()
+            old = self._load(conn, host, since)
+            new = self._load(conn, host, version)
+        if old is None or new is None:
+            return None
+        added, changed, removed = compare_snapshots(old, new)
+        return (
+            [new[name] for name in added],
+            [new[name] for name in changed],
+            removed,
+        )
+
+
+shared_cache = (
+    SharedCache(
+        os.getenv("SHARED_CACHE_DB", os.getenv("NETCONF_DB", "netconf.db")),
+        ttl=float(os.getenv("READ_CACHE_TTL", "10")),
+    )
+    if os.getenv("SHARED_CACHE", "false").lower() in ("1", "true", "yes")
+    else None
+)
+device_store = DeviceStore(
+    os.getenv("NETCONF_DB", "netconf.db"),
+    cache_size=int(os.getenv("DEVICE_CACHE_SIZE", "10000")),
+    cache_ttl=float(os.getenv("DEVICE_CACHE_TTL", "3600")),
+    shared=shared_cache,
+)
+job_store = JobStore(os.getenv("NETCONF_DB", "netconf.db"))
+snapshot_store = SnapshotStore(
+    os.getenv("NETCONF_DB", "netconf.db"),
+    full_every=int(os.getenv("SNAPSHOT_FULL_EVERY", "20")),
+    keep=int(os.getenv("SNAPSHOT_KEEP", "100")),
+    latest_ttl=float(os.getenv("SNAPSHOT_LATEST_TTL", "10")),
+)
@@ -0,0 +1,210 @@
+"""
+Writes to devices shared by the write endpoints and the background jobs
+that run them, so both answer the same way
+"""
+
+import logging
+
+from fastapi import HTTPException
+
+from app.backend import InterfaceManager
+from app.batch import BatchInterfaceManager
+from app.device import Device
+from app.exceptions import CannotEdit, SessionPoolExhausted
+from app.models import CredentialType, ExistenceCheck, InterfaceConfig
+
+
+def write_error(e: Exception, cannot_edit_status: int = 409) -> HTTPException:
+    """
+    What a failed write answers with, the same whether the endpoint ran
+    it or a background job did, jobs take their status from it
+    Args:
+        e (Exception): what the write raised
+        cannot_edit_status (int): status when the write cant be made
+    Returns:
+        HTTPException to raise from e
+    """
+    if isinstance(e, CannotEdit):
+        logging.info(str(e))
+        return HTTPException(
+            status_code=cannot_edit_status, detail=f"Cannot edit: {e}"
+        )
+    if isinstance(e, SessionPoolExhausted):
+        logging.warning(str(e))
+        return HTTPException(status_code=503, detail=str(e))
+    logging.exception(e.__class__.__name__)
+    return HTTPException(
+        status_code=500, detail=f"Exception {e.__class__.__name__}: {e}"
+    )
+
+
+async def run_create_interface(
+    host: str,
+    interface_config: InterfaceConfig,
+    credential: CredentialType,
+    dry_run: bool,
+) -> dict:
+    """
+    Create an interface on the device, for POST /interface and its
+    background job
+    Returns:
+        dict
+    """
+    try:
+        device = await Device.load(host, credential.value)
+        interface_manager = InterfaceManager(device)
+        data = await interface_manager.create_async(interface_config, dry_run)
+        if dry_run:
+            return {
+                "dry_run": data,
+                "existence_check": ExistenceCheck.DEVICE,
+            }
+
+        return {
+            "detail": f"Successfully created {interface_config.interface_name}"
+        }
+    except Exception as e:
+        raise write_error(e, 409) from e
+
+
+async def run_delete_interface(
+    host: str, interface_name: str, credential: CredentialType, dry_run: bool
+) -> dict:
+    """
+    Delete an interface from the device, for DELETE /interface and its
+    background job
+    Returns:
+        dict
+    """
+    try:
+        device = await Device.load(host, credential.value)
+        interface_manager = InterfaceManager(device)
+        data = await interface_manager.delete_async(interface_name, dry_run)
+        if dry_run:
+            return {
+                "dry_run": data,
+                "existence_check": ExistenceCheck.DEVICE,
+            }
+
+        return {"detail": f"Successfully deleted {interface_name}"}
+    except Exception as e:
+        raise write_error(e, 404) from e
+
+
+async def run_create_interfaces(
+    host: str,
+    interface_configs: list[InterfaceConfig],
+    credential: CredentialType,
+    dry_run: bool,
+) -> dict:
+    """
+    Create several interfaces with one commit, for POST
+    /interfaces/batch and its background job
+    Returns:
+        dict
+    """
+    try:
+        device = await Device.load(host, credential.value)
+        interface_manager = BatchInterfaceManager(device)
+        results, data = await interface_manager.create_many_async(
+            interface_configs, dry_run
+        )
+        if dry_run:
+            return {"results": results, "dry_run": data}
+
+        return {"results": results}
+    except Exception as e:
+        raise write_error(e) from e
+
+
+async def run_delete_interfaces(
+    host: str,
+    interface_names: list[str],
+    credential: CredentialType,
+    dry_run: bool,
+) -> dict:
+    """
+    Delete several interfaces with one commit, for DELETE
+    /interfaces/batch and its background job
+    Returns:
+        dict
+    """
+    try:
+        device = await Device.load(host, credential.value)
+        interface_manager = BatchInterfaceManager(device)
+        results, data = await interface_manager.delete_many_async(
+            interface_names, dry_run
+        )
+        if dry_run:
+            return {"results": results, "dry_run": data}
+
+        return {"results": results}
+    except Exception as e:
+        raise write_error(e) from e
+
+
+async def run_reconcile_interfaces(
+    host: str,
+    interface_configs: list[InterfaceConfig],
+    credential: CredentialType,
+    name_prefix: str,
+    dry_run: bool,
+) -> dict:
+    """
+    Make the interfaces with a name prefix match a desired set, for PUT
+    /interfaces and its background job
+    Returns:
+        dict
+    """
+    try:
+        device = await Device.load(host, credential.value)
+        interface_manager = BatchInterfaceManager(device)
+        diff, data = await interface_manager.reconcile_async(
+            interface_configs, name_prefix, dry_run
+        )
+        if dry_run:
+            return diff.model_dump() | {"dry_run": data}
+
+        return diff.model_dump() | {"committed": not diff.is_empty}
+    except Exception as e:
+        raise write_error(e) from e
+
+
+# how to run each background job, the params are what queue_job saved
+JOB_HANDLERS = {
+    "create_interface": lambda params: run_create_interface(
+        host=params["host"],
+        interface_config=InterfaceConfig(**params["interface_config"]),
+        credential=CredentialType(params["credential"]),
+        dry_run=params["dry_run"],
+    ),
+    "delete_interface": lambda params: run_delete_interface(
+        host=params["host"],
+        interface_name=params["interface_name"],
+        credential=CredentialType(params["credential"]),
+        dry_run=params["dry_run"],
+    ),
+    "create_interfaces": lambda params: run_create_interfaces(
+        host=params["host"],
+        interface_configs=[
+            InterfaceConfig(**config) for config in params["interface_configs"]
+        ],
+        credential=CredentialType(params["credential"]),
+        dry_run=params["dry_run"],
+    ),
+    "reconcile_interfaces": lambda params: run_reconcile_interfaces(
+        host=params["host"],
+        interface_configs=[
+            InterfaceConfig(**config) for config in params["interface_configs"]
+        ],
+        credential=CredentialType(params["credential"]),
+        name_prefix=params["name_prefix"],
+        dry_run=params["dry_run"],
+    ),
+    "delete_interfaces": lambda params: run_delete_interfaces(
+        host=params["host"],
+        interface_names=params["interface_names"],
+        credential=CredentialType(params["credential"]),
+        dry_run=params["dry_run"],
+    ),
+}
@@ -0,0 +1,231 @@
+"""
+Offline benchmarks for the render, parse, validate and json hot paths
+
+Runs against synthetic IOS-XR replies so no device is needed:
+    python benchmarks.py --save benchmark_baseline.json
+    python benchmarks.py --compare benchmark_baseline.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.backend import Device, InterfaceManager
+from app.models import InterfaceConfig
+from app.parsers import parse_interfaces
+from app.registry import TemplateOperation, template_registry
+from app.store import DeviceInfo, device_store
+from tests.fixtures import iosxr_interfaces_xml
+
+SIZES = (10, 100, 1000, 10000, 50000)
+HOST = "benchmark"
+
+
+def benchmark_device() -> Device:
+    """
+    A Device whose type is served from a throwaway store so building it
+    does not open a NETCONF session
+    """
+    device_store.close()
+    device_store.cache.clear()
+    device_store.path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    device_store.save(DeviceInfo(HOST, "iosxr"))
+    os.environ.setdefault("DEFAULT_USERNAME", "benchmark")
+    os.environ.setdefault("DEFAULT_PASSWORD", "benchmark")
+    return Device(HOST, "default")
+
+
+def stub_session(xml_data: str) -> SimpleNamespace:
+    """Stands in for a NETCONF session that always returns xml_data"""
+    reply = SimpleNamespace(data_xml=xml_data)
+    return SimpleNamespace(get_config=lambda **_: reply)
+
+
+def build_cases(device: Device, size: int) -> dict:
+    """
+    Set up each case for a size, only the returned callables are timed
+    Args:
+        device (Device): device to parse and validate for
+        size (int): interfaces in the synthetic reply
+    Returns:
+        dict of case name to a callable with no arguments
+    """
+    interface_manager = InterfaceManager(device)
+    session = stub_session(iosxr_interfaces_xml(size))
+    rendered_filter = template_registry.render(
+        device.device_type, TemplateOperation.GET_INTERFACES
+    )
+    element = device.get_config_element(session, rendered_filter)
+    data = device.get_config(session, rendered_filter)
+    interfaces = [
+        InterfaceConfig(
+            interface_name=f"Loopback{index}",
+            address=f"10.{index // 256 % 256}.{index % 256}.1",
+            netmask="255.255.255.255",
+        )
+        for index in range(size)
+    ]
+    return {
+        "render": lambda: template_registry.render(
+            device.device_type,
+            TemplateOperation.CREATE_INTERFACES,
+            interfaces=interfaces,
+        ),
+        "parse": lambda: device.get_config(session, rendered_filter),
+        "parse_records": lambda: parse_interfaces(
+            device.get_config_element(session, rendered_filter)
+        ),
+        "validate": lambda: interface_manager.validate_data(element),
+        "json": lambda: JSONResponse(jsonable_encoder(data)).body,
+    }
+
+
+def measure(func, size: int, repeat: int, min_time: float) -> dict:
+    """
+    Time a case and then measure its peak memory in a separate run so
+    tracemalloc does not skew the timings
+    Args:
+        func (callable): the case
+        size (int): interfaces the case handles per run
+        repeat (int): least number of timed runs
+        min_time (float): keep running until this many seconds pass
+    Returns:
+        dict of the result
+    """
+    gc.collect()
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - started < min_time:
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        "runs": len(times),
+        "median_s": median,
+        "best_s": min(times),
+        "interfaces_per_s": size / median if median else None,
+        "peak_bytes": peak,
+    }
+
+
+def run(sizes: tuple, repeat: int, min_time: float) -> dict:
+    """
+    Run every case for every size
+    Returns:
+        dict with meta about the run and results keyed case/size
+    """
+    device = benchmark_device()
+    results = {}
+    for size in sizes:
+        for name, func in build_cases(device, size).items():
+            key = f"{name}/{size}"
+            results[key] = measure(func, size, repeat, min_time)
+            print_result(key, results[key])
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    time_threshold: float = 0.25,
+    memory_threshold: float = 0.1,
+) -> list:
+    """
+    Find cases that got slower or use more memory than the baseline
+    Args:
+        baseline (dict): earlier output of run
+        current (dict): output of run
+        time_threshold (float): allowed slowdown of the median, 0.25 is 25%
+        memory_threshold (float): allowed growth of the peak memory
+    Returns:
+        list of str describing each regression
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        if result["median_s"] > before["median_s"] * (1 + time_threshold):
+            regressions.append(
+                f"{key} median {before['median_s'] * 1000:.3f} ms -> "
+                f"{result['median_s'] * 1000:.3f} ms"
+            )
+        if result["peak_bytes"] > before["peak_bytes"] * (
+            1 + memory_threshold
+        ):
+            regressions.append(
+                f"{key} peak memory {before['peak_bytes']} -> "
+                f"{result['peak_bytes']} bytes"
+            )
+    return regressions
+
+
+def print_result(key: str, result: dict) -> None:
+    """Print one result as it finishes"""
+    print(
+        f"{key:<22} {result['median_s'] * 1000:>10.3f} ms "
+        f"{result['interfaces_per_s'] or 0:>14,.0f} if/s "
+        f"{result['peak_bytes'] / 1024 / 1024:>9.2f} MiB "
+        f"({result['runs']} runs)"
+    )
+
+
+def main() -> int:
+    """Run the benchmarks and save or compare the results"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline file to compare with")
+    parser.add_argument("--time-threshold", type=float, default=0.25)
+    parser.add_argument("--memory-threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    current = run(tuple(args.sizes), args.repeat, args.min_time)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as baseline_file:
+            json.dump(current, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(
+            baseline, current, args.time_threshold, args.memory_threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against", args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,13 @@ This file is designed to be run after the server is started in another shell
 """
 
 import logging
+import os
 
 import requests
 
 logging.basicConfig(level="DEBUG")
 
-HOST = "sandbox-iosxr-1.cisco.com"
+HOST = os.getenv("INTEGRATION_HOST", "sandbox-iosxr-1.cisco.com")
 
 
 def test_healthz():
@@ -0,0 +1,264 @@
+"""
+Load test the app against the local NETCONF simulator
+
+Starts the simulator and the app, drives each endpoint at a set
+concurrency and reports latency percentiles, throughput and how many
+SSH sessions the app opened to the simulator:
+    python load_test.py --requests 500 --concurrency 20 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from simulator import Simulator
+
+HOST = "127.0.0.1"
+
+
+def scenarios(interfaces: int) -> dict:
+    """
+    Requests to send for each endpoint, each builds the nth request
+    Args:
+        interfaces (int): interfaces on the simulator
+    Returns:
+        dict of name to callable returning (method, path, params, json)
+    """
+    return {
+        "GET /interfaces": lambda n: (
+            "GET",
+            "/interfaces",
+            {"host": HOST, "max_age": 0},
+            None,
+        ),
+        "GET /interfaces cached": lambda n: (
+            "GET",
+            "/interfaces",
+            {"host": HOST},
+            None,
+        ),
+        "GET /interface": lambda n: (
+            "GET",
+            "/interface",
+            {
+                "host": HOST,
+                "interface_name": f"Loopback{n % interfaces}",
+                "max_age": 0,
+            },
+            None,
+        ),
+        "POST /interface": lambda n: (
+            "POST",
+            "/interface",
+            {"host": HOST},
+            {
+                "interface_name": f"Loopback{interfaces + n}",
+                "address": f"10.255.{n // 256 % 256}.{n % 256}",
+                "netmask": "255.255.255.255",
+            },
+        ),
+        "DELETE /interface": lambda n: (
+            "DELETE",
+            "/interface",
+            {"host": HOST, "interface_name": f"Loopback{interfaces + n}"},
+            None,
+        ),
+    }
+
+
+def start_app(
+    port: int, netconf_port: int, workers: int = 1
+) -> subprocess.Popen:
+    """
+    Run the app in its own process pointed at the simulator and wait
+    for it to answer health checks, more than one worker process share
+    their caches through the database
+    """
+    env = os.environ | {
+        "NETCONF_PORT": str(netconf_port),
+        "NETCONF_DB": os.path.join(tempfile.mkdtemp(), "load_test.db"),
+        "DEFAULT_USERNAME": os.getenv("DEFAULT_USERNAME", "load"),
+        "DEFAULT_PASSWORD": os.getenv("DEFAULT_PASSWORD", "load"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "SHARED_CACHE": "true" if workers > 1 else "false",
+    }
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+            "--workers",
+            str(workers),
+        ],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://{HOST}:{port}/healthz").is_success:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start")
+
+
+async def drive(
+    client: httpx.AsyncClient, build, requests: int, concurrency: int
+) -> dict:
+    """
+    Send requests from concurrency workers and time each one
+    Args:
+        client (httpx.AsyncClient): client for the app
+        build (callable): builds the nth request
+        requests (int): total requests to send
+        concurrency (int): requests in flight at once
+    Returns:
+        dict of latencies, errors by status and elapsed seconds
+    """
+    latencies = []
+    errors = Counter()
+    indexes = iter(range(requests))
+
+    async def worker():
+        for index in indexes:
+            method, path, params, body = build(index)
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, path, params=params, json=body
+                )
+                if not response.is_success:
+                    errors[response.status_code] += 1
+            except httpx.HTTPError as e:
+                errors[e.__class__.__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {
+        "latencies": latencies,
+        "errors": errors,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def summarise(run: dict, simulator: Simulator) -> dict:
+    """
+    Percentiles, throughput and simulator counters for one endpoint
+    Returns:
+        dict of the summary
+    """
+    latencies = run["latencies"]
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": dict(run["errors"]),
+        "p50_ms": p50 * 1000,
+        "p95_ms": p95 * 1000,
+        "p99_ms": p99 * 1000,
+        "requests_per_s": len(latencies) / run["elapsed"],
+        "ssh_sessions": simulator.stats["sessions_opened"],
+        "ssh_rejected": simulator.stats["sessions_rejected"],
+        "rpcs": dict(simulator.rpcs),
+    }
+
+
+async def load_test(args: argparse.Namespace, simulator: Simulator) -> dict:
+    """
+    Run each scenario in order against the app
+    Returns:
+        dict of scenario name to summary
+    """
+    results = {}
+    builds = scenarios(args.interfaces)
+    names = args.scenarios or list(builds)
+    async with httpx.AsyncClient(
+        base_url=f"http://{HOST}:{args.app_port}",
+        timeout=120,
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as client:
+        simulator.reset_stats()
+        warm_up = await drive(client, builds["GET /interface"], 1, 1)
+        results["discovery"] = summarise(warm_up, simulator)
+        for name in names:
+            simulator.reset_stats()
+            run = await drive(
+                client, builds[name], args.requests, args.concurrency
+            )
+            results[name] = summarise(run, simulator)
+    return results
+
+
+def print_results(results: dict) -> None:
+    """Print a table of the results"""
+    print(
+        f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'p50 ms':>10}"
+        f"{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'ssh':>6}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<24}{result['requests']:>9}"
+            f"{sum(result['errors'].values()):>8}"
+            f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+            f"{result['p99_ms']:>10.1f}{result['requests_per_s']:>9.1f}"
+            f"{result['ssh_sessions']:>6}"
+        )
+        if result["errors"]:
+            print(f"{'':<24}errors by status {result['errors']}")
+
+
+def main() -> None:
+    """Start everything, run the load test and report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--interfaces", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--max-sessions", type=int, default=10)
+    parser.add_argument("--app-port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(scenarios(0)), default=None
+    )
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    with Simulator(
+        interfaces=args.interfaces,
+        latency=args.latency,
+        max_sessions=args.max_sessions,
+    ) as simulator:
+        app = start_app(args.app_port, simulator.port, args.workers)
+        try:
+            results = asyncio.run(load_test(args, simulator))
+        finally:
+            app.terminate()
+            app.wait()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+./venv/bin/python -m app.discovery "$@"
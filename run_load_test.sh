@@ -0,0 +1 @@
+./venv/bin/python load_test.py "$@"
@@ -0,0 +1,737 @@
+"""
+NETCONF over SSH simulator that speaks enough IOS-XR for local testing
+
+Serves get-config with subtree filters, edit-config on the candidate,
+commit, discard-changes, lock/unlock and create-subscription. Every
+change to running is sent to subscribed sessions as an RFC 6470
+netconf-config-change notification:
+    python simulator.py --port 8300 --interfaces 1000 --latency 0.05
+"""
+
+import argparse
+import itertools
+import logging
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from copy import deepcopy
+
+import paramiko
+from lxml import etree
+
+from app.parsers import parse_xml
+from tests.fixtures import iosxr_interfaces_xml
+
+BASE_NS = "urn:ietf:params:xml:ns:netconf:base:1.0"
+BASE_10 = "urn:ietf:params:netconf:base:1.0"
+BASE_11 = "urn:ietf:params:netconf:base:1.1"
+NOTIFICATION_NS = "urn:ietf:params:xml:ns:netconf:notification:1.0"
+CONFIG_CHANGE_NS = "urn:ietf:params:xml:ns:yang:ietf-netconf-notifications"
+OPERATION = f"{{{BASE_NS}}}operation"
+CAPABILITIES = (
+    BASE_10,
+    BASE_11,
+    "urn:ietf:params:netconf:capability:candidate:1.0",
+    "urn:ietf:params:netconf:capability:rollback-on-error:1.0",
+    "urn:ietf:params:netconf:capability:notification:1.0",
+    "urn:ietf:params:netconf:capability:interleave:1.0",
+    "http://cisco.com/ns/yang/Cisco-IOS-XR-ifmgr-cfg"
+    "?module=Cisco-IOS-XR-ifmgr-cfg&revision=2017-09-07",
+    "http://cisco.com/ns/yang/Cisco-IOS-XR-ipv4-io-cfg"
+    "?module=Cisco-IOS-XR-ipv4-io-cfg&revision=2018-01-18",
+    "http://cisco.com/ns/yang/Cisco-IOS-XR-infra-rsi-cfg"
+    "?module=Cisco-IOS-XR-infra-rsi-cfg&revision=2018-06-15",
+)
+# leaves that identify an entry in a list, used to match edits to data
+LIST_KEYS = ("active", "interface-name")
+END_OF_MESSAGE = b"]]>]]>"
+END_OF_CHUNKS = b"\n##\n"
+CHUNK_HEADER = re.compile(rb"\n#(\d+)\n")
+PARSER = etree.XMLParser(remove_blank_text=True, huge_tree=True)
+
+
+class RpcError(Exception):
+    """
+    Use when an rpc fails and the client should get an rpc-error
+    """
+
+    def __init__(self, tag: str, message: str, error_type="application"):
+        super().__init__(message)
+        self.tag = tag
+        self.error_type = error_type
+
+    def element(self) -> etree._Element:
+        """The rpc-error element for the reply"""
+        error = etree.Element(f"{{{BASE_NS}}}rpc-error")
+        for name, value in (
+            ("error-type", self.error_type),
+            ("error-tag", self.tag),
+            ("error-severity", "error"),
+            ("error-message", str(self)),
+        ):
+            etree.SubElement(error, f"{{{BASE_NS}}}{name}").text = value
+        return error
+
+
+def subtree_filter(data: etree._Element, spec: etree._Element):
+    """
+    Apply an RFC 6241 subtree filter node to a data node
+    Args:
+        data (etree._Element): node from the datastore
+        spec (etree._Element): filter node with the same tag
+    Returns:
+        trimmed copy of data or None if it does not match
+    """
+    if data.tag != spec.tag:
+        return None
+    children = list(spec)
+    if not children:
+        return deepcopy(data)
+
+    content = [
+        node
+        for node in children
+        if len(node) == 0 and (node.text or "").strip()
+    ]
+    for node in content:
+        if not any(
+            child.tag == node.tag
+            and (child.text or "").strip() == node.text.strip()
+            for child in data
+        ):
+            return None
+    if len(content) == len(children):
+        return deepcopy(data)
+
+    result = etree.Element(data.tag, data.attrib, nsmap=data.nsmap)
+    for child in data:
+        for node in children:
+            if node.tag != child.tag:
+                continue
+            if len(node) == 0:
+                result.append(deepcopy(child))
+                break
+            trimmed = subtree_filter(child, node)
+            if trimmed is not None:
+                result.append(trimmed)
+                break
+    return result if len(result) else None
+
+
+def find_match(parent: etree._Element, node: etree._Element):
+    """
+    Find the child of parent an edit node refers to, list entries are
+    matched on their keys and containers on their tag
+    """
+    keys = {
+        child.tag: (child.text or "").strip()
+        for child in node
+        if etree.QName(child).localname in LIST_KEYS
+    }
+    for child in parent:
+        if child.tag != node.tag:
+            continue
+        if all(
+            (child.findtext(tag) or "").strip() == value
+            for tag, value in keys.items()
+        ):
+            return child
+    return None
+
+
+def strip_operations(node: etree._Element) -> etree._Element:
+    """Drop nc:operation attributes before storing edited config"""
+    for element in node.iter():
+        element.attrib.pop(OPERATION, None)
+    return node
+
+
+def merge(parent: etree._Element, node: etree._Element, operation: str):
+    """
+    Apply one edit-config node under parent
+    Args:
+        parent (etree._Element): datastore node to edit
+        node (etree._Element): config node from the edit
+        operation (str): operation inherited from the parent node
+    Raises:
+        RpcError for a delete of missing data or create of existing data
+    """
+    operation = node.get(OPERATION, operation)
+    existing = find_match(parent, node)
+    if operation in ("delete", "remove"):
+        if existing is not None:
+            parent.remove(existing)
+        elif operation == "delete":
+            raise RpcError("data-missing", f"{node.tag} does not exist")
+        return
+    if operation == "create" and existing is not None:
+        raise RpcError("data-exists", f"{node.tag} already exists")
+    if existing is None or operation == "replace":
+        if existing is not None:
+            parent.remove(existing)
+        parent.append(strip_operations(deepcopy(node)))
+        return
+    if len(node) == 0:
+        existing.text = node.text
+        return
+    for child in node:
+        merge(existing, child, operation)
+
+
+class SimulatedConfig:
+    """
+    Running and candidate datastores shared by every session
+    """
+
+    def __init__(self, interfaces: int = 100):
+        self.running = parse_xml(iosxr_interfaces_xml(interfaces))
+        self.candidate = deepcopy(self.running)
+        self.locks = {}
+        self._lock = threading.Lock()
+
+    def get_config(self, source: str, spec) -> etree._Element:
+        """
+        Get a datastore trimmed by an optional subtree filter
+        Returns:
+            data element for the reply
+        """
+        data = etree.Element(f"{{{BASE_NS}}}data")
+        with self._lock:
+            datastore = self.datastore(source)
+            for child in datastore:
+                if spec is None:
+                    data.append(deepcopy(child))
+                    continue
+                for node in spec:
+                    trimmed = subtree_filter(child, node)
+                    if trimmed is not None:
+                        data.append(trimmed)
+                        break
+        return data
+
+    def edit_config(
+        self,
+        session_id: int,
+        target: str,
+        config: etree._Element,
+        default_operation: str = "merge",
+    ) -> None:
+        """
+        Edit the candidate, IOS-XR has no writable running
+        Raises:
+            RpcError if the target is not the candidate or it is locked
+        """
+        if target != "candidate":
+            raise RpcError("invalid-value", f"Cannot edit {target}")
+        with self._lock:
+            self.check_lock(session_id, target)
+            candidate = deepcopy(self.candidate)
+            for node in config:
+                merge(candidate, node, default_operation)
+            self.candidate = candidate
+
+    def commit(self, session_id: int) -> None:
+        """Copy the candidate to running"""
+        with self._lock:
+            self.check_lock(session_id, "candidate")
+            self.running = deepcopy(self.candidate)
+
+    def edit_running(self, config: etree._Element) -> None:
+        """
+        Change running as if someone had used the CLI, the candidate
+        gets the same change
+        """
+        with self._lock:
+            for datastore in ("running", "candidate"):
+                edited = deepcopy(getattr(self, datastore))
+                for node in config:
+                    merge(edited, node, "merge")
+                setattr(self, datastore, edited)
+
+    def discard_changes(self) -> None:
+        """Reset the candidate to running"""
+        with self._lock:
+            self.candidate = deepcopy(self.running)
+
+    def lock(self, session_id: int, target: str) -> None:
+        """
+        Lock a datastore for a session
+        Raises:
+            RpcError if another session holds the lock
+        """
+        with self._lock:
+            holder = self.locks.get(target)
+            if holder not in (None, session_id):
+                raise RpcError("lock-denied", f"Lock held by {holder}")
+            self.locks[target] = session_id
+
+    def unlock(self, session_id: int, target: str) -> None:
+        """
+        Unlock a datastore held by a session
+        Raises:
+            RpcError if the session does not hold the lock
+        """
+        with self._lock:
+            if self.locks.get(target) != session_id:
+                raise RpcError("operation-failed", f"{target} is not locked")
+            del self.locks[target]
+
+    def release(self, session_id: int) -> None:
+        """
+        Drop the locks of a closed session, uncommitted changes under a
+        candidate lock are discarded like on a real device
+        """
+        with self._lock:
+            if self.locks.get("candidate") == session_id:
+                self.candidate = deepcopy(self.running)
+            for target in [
+                target
+                for target, holder in self.locks.items()
+                if holder == session_id
+            ]:
+                del self.locks[target]
+
+    def check_lock(self, session_id: int, target: str) -> None:
+        """Raise if another session holds the lock on a datastore"""
+        holder = self.locks.get(target)
+        if holder not in (None, session_id):
+            raise RpcError("in-use", f"{target} is locked by {holder}")
+
+    def datastore(self, source: str) -> etree._Element:
+        """Get a datastore by name"""
+        if source == "running":
+            return self.running
+        if source == "candidate":
+            return self.candidate
+        raise RpcError("invalid-value", f"Unknown datastore {source}")
+
+
+class NetconfSession:
+    """
+    One NETCONF session on an SSH channel
+    """
+
+    def __init__(self, simulator: "Simulator", channel, session_id: int):
+        self.simulator = simulator
+        self.channel = channel
+        self.session_id = session_id
+        self.chunked = False
+        self.buffer = bytearray()
+        self.subscribed = False
+        self._send_lock = threading.Lock()
+
+    def run(self) -> None:
+        """Exchange hellos then answer rpcs until the session closes"""
+        try:
+            self.send(self.hello())
+            hello = etree.fromstring(self.read_hello(), PARSER)
+            self.chunked = any(
+                capability.text.strip() == BASE_11
+                for capability in hello.iter(f"{{{BASE_NS}}}capability")
+            )
+            while True:
+                reply, close = self.handle(self.read_message())
+                self.send(reply)
+                if close:
+                    break
+        except (EOFError, OSError, etree.XMLSyntaxError) as e:
+            logging.debug("Session %s ended: %s", self.session_id, e)
+        finally:
+            self.simulator.unsubscribe(self)
+            self.simulator.config.release(self.session_id)
+            self.channel.close()
+
+    def hello(self) -> bytes:
+        """Our hello with the IOS-XR capabilities"""
+        hello = etree.Element(f"{{{BASE_NS}}}hello", nsmap={None: BASE_NS})
+        capabilities = etree.SubElement(hello, f"{{{BASE_NS}}}capabilities")
+        for capability in CAPABILITIES:
+            etree.SubElement(capabilities, f"{{{BASE_NS}}}capability").text = (
+                capability
+            )
+        etree.SubElement(hello, f"{{{BASE_NS}}}session-id").text = str(
+            self.session_id
+        )
+        return etree.tostring(hello)
+
+    def handle(self, message: bytes) -> tuple:
+        """
+        Answer one rpc
+        Returns:
+            tuple (reply bytes, boolean if the session should close)
+        """
+        rpc = etree.fromstring(message, PARSER)
+        operation = rpc[0]
+        name = etree.QName(operation).localname
+        self.simulator.count_rpc(name)
+        if self.simulator.latency:
+            time.sleep(self.simulator.latency)
+
+        reply = etree.Element(
+            f"{{{BASE_NS}}}rpc-reply", rpc.attrib, nsmap={None: BASE_NS}
+        )
+        try:
+            body = self.dispatch(name, operation)
+        except RpcError as e:
+            body = e.element()
+        reply.append(
+            etree.Element(f"{{{BASE_NS}}}ok") if body is None else body
+        )
+        return etree.tostring(reply), name == "close-session"
+
+    def dispatch(self, name: str, operation: etree._Element):
+        """
+        Run an rpc against the datastores
+        Returns:
+            element for the reply body or None for ok
+        """
+        config = self.simulator.config
+        if name in ("get-config", "get"):
+            return config.get_config(
+                self.datastore_name(operation, "source") or "running",
+                operation.find("{*}filter"),
+            )
+        if name == "edit-config":
+            default_operation = operation.findtext("{*}default-operation")
+            config.edit_config(
+                self.session_id,
+                self.datastore_name(operation, "target"),
+                operation.find("{*}config"),
+                (default_operation or "merge").strip(),
+            )
+        elif name == "commit":
+            config.commit(self.session_id)
+            self.simulator.config_changed(self.session_id)
+        elif name == "create-subscription":
+            if self.subscribed:
+                raise RpcError("operation-failed", "Already subscribed")
+            self.simulator.subscribe(self)
+        elif name == "discard-changes":
+            config.discard_changes()
+        elif name == "lock":
+            config.lock(
+                self.session_id, self.datastore_name(operation, "target")
+            )
+        elif name == "unlock":
+            config.unlock(
+                self.session_id, self.datastore_name(operation, "target")
+            )
+        elif name != "close-session":
+            raise RpcError(
+                "operation-not-supported",
+                f"{name} is not supported",
+                "protocol",
+            )
+        return None
+
+    @staticmethod
+    def datastore_name(operation: etree._Element, parameter: str):
+        """Name of the datastore in a source or target parameter"""
+        node = operation.find(f"{{*}}{parameter}")
+        if node is None or len(node) == 0:
+            return None
+        return etree.QName(node[0]).localname
+
+    def fill(self) -> None:
+        """Read more from the channel"""
+        data = self.channel.recv(65536)
+        if not data:
+            raise EOFError("Channel closed")
+        self.buffer += data
+
+    def read_hello(self) -> bytes:
+        """
+        Read the client's hello, ncclient can switch to chunked framing
+        on seeing our hello before it has sent its own
+        """
+        while len(self.buffer) < 2:
+            self.fill()
+        self.chunked = self.buffer.startswith(b"\n#")
+        return self.read_message()
+
+    def read_message(self) -> bytes:
+        """Read one message in the framing agreed in the hellos"""
+        if self.chunked:
+            return self.read_chunked()
+        while (end := self.buffer.find(END_OF_MESSAGE)) < 0:
+            self.fill()
+        message = bytes(self.buffer[:end])
+        del self.buffer[: end + len(END_OF_MESSAGE)]
+        return message
+
+    def read_chunked(self) -> bytes:
+        """Read one message in NETCONF 1.1 chunked framing"""
+        chunks = []
+        while True:
+            while len(self.buffer) < len(END_OF_CHUNKS):
+                self.fill()
+            if self.buffer.startswith(END_OF_CHUNKS):
+                del self.buffer[: len(END_OF_CHUNKS)]
+                return b"".join(chunks)
+            match = CHUNK_HEADER.match(self.buffer)
+            if match is None:
+                if len(self.buffer) > 16:
+                    raise EOFError("Bad chunk header")
+                self.fill()
+                continue
+            end = match.end() + int(match.group(1))
+            while len(self.buffer) < end:
+                self.fill()
+            chunks.append(bytes(self.buffer[match.end() : end]))
+            del self.buffer[:end]
+
+    def send(self, message: bytes) -> None:
+        """Send one message in the framing agreed in the hellos"""
+        if self.chunked:
+            message = f"\n#{len(message)}\n".encode() + message + END_OF_CHUNKS
+        else:
+            message += END_OF_MESSAGE
+        # notifications are sent from the thread of the committing session
+        with self._send_lock:
+            self.channel.sendall(message)
+
+
+class SSHServer(paramiko.ServerInterface):
+    """
+    Accepts password logins and starts the netconf subsystem
+    """
+
+    def __init__(self, simulator: "Simulator"):
+        self.simulator = simulator
+
+    def get_allowed_auths(self, username: str) -> str:
+        return "password"
+
+    def check_auth_password(self, username: str, password: str) -> int:
+        if self.simulator.credentials in (None, (username, password)):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind: str, chanid: int) -> int:
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_subsystem_request(self, channel, name: str) -> bool:
+        if name != "netconf":
+            return False
+        session = NetconfSession(
+            self.simulator, channel, self.simulator.next_session_id()
+        )
+        threading.Thread(target=session.run, daemon=True).start()
+        return True
+
+
+class Simulator:  # pylint: disable=too-many-instance-attributes
+    """
+    NETCONF over SSH server with a simulated IOS-XR config
+
+    Every rpc sleeps for latency seconds first and connections past
+    max_sessions are dropped before the SSH handshake
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        interfaces: int = 100,
+        latency: float = 0.0,
+        max_sessions: int = 10,
+        credentials: tuple | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.max_sessions = max_sessions
+        self.credentials = credentials
+        self.config = SimulatedConfig(interfaces)
+        self.stats = Counter()
+        self.rpcs = Counter()
+        self._session_ids = itertools.count(1)
+        self._subscribers = set()
+        self._transports = set()
+        self._host_key = None
+        self._socket = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Simulator":
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def start(self) -> "Simulator":
+        """Listen and accept connections on a background thread"""
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(128)
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+        logging.info("Simulator listening on %s:%s", self.host, self.port)
+        return self
+
+    def stop(self) -> None:
+        """Stop listening and close every open session"""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        with self._lock:
+            transports = list(self._transports)
+        for transport in transports:
+            transport.close()
+
+    def accept(self) -> None:
+        """Accept connections until the listening socket is closed"""
+        while self._socket is not None:
+            try:
+                sock, _ = self._socket.accept()
+            except OSError:
+                return
+            with self._lock:
+                if len(self._transports) >= self.max_sessions:
+                    self.stats["sessions_rejected"] += 1
+                    sock.close()
+                    continue
+                transport = paramiko.Transport(sock)
+                self._transports.add(transport)
+                self.stats["sessions_opened"] += 1
+            threading.Thread(
+                target=self.serve, args=(transport,), daemon=True
+            ).start()
+
+    def serve(self, transport: paramiko.Transport) -> None:
+        """Run the SSH server side of one connection until it closes"""
+        try:
+            transport.add_server_key(self._host_key)
+            transport.start_server(server=SSHServer(self))
+            transport.join()
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            logging.debug("Connection ended: %s", e)
+        finally:
+            transport.close()
+            with self._lock:
+                self._transports.discard(transport)
+
+    def next_session_id(self) -> int:
+        """Session id for the next netconf session"""
+        with self._lock:
+            return next(self._session_ids)
+
+    def count_rpc(self, name: str) -> None:
+        """Count an rpc by its name"""
+        with self._lock:
+            self.rpcs[name] += 1
+
+    def subscribe(self, session: NetconfSession) -> None:
+        """Send config change notifications to a session"""
+        with self._lock:
+            session.subscribed = True
+            self._subscribers.add(session)
+
+    def unsubscribe(self, session: NetconfSession) -> None:
+        """Stop sending notifications to a session"""
+        with self._lock:
+            self._subscribers.discard(session)
+
+    def edit_running(self, config: str) -> None:
+        """
+        Change running without a NETCONF session, like a change made on
+        the CLI, and notify subscribers
+        Args:
+            config (str): xml of a config element to merge
+        """
+        self.config.edit_running(etree.fromstring(config.encode(), PARSER))
+        self.config_changed(0, "cli")
+
+    def config_changed(self, session_id: int, username: str = "netconf"):
+        """Send a netconf-config-change notification to subscribers"""
+        notification = etree.Element(
+            f"{{{NOTIFICATION_NS}}}notification",
+            nsmap={None: NOTIFICATION_NS},
+        )
+        etree.SubElement(
+            notification, f"{{{NOTIFICATION_NS}}}eventTime"
+        ).text = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        change = etree.SubElement(
+            notification,
+            f"{{{CONFIG_CHANGE_NS}}}netconf-config-change",
+            nsmap={None: CONFIG_CHANGE_NS},
+        )
+        changed_by = etree.SubElement(
+            change, f"{{{CONFIG_CHANGE_NS}}}changed-by"
+        )
+        etree.SubElement(
+            changed_by, f"{{{CONFIG_CHANGE_NS}}}username"
+        ).text = username
+        etree.SubElement(
+            changed_by, f"{{{CONFIG_CHANGE_NS}}}session-id"
+        ).text = str(session_id)
+        etree.SubElement(change, f"{{{CONFIG_CHANGE_NS}}}datastore").text = (
+            "running"
+        )
+        message = etree.tostring(notification)
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.stats["notifications_sent"] += len(subscribers)
+        for session in subscribers:
+            try:
+                session.send(message)
+            except OSError as e:
+                logging.debug("Notification to %s failed: %s", session, e)
+
+    @property
+    def active_sessions(self) -> int:
+        """SSH connections currently open"""
+        with self._lock:
+            return len(self._transports)
+
+    def reset_stats(self) -> None:
+        """Zero the session and rpc counters"""
+        with self._lock:
+            self.stats.clear()
+            self.rpcs.clear()
+
+
+def main() -> None:
+    """Run the simulator until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--interfaces", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--max-sessions", type=int, default=10)
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    logging.basicConfig(level="INFO")
+    credentials = None
+    if args.username is not None:
+        credentials = (args.username, args.password or "")
+    simulator = Simulator(
+        args.host,
+        args.port,
+        interfaces=args.interfaces,
+        latency=args.latency,
+        max_sessions=args.max_sessions,
+        credentials=credentials,
+    ).start()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(
+                "%s active sessions, %s",
+                simulator.active_sessions,
+                simulator.stats,
+            )
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -180,3 +180,47 @@ IOSXR_CAPABILITIES = [
     "http://cisco.com/ns/yang/Cisco-IOS-XR-um-event-manager-policy-map-cfg?"
     "module=Cisco-IOS-XR-um-event-manager-policy-map-cfg&revision=2021-06-16",
 ]
+
+
+def iosxr_interfaces_xml(count: int) -> str:
+    """
+    Build a get_config reply with count loopbacks, every 3rd has a
+    description, every 5th is shutdown and every 7th is in a vrf
+    Args:
+        count (int): how many interfaces to include
+    Returns:
+        str of the xml
+    """
+    interfaces = []
+    for index in range(count):
+        extra = ""
+        if index % 3 == 0:
+            extra += f"<description>Synthetic {index}</description>"
+        if index % 5 == 0:
+            extra += "<shutdown/>"
+        if index % 7 == 0:
+            extra += (
+                '<vrf xmlns="http://cisco.com/ns/yang/'
+                'Cisco-IOS-XR-infra-rsi-cfg">BENCH</vrf>'
+            )
+        interfaces.append(
+            "<interface-configuration><active>act</active>"
+            f"<interface-name>Loopback{index}</interface-name>"
+            f"<interface-virtual/>{extra}"
+            '<ipv4-network xmlns="http://cisco.com/ns/yang/'
+            'Cisco-IOS-XR-ipv4-io-cfg"><addresses><primary>'
+            f"<address>10.{index // 65536 % 256}.{index // 256 % 256}."
+            f"{index % 256}</address>"
+            "<netmask>255.255.255.255</netmask>"
+            "</primary></addresses></ipv4-network>"
+            "</interface-configuration>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<data xmlns="urn:ietf:params:xml:ns:netconf:base:1.0" '
+        'xmlns:nc="urn:ietf:params:xml:ns:netconf:base:1.0">'
+        '<interface-configurations xmlns="http://cisco.com/ns/yang/'
+        'Cisco-IOS-XR-ifmgr-cfg">'
+        f"{''.join(interfaces)}"
+        "</interface-configurations></data>"
+    )
@@ -0,0 +1,83 @@
+"""
+Shared setup for tests of the fastapi app
+"""
+
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.device import read_cache
+from app.pool import session_pool
+from app.jobs import job_runner
+from app.main import app
+from app.store import DeviceStore, JobStore, SnapshotStore
+
+
+class AppTestCase(TestCase):
+    """
+    Calls the app with the default credentials set and no pooled
+    sessions or cached reads left over from other tests, and stores in
+    a temporary directory
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.env_patcher = patch.dict(
+            os.environ,
+            {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"},
+        )
+        cls.env_patcher.start()
+        cls.client = TestClient(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env_patcher.stop()
+
+    def setUp(self):
+        session_pool.close_all()
+        read_cache.clear()
+        self.device_store = use_temporary_stores(self)
+
+
+def use_temporary_stores(test: TestCase) -> DeviceStore:
+    """
+    Have the app save devices, snapshots and jobs to a database in a
+    temporary directory until the test is cleaned up
+    Returns:
+        the DeviceStore in use
+    """
+    tempdir = mkdtemp()
+    test.addCleanup(shutil.rmtree, tempdir)
+    path = os.path.join(tempdir, "test.db")
+    stores = (DeviceStore(path), SnapshotStore(path), JobStore(path))
+    for store in stores:
+        test.addCleanup(store.close)
+    device_store, snapshot_store, job_store = stores
+    for patcher in (
+        patch("app.device.device_store", device_store),
+        patch("app.discovery.device_store", device_store),
+        patch("app.main.device_store", device_store),
+        patch("app.backend.snapshot_store", snapshot_store),
+        patch("app.admin.job_store", job_store),
+        patch.object(job_runner, "store", job_store),
+    ):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    return device_store
+
+
+def mock_device(mock_connect: MagicMock, data_xml: str) -> MagicMock:
+    """
+    Have the patched manager.connect open a session whose get_config
+    answers with the xml
+    Returns:
+        the mock session
+    """
+    session = MagicMock()
+    session.get_config.return_value = MagicMock(data_xml=data_xml)
+    mock_connect.return_value = session
+    return session
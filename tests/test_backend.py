@@ -0,0 +1,68 @@
+"""
+Tests for the backend helpers that sit between the endpoints and ncclient
+"""
+
+import asyncio
+import threading
+from unittest import TestCase
+
+from app.batch import BatchInterfaceManager
+from app.device import run_blocking
+from app.models import InterfaceConfig
+from app.parsers import InterfaceRecord
+
+
+class TestRunBlocking(TestCase):
+    """
+    Test blocking work is moved off the event loop
+    """
+
+    def test_run_blocking(self):
+        """Test work runs on the netconf executor and returns its result"""
+
+        def work(value):
+            return value, threading.current_thread().name
+
+        value, thread_name = asyncio.run(run_blocking(work, "ok"))
+        self.assertEqual(value, "ok")
+        self.assertTrue(thread_name.startswith("netconf"))
+
+
+class TestReconcileDiff(TestCase):
+    """
+    Test the diff between the device and the desired interfaces
+    """
+
+    def test_diff(self):
+        """Test adds, address changes, deletes and unchanged"""
+        current = {
+            name: InterfaceRecord(name, address=address, netmask="255.0.0.0")
+            for name, address in (
+                ("Loopback0", "10.0.0.0"),
+                ("Loopback1", "10.0.0.1"),
+                ("Loopback2", "10.0.0.2"),
+            )
+        }
+        desired = [
+            InterfaceConfig(
+                interface_name=name, address=address, netmask="255.0.0.0"
+            )
+            for name, address in (
+                ("Loopback0", "10.0.0.0"),
+                ("Loopback1", "10.1.0.1"),
+                ("Loopback3", "10.0.0.3"),
+            )
+        ]
+        diff = BatchInterfaceManager.diff(current, desired)
+
+        self.assertListEqual(diff.added, ["Loopback3"])
+        self.assertListEqual(diff.changed, ["Loopback1"])
+        self.assertListEqual(diff.deleted, ["Loopback2"])
+        self.assertListEqual(diff.unchanged, ["Loopback0"])
+        self.assertFalse(diff.is_empty)
+        self.assertTrue(BatchInterfaceManager.diff(current, []).deleted)
+        self.assertTrue(
+            BatchInterfaceManager.diff(
+                {"Loopback0": current["Loopback0"]}, desired[:1]
+            ).is_empty
+        )
@@ -0,0 +1,109 @@
+"""
+Tests for the batch interface endpoints
+"""
+
+from unittest.mock import patch
+
+from tests.fixtures import (
+    IOSXR_GET_INTERFACE,
+    IOSXR_GET_INTERFACE_MISSING,
+    IOSXR_GET_INTERFACES,
+)
+from tests.helpers import AppTestCase, mock_device
+
+
+class TestInterfaceBatch(AppTestCase):
+    """
+    Test the batch interface endpoints in the fastapi app
+    """
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_create_interfaces(self, mock_manager, mock_device_type):
+        """Test we can create several interfaces with one commit"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
+        mock_device_type.return_value = "iosxr"
+
+        interface_configs = [
+            {
+                "interface_name": interface_name,
+                "address": "10.0.0.1",
+                "netmask": "255.255.255.255",
+            }
+            for interface_name in ["vlan1", "Loopback0", "vlan2", "vlan1"]
+        ]
+        response = self.client.post(
+            "/interfaces/batch",
+            params={"host": "test"},
+            json=interface_configs,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json()["results"],
+            [
+                {"interface_name": "vlan1", "status": "created"},
+                {"interface_name": "Loopback0", "status": "exists"},
+                {"interface_name": "vlan2", "status": "created"},
+                {"interface_name": "vlan1", "status": "duplicate"},
+            ],
+        )
+        mock_manager.assert_called_once()
+        mock_manager_obj.get_config.assert_called_once()
+        mock_manager_obj.edit_config.assert_called_once()
+        mock_manager_obj.commit.assert_called_once()
+        config = mock_manager_obj.edit_config.call_args.kwargs["config"]
+        self.assertIn("<interface-name>vlan1</interface-name>", config)
+        self.assertIn("<interface-name>vlan2</interface-name>", config)
+        self.assertNotIn("Loopback0", config)
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_delete_interfaces(self, mock_manager, mock_device_type):
+        """Test we can delete several interfaces with one commit"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACES)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.request(
+            "DELETE",
+            "/interfaces/batch",
+            params={"host": "test"},
+            json=["Loopback100", "Loopback555", "vlan1"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json()["results"],
+            [
+                {"interface_name": "Loopback100", "status": "deleted"},
+                {"interface_name": "Loopback555", "status": "deleted"},
+                {"interface_name": "vlan1", "status": "missing"},
+            ],
+        )
+        mock_manager_obj.edit_config.assert_called_once()
+        mock_manager_obj.commit.assert_called_once()
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_delete_interfaces_none_exist(
+        self, mock_manager, mock_device_type
+    ):
+        """Test we dont edit when nothing in the batch exists"""
+        mock_manager_obj = mock_device(
+            mock_manager, IOSXR_GET_INTERFACE_MISSING
+        )
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.request(
+            "DELETE",
+            "/interfaces/batch",
+            params={"host": "test", "dry_run": True},
+            json=["vlan1"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "results": [{"interface_name": "vlan1", "status": "missing"}],
+                "dry_run": None,
+            },
+        )
+        mock_manager_obj.edit_config.assert_not_called()
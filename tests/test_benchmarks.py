@@ -0,0 +1,39 @@
+"""
+Tests for comparing benchmark results against a baseline
+"""
+
+from unittest import TestCase
+
+from benchmarks import compare
+
+
+def results(median_s: float, peak_bytes: int) -> dict:
+    """Output of a run with a single parse case"""
+    return {
+        "results": {
+            "parse/10": {"median_s": median_s, "peak_bytes": peak_bytes}
+        }
+    }
+
+
+class TestCompare(TestCase):
+    """
+    Test regressions are flagged past the thresholds
+    """
+
+    def test_compare_within_thresholds(self):
+        """Test small changes are not flagged"""
+        self.assertListEqual(
+            compare(results(1.0, 1000), results(1.2, 1050)), []
+        )
+
+    def test_compare_regressions(self):
+        """Test slower and bigger cases are both flagged"""
+        regressions = compare(results(1.0, 1000), results(1.5, 2000))
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith("parse/10 median"))
+        self.assertTrue(regressions[1].startswith("parse/10 peak memory"))
+
+    def test_compare_new_case(self):
+        """Test cases missing from the baseline are skipped"""
+        self.assertListEqual(compare({"results": {}}, results(1.0, 1000)), [])
@@ -0,0 +1,179 @@
+"""
+Tests for the per host circuit breakers
+"""
+
+import os
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app import deadlines
+from app.device import read_cache
+from app.pool import session_pool
+from app.breaker import CircuitBreakers, circuit_breakers
+from app.exceptions import CircuitOpen
+from app.main import app
+from app.models import BreakerState
+
+
+class TestCircuitBreakers(TestCase):
+    """
+    Test breakers open, probe and close
+    """
+
+    def setUp(self):
+        self.breakers = CircuitBreakers(
+            failures=2, reset_timeout=10, max_reset_timeout=15
+        )
+        self.connect = MagicMock(side_effect=OSError("unreachable"))
+        self.now = 100.0
+        patcher = patch("app.breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failed(self, times: int = 1) -> None:
+        """Connect through the breaker expecting the connect to fail"""
+        for _ in range(times):
+            with self.assertRaises(OSError):
+                self.breakers.call("test", self.connect, port=830)
+
+    def state(self) -> BreakerState:
+        """State of the only breaker"""
+        return self.breakers.statuses()[0].state
+
+    def test_opens(self):
+        """Test connects are refused once enough have failed"""
+        self.failed()
+        self.assertEqual(self.state(), BreakerState.CLOSED)
+        self.failed()
+        self.assertEqual(self.state(), BreakerState.OPEN)
+
+        self.now += 4
+        with self.assertRaises(CircuitOpen) as context:
+            self.breakers.call("test", self.connect, port=830)
+        self.assertEqual(context.exception.retry_after, 6)
+        with self.assertRaises(CircuitOpen):
+            self.breakers.check("test")
+        self.assertEqual(self.connect.call_count, 2)
+        self.breakers.check("other")
+
+    def test_probe_closes(self):
+        """Test a successful probe closes the breaker"""
+        self.failed(2)
+        self.now += 10
+        self.connect.side_effect = None
+        self.connect.return_value = "session"
+
+        self.assertEqual(
+            self.breakers.call("test", self.connect, port=830), "session"
+        )
+        self.connect.assert_called_with(port=830)
+        self.assertListEqual(self.breakers.statuses(), [])
+
+    def test_probe_reopens(self):
+        """Test a failed probe opens the breaker for longer"""
+        self.failed(2)
+        self.now += 10
+        self.failed()
+        self.assertEqual(self.state(), BreakerState.OPEN)
+        self.assertEqual(self.breakers.statuses()[0].retry_after, 15)
+
+        self.now += 15
+        self.failed()
+        self.assertEqual(self.breakers.statuses()[0].retry_after, 15)
+
+    def test_one_probe(self):
+        """Test only one connect is let through while half open"""
+        self.failed(2)
+        self.now += 10
+
+        def probe(**_):
+            self.assertEqual(self.state(), BreakerState.HALF_OPEN)
+            with self.assertRaises(CircuitOpen):
+                self.breakers.call("test", self.connect, port=830)
+            return "session"
+
+        self.assertEqual(
+            self.breakers.call("test", probe, port=830), "session"
+        )
+        self.assertEqual(self.connect.call_count, 2)
+
+    def test_deadline(self):
+        """Test a connect cut short by the request deadline isnt counted"""
+        self.failed(2)
+        self.now += 10
+        with deadlines.use(self.now):
+            self.failed()
+        self.assertEqual(self.state(), BreakerState.HALF_OPEN)
+
+        self.connect.side_effect = None
+        self.breakers.call("test", self.connect, port=830)
+        self.assertListEqual(self.breakers.statuses(), [])
+
+    def test_reset(self):
+        """Test a reset closes the breaker"""
+        self.failed(2)
+        self.assertTrue(self.breakers.reset("test"))
+        self.assertFalse(self.breakers.reset("test"))
+        self.breakers.check("test")
+
+
+class TestBreakerEndpoints(TestCase):
+    """
+    Test refused connects are answered with 503 and Retry-After
+    """
+
+    def setUp(self):
+        for patcher in (
+            patch.dict(
+                os.environ,
+                {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"},
+            ),
+            patch("app.device.Device.get_device_type", return_value="iosxr"),
+            patch(
+                "app.device.manager.connect",
+                side_effect=OSError("unreachable"),
+            ),
+        ):
+            self.connect = patcher.start()
+            self.addCleanup(patcher.stop)
+        session_pool.close_all()
+        read_cache.clear()
+        circuit_breakers.breakers.clear()
+        self.addCleanup(circuit_breakers.breakers.clear)
+        self.client = TestClient(app)
+
+    def get(self):
+        """GET an interface from the host"""
+        return self.client.get(
+            "/interface", params={"host": "test", "interface_name": "vlan1"}
+        )
+
+    def test_circuit_open(self):
+        """Test requests fail fast once the breaker opens"""
+        for _ in range(circuit_breakers.failures):
+            self.assertEqual(self.get().status_code, 500)
+
+        response = self.get()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.headers["Retry-After"],
+            str(int(circuit_breakers.reset_timeout)),
+        )
+        self.assertEqual(self.connect.call_count, circuit_breakers.failures)
+
+        breakers = self.client.get("/admin/breakers").json()
+        self.assertEqual(len(breakers), 1)
+        self.assertEqual(breakers[0]["host"], "test")
+        self.assertEqual(breakers[0]["state"], "open")
+
+        response = self.client.delete(
+            "/admin/breakers", params={"host": "test"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(self.client.get("/admin/breakers").json(), [])
+        response = self.client.delete(
+            "/admin/breakers", params={"host": "test"}
+        )
+        self.assertEqual(response.status_code, 404)
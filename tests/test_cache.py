@@ -0,0 +1,63 @@
+"""
+Tests for caching reads per host and invalidating them
+"""
+
+from unittest.mock import patch
+
+from tests.fixtures import (
+    IOSXR_GET_INTERFACE,
+    IOSXR_GET_INTERFACES,
+)
+from tests.helpers import AppTestCase, mock_device
+
+
+class TestInterfaceCache(AppTestCase):
+    """
+    Test reads are cached per host and invalidated by writes
+    """
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interface_cached(self, mock_manager, mock_device_type):
+        """Test repeat reads are cached and conditional reads get 304"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
+        mock_device_type.return_value = "iosxr"
+        params = {"host": "test", "interface_name": "Loopback0"}
+
+        first = self.client.get("/interface", params=params)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["etag"]
+
+        second = self.client.get("/interface", params=params)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers["etag"], etag)
+
+        not_modified = self.client.get(
+            "/interface", params=params, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        mock_manager_obj.get_config.assert_called_once()
+
+        fresh = self.client.get("/interface", params={**params, "max_age": 0})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(mock_manager_obj.get_config.call_count, 2)
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_invalidated(self, mock_manager, mock_device_type):
+        """Test a commit to the host drops its cached reads"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACES)
+        mock_device_type.return_value = "iosxr"
+
+        self.client.get("/interfaces", params={"host": "test"})
+        self.client.get("/interfaces", params={"host": "other"})
+        response = self.client.delete(
+            "/interface",
+            params={"host": "test", "interface_name": "Loopback0"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_manager_obj.get_config.call_count, 3)
+
+        self.client.get("/interfaces", params={"host": "test"})
+        self.client.get("/interfaces", params={"host": "other"})
+        self.assertEqual(mock_manager_obj.get_config.call_count, 4)
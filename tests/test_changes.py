@@ -0,0 +1,84 @@
+"""
+Tests for versioned interface snapshots and GET /interfaces?since=
+"""
+
+from unittest.mock import MagicMock, patch
+
+from app.device import read_cache
+from app.pool import session_pool
+from app.store import DeviceInfo
+from tests.fixtures import iosxr_interfaces_xml
+from tests.helpers import AppTestCase
+
+
+class TestInterfaceChanges(AppTestCase):
+    """
+    Test GET /interfaces?since= returns only what changed
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.device_store.save(DeviceInfo("test", "iosxr"))
+        self.device = MagicMock()
+        patcher = patch("app.device.manager.connect", return_value=self.device)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(session_pool.close_all)
+
+    def get(self, xml: str, **params):
+        """GET /interfaces with the device answering xml"""
+        read_cache.clear()
+        self.device.get_config.return_value = MagicMock(data_xml=xml)
+        return self.client.get("/interfaces", params={"host": "test"} | params)
+
+    def test_since(self):
+        """Test a full read is versioned and since returns the changes"""
+        response = self.get(iosxr_interfaces_xml(3))
+        self.assertEqual(response.headers["X-Config-Version"], "1")
+        response = self.get(iosxr_interfaces_xml(3), since=1)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "host": "test",
+                "since": 1,
+                "version": 1,
+                "added": [],
+                "changed": [],
+                "removed": [],
+            },
+        )
+
+        changed = iosxr_interfaces_xml(4).replace("Synthetic 0", "Changed")
+        response = self.get(changed, since=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Config-Version"], "2")
+        changes = response.json()
+        self.assertListEqual(
+            [interface["interface-name"] for interface in changes["added"]],
+            ["Loopback3"],
+        )
+        self.assertEqual(changes["changed"][0]["description"], "Changed")
+        self.assertListEqual(changes["removed"], [])
+
+        # back to the first content is still a new version
+        response = self.get(iosxr_interfaces_xml(3), since=2)
+        self.assertListEqual(response.json()["removed"], ["Loopback3"])
+        self.assertEqual(response.json()["version"], 3)
+
+    def test_since_invalid(self):
+        """Test unknown versions are gone and filters are refused"""
+        self.assertEqual(
+            self.get(iosxr_interfaces_xml(3), since=5).status_code, 410
+        )
+        self.assertEqual(
+            self.get(
+                iosxr_interfaces_xml(3), since=1, output="records"
+            ).status_code,
+            422,
+        )
+        self.assertEqual(
+            self.get(
+                iosxr_interfaces_xml(3), since=1, name_prefix="Loop"
+            ).status_code,
+            422,
+        )
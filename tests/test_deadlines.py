@@ -0,0 +1,122 @@
+"""
+Tests for request deadlines
+"""
+
+import os
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app import deadlines
+from app.backend import InterfaceManager
+from app.device import read_cache
+from app.pool import session_pool
+from app.breaker import circuit_breakers
+from app.exceptions import DeadlineExceeded
+from app.main import app
+from app.metrics import DEADLINES_EXCEEDED, ERRORS, registry
+from app.scheduler import PendingWrite
+from simulator import Simulator
+from tests.helpers import use_temporary_stores
+
+
+class TestDeadlines(TestCase):
+    """
+    Test timeouts are capped by the deadline and expired work stops
+    """
+
+    def test_no_deadline(self):
+        """Test nothing changes without a deadline"""
+        self.assertIsNone(deadlines.remaining())
+        self.assertEqual(deadlines.timeout(30, "test"), 30)
+        params = {"host": "test", "timeout": 30}
+        self.assertIs(deadlines.connect_params(params), params)
+
+    def test_capped(self):
+        """Test timeouts get no more than is left"""
+        with deadlines.within(5):
+            self.assertLessEqual(deadlines.timeout(30, "test"), 5)
+            self.assertEqual(deadlines.timeout(1, "test"), 1)
+            params = deadlines.connect_params({"timeout": 30})
+            self.assertLessEqual(params["timeout"], 5)
+        self.assertIsNone(deadlines.remaining())
+
+    def test_expired(self):
+        """Test work past the deadline is stopped"""
+        with deadlines.use(time.monotonic()):
+            self.assertTrue(deadlines.expired())
+            with self.assertRaises(DeadlineExceeded):
+                deadlines.check("test")
+            with self.assertRaises(DeadlineExceeded):
+                deadlines.connect_params({"timeout": 30})
+
+    def test_queued_write(self):
+        """Test a write whose deadline passed in the queue isnt applied"""
+        interface_manager = InterfaceManager(MagicMock(host="test"))
+        interface_manager.apply_batch = MagicMock()
+        interface_manager.create_one = MagicMock(return_value="created")
+        expired = PendingWrite("create", "Loopback1", deadline=0)
+        waiting = PendingWrite(
+            "create", "Loopback2", deadline=time.monotonic() + 60
+        )
+
+        interface_manager.apply_writes([expired, waiting])
+        self.assertIsInstance(expired.error, DeadlineExceeded)
+        self.assertEqual(waiting.outcome(), "created")
+        interface_manager.apply_batch.assert_not_called()
+
+
+class TestDeadlineEndpoints(TestCase):
+    """
+    Test requests against a slow simulator give up at their deadline
+    """
+
+    def setUp(self):
+        use_temporary_stores(self)
+        # slower than the deadlines we give the requests
+        self.simulator = Simulator(interfaces=3, latency=0.5).start()
+        self.addCleanup(self.simulator.stop)
+        environ = {"NETCONF_PORT": str(self.simulator.port)}
+        environ.update(DEFAULT_USERNAME="test", DEFAULT_PASSWORD="test")
+        patcher = patch.dict(os.environ, environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        session_pool.close_all()
+        self.addCleanup(session_pool.close_all)
+        read_cache.clear()
+        registry.clear()
+        self.client = TestClient(app)
+
+    def get(self, **kwargs):
+        """GET the interfaces of the simulator"""
+        return self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "max_age": 0},
+            **kwargs,
+        )
+
+    def test_deadline_exceeded(self):
+        """Test a request is answered 504 once its deadline passes"""
+        self.assertEqual(self.get().status_code, 200)
+
+        start = time.monotonic()
+        response = self.get(headers={"X-Request-Timeout": "0.2"})
+        self.assertEqual(response.status_code, 504)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(DEADLINES_EXCEEDED.value("GET /interfaces"), 1)
+        self.assertEqual(ERRORS.value("TimeoutExpiredError"), 0)
+        self.assertListEqual(circuit_breakers.statuses(), [])
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "max_age": 0, "timeout": 5},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid(self):
+        """Test a timeout that isnt a positive number is rejected"""
+        for timeout in ("soon", "0", "-1", "inf"):
+            response = self.get(headers={"X-Request-Timeout": timeout})
+            self.assertEqual(response.status_code, 422)
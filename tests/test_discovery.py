@@ -0,0 +1,156 @@
+"""
+Tests for bulk discovery from an inventory
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app import discovery
+from app.pool import session_pool
+from app.exceptions import InvalidData
+from app.main import app
+from app.models import CredentialType, DiscoveryStatus, InventoryEntry
+from app.store import DeviceInfo
+from simulator import Simulator
+from tests.helpers import use_temporary_stores
+
+ENV = {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"}
+
+
+class TestInventory(TestCase):
+    """
+    Test inventory files are parsed
+    """
+
+    def test_parse_json(self):
+        """Test JSON entries can be hostnames or objects"""
+        self.assertListEqual(
+            discovery.parse_inventory(
+                '["one", {"host": "two", "credential": "NEXUS"}]'
+            ),
+            [
+                InventoryEntry(host="one"),
+                InventoryEntry(host="two", credential=CredentialType.NEXUS),
+            ],
+        )
+
+    def test_parse_text(self):
+        """Test one host per line with an optional credential"""
+        self.assertListEqual(
+            discovery.parse_inventory("# routers\none\n\ntwo nexus # dc\n"),
+            [
+                InventoryEntry(host="one"),
+                InventoryEntry(host="two", credential=CredentialType.NEXUS),
+            ],
+        )
+
+    def test_parse_invalid(self):
+        """Test bad credentials and extra fields are rejected"""
+        with self.assertRaises(InvalidData):
+            discovery.parse_inventory("one other")
+        with self.assertRaises(InvalidData):
+            discovery.parse_inventory("one default extra")
+        with self.assertRaises(InvalidData):
+            discovery.parse_inventory('[{"credential": "DEFAULT"}]')
+
+
+class TestDiscovery(TestCase):
+    """
+    Test bulk discovery against the simulator
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.simulator = Simulator(interfaces=2).start()
+        cls.env_patcher = patch.dict(
+            os.environ, ENV | {"NETCONF_PORT": str(cls.simulator.port)}
+        )
+        cls.env_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env_patcher.stop()
+        cls.simulator.stop()
+
+    def setUp(self):
+        session_pool.close_all()
+        self.simulator.reset_stats()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.store = use_temporary_stores(self)
+
+    def tearDown(self):
+        session_pool.close_all()
+
+    def test_discover_many(self):
+        """Test new hosts are stored, known and failed hosts reported"""
+        self.store.save(DeviceInfo("known", "iosxr"))
+        inventory = [
+            InventoryEntry(host="127.0.0.1"),
+            InventoryEntry(host="known"),
+            # nothing listens on 127.0.0.2
+            InventoryEntry(host="127.0.0.2"),
+        ]
+        results = asyncio.run(discovery.discover_many(inventory, 2))
+
+        self.assertListEqual(
+            [result.status for result in results],
+            [
+                DiscoveryStatus.DISCOVERED,
+                DiscoveryStatus.KNOWN,
+                DiscoveryStatus.FAILED,
+            ],
+        )
+        self.assertEqual(self.store.get("127.0.0.1").device_type, "iosxr")
+        self.assertEqual(self.simulator.stats["sessions_opened"], 1)
+        self.assertDictEqual(
+            discovery.summarise(results),
+            {"discovered": 1, "known": 1, "failed": 1},
+        )
+
+    def test_startup_prewarm(self):
+        """Test the inventory is discovered and warmed before requests"""
+        inventory = os.path.join(self.tempdir, "inventory.txt")
+        with open(inventory, "w", encoding="utf-8") as inventory_file:
+            inventory_file.write("127.0.0.1\n")
+
+        with patch.multiple(discovery, INVENTORY=inventory, PREWARM=True):
+            with TestClient(app) as client:
+                # discovery and the warm pooled session
+                self.assertEqual(self.simulator.stats["sessions_opened"], 2)
+                response = client.get(
+                    "/interfaces", params={"host": "127.0.0.1"}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.simulator.stats["sessions_opened"], 2)
+
+    def test_admin_discover(self):
+        """Test the admin endpoint discovers and can warm sessions"""
+        client = TestClient(app)
+        response = client.post(
+            "/admin/discover",
+            params={"prewarm": True},
+            json=[{"host": "127.0.0.1"}],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json()["results"][0],
+            {
+                "host": "127.0.0.1",
+                "status": "discovered",
+                "device_type": "iosxr",
+                "warmed": True,
+                "error": None,
+            },
+        )
+        self.assertEqual(self.simulator.stats["sessions_opened"], 2)
+
+        response = client.post("/admin/discover", json=[{"host": "127.0.0.1"}])
+        self.assertEqual(response.json()["summary"]["known"], 1)
+        self.assertEqual(self.simulator.stats["sessions_opened"], 2)
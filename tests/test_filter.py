@@ -0,0 +1,158 @@
+"""
+Tests for filtering, field selection and paging of /interfaces
+"""
+
+from unittest.mock import patch
+
+from tests.fixtures import (
+    IOSXR_GET_INTERFACE,
+    IOSXR_GET_INTERFACE_MISSING,
+    IOSXR_GET_INTERFACES,
+)
+from tests.helpers import AppTestCase, mock_device
+
+
+class TestInterfaceFilter(AppTestCase):
+    """
+    Test filtering, field selection and paging of /interfaces
+    """
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_filtered(self, mock_manager, mock_device_type):
+        """Test prefix, fields and paging without XPath on the device"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACES)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.get(
+            "/interfaces",
+            params={
+                "host": "test",
+                "name_prefix": "Loopback",
+                "fields": ["description"],
+                "offset": 1,
+                "limit": 2,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json()["data"]["interface-configurations"][
+                "interface-configuration"
+            ],
+            [
+                {
+                    "active": "act",
+                    "interface-name": "Loopback100",
+                    "description": "***TEST LOOPBACK****",
+                },
+                {
+                    "active": "act",
+                    "interface-name": "Loopback555",
+                    "description": "PRUEBA_KV",
+                },
+            ],
+        )
+        rendered_filter = mock_manager_obj.get_config.call_args.kwargs[
+            "filter"
+        ]
+        self.assertIn("<interface-name/>", rendered_filter)
+        self.assertIn("<description/>", rendered_filter)
+        self.assertNotIn("xpath", rendered_filter)
+
+    @patch("app.device.Device.supports")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_xpath(
+        self, mock_manager, mock_device_type, mock_supports
+    ):
+        """Test a name prefix is sent as XPath when the device has it"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
+        mock_device_type.return_value = "iosxr"
+        mock_supports.return_value = True
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "test", "name_prefix": "Loop"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(
+                response.json()["data"]["interface-configurations"][
+                    "interface-configuration"
+                ]
+            ),
+            1,
+        )
+        rendered_filter = mock_manager_obj.get_config.call_args.kwargs[
+            "filter"
+        ]
+        self.assertIn('type="xpath"', rendered_filter)
+        self.assertIn(
+            "starts-with(ifmgr:interface-name, 'Loop')", rendered_filter
+        )
+        mock_supports.assert_called_once_with(":xpath")
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_no_match(self, mock_manager, mock_device_type):
+        """Test a filter that matches nothing returns an empty list"""
+        mock_device(mock_manager, IOSXR_GET_INTERFACE_MISSING)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "test", "interface_name": ["vlan1", "vlan2"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "data": {
+                    "interface-configurations": {"interface-configuration": []}
+                }
+            },
+        )
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_records(self, mock_manager, mock_device_type):
+        """Test records output is filtered and paged like the raw output"""
+        mock_device(mock_manager, IOSXR_GET_INTERFACES)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.get(
+            "/interfaces",
+            params={
+                "host": "test",
+                "name_prefix": "Loopback",
+                "fields": ["ipv4-network"],
+                "limit": 1,
+                "output": "records",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "interfaces": [
+                    {
+                        "interface_name": "Loopback0",
+                        "active": "act",
+                        "description": None,
+                        "address": "10.0.0.1",
+                        "netmask": "255.255.255.255",
+                        "vrf": None,
+                        "shutdown": False,
+                        "virtual": False,
+                    }
+                ]
+            },
+        )
+
+    def test_get_interfaces_bad_prefix(self):
+        """Test a prefix that could break out of the XPath is rejected"""
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "test", "name_prefix": "Loop') or ('"},
+        )
+        self.assertEqual(response.status_code, 422)
@@ -0,0 +1,55 @@
+"""
+Tests for reading interfaces from many devices at once
+"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+from tests.fixtures import (
+    IOSXR_GET_INTERFACES,
+)
+from tests.helpers import AppTestCase
+
+
+class TestFleet(AppTestCase):
+    """
+    Test the fleet endpoints in the fastapi app
+    """
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_fleet_interfaces(self, mock_manager, mock_device_type):
+        """Test we stream a line per host including failed hosts"""
+        mock_config = MagicMock()
+        mock_config.data_xml = IOSXR_GET_INTERFACES
+        mock_manager_obj = MagicMock()
+        mock_manager_obj.get_config.return_value = mock_config
+
+        def connect(**params):
+            if params["host"] == "down":
+                raise ConnectionError("unreachable")
+            return mock_manager_obj
+
+        mock_manager.side_effect = connect
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.post(
+            "/fleet/interfaces",
+            params={"concurrency": 2},
+            json=["test1", "down", "test2", "test1"],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"], "application/x-ndjson"
+        )
+        results = {
+            result["host"]: result
+            for result in map(json.loads, response.text.splitlines())
+        }
+        self.assertSetEqual(set(results), {"test1", "test2", "down"})
+        self.assertIn("data", results["test1"])
+        self.assertIn("data", results["test2"])
+        self.assertEqual(
+            results["down"]["error"],
+            "Exception ConnectionError: unreachable",
+        )
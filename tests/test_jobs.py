@@ -0,0 +1,231 @@
+"""
+Tests for writes run as background jobs
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.device import read_cache
+from app.pool import session_pool
+from app.jobs import job_runner
+from app.main import app
+from app.models import Job, JobStatus
+from app.store import JobStore
+from app.writes import JOB_HANDLERS
+
+from tests.fixtures import IOSXR_GET_INTERFACE_MISSING, IOSXR_GET_INTERFACES
+
+INTERFACE = {
+    "interface_name": "vlan1",
+    "address": "10.0.0.1",
+    "netmask": "255.255.255.255",
+}
+
+
+class TestJobs(TestCase):
+    """
+    Test writes with background=true answer 202 and run as jobs
+    """
+
+    def setUp(self):
+        session_pool.close_all()
+        read_cache.clear()
+        self.tempdir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.tempdir, "test.db"))
+        self.mock_manager = MagicMock()
+        for patcher in (
+            patch.dict(
+                os.environ,
+                {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"},
+            ),
+            patch.object(job_runner, "store", self.store),
+            patch("app.admin.job_store", self.store),
+            patch("app.device.Device.get_device_type", return_value="iosxr"),
+            patch(
+                "app.device.manager.connect", return_value=self.mock_manager
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.store.close()
+        session_pool.close_all()
+        shutil.rmtree(self.tempdir)
+
+    def set_config(self, data_xml: str) -> None:
+        """Have the mock device answer get-config with data_xml"""
+        self.mock_manager.get_config.return_value = MagicMock(
+            data_xml=data_xml
+        )
+
+    @staticmethod
+    def wait(client: TestClient, job_id: str) -> dict:
+        """Poll a job until it has finished"""
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"Job {job_id} did not finish")
+
+    def test_create_interface(self):
+        """Test a create answers 202 and the job holds the result"""
+        self.set_config(IOSXR_GET_INTERFACE_MISSING)
+        with TestClient(app) as client:
+            response = client.post(
+                "/interface",
+                params={"host": "test", "background": True},
+                json=INTERFACE,
+            )
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()["job_id"]
+            self.assertEqual(response.headers["location"], f"/jobs/{job_id}")
+
+            job = self.wait(client, job_id)
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["status_code"], 200)
+        self.assertDictEqual(
+            job["result"], {"detail": "Successfully created vlan1"}
+        )
+        self.assertGreaterEqual(job["run_seconds"], 0)
+        self.mock_manager.commit.assert_called_once()
+
+    def test_delete_interface_missing(self):
+        """Test a failed write keeps the status it would have answered"""
+        self.set_config(IOSXR_GET_INTERFACE_MISSING)
+        with TestClient(app) as client:
+            response = client.delete(
+                "/interface",
+                params={
+                    "host": "test",
+                    "interface_name": "vlan1",
+                    "background": True,
+                },
+            )
+            job = self.wait(client, response.json()["job_id"])
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["status_code"], 404)
+        self.mock_manager.commit.assert_not_called()
+
+    def test_handlers(self):
+        """Test every job handler runs its write with the saved params"""
+        common = {"host": "test", "credential": "DEFAULT", "dry_run": True}
+        params = {
+            "create_interface": (
+                IOSXR_GET_INTERFACE_MISSING,
+                {"interface_config": INTERFACE},
+            ),
+            "delete_interface": (
+                IOSXR_GET_INTERFACES,
+                {"interface_name": "Loopback100"},
+            ),
+            "create_interfaces": (
+                IOSXR_GET_INTERFACES,
+                {"interface_configs": [INTERFACE]},
+            ),
+            "delete_interfaces": (
+                IOSXR_GET_INTERFACES,
+                {"interface_names": ["Loopback100"]},
+            ),
+            "reconcile_interfaces": (
+                IOSXR_GET_INTERFACES,
+                {"interface_configs": [INTERFACE], "name_prefix": "vlan"},
+            ),
+        }
+        self.assertSetEqual(set(params), set(JOB_HANDLERS))
+        for operation, handler in JOB_HANDLERS.items():
+            with self.subTest(operation):
+                data_xml, job_params = params[operation]
+                self.set_config(data_xml)
+                result = asyncio.run(handler(common | job_params))
+                self.assertIn("dry_run", result)
+        self.mock_manager.commit.assert_not_called()
+
+    def test_batch(self):
+        """Test batch results are saved as JSON"""
+        self.set_config(IOSXR_GET_INTERFACES)
+        with TestClient(app) as client:
+            response = client.request(
+                "DELETE",
+                "/interfaces/batch",
+                params={"host": "test", "background": True},
+                json=["Loopback100", "vlan1"],
+            )
+            job = self.wait(client, response.json()["job_id"])
+        self.assertEqual(job["status"], "succeeded")
+        self.assertListEqual(
+            [result["status"] for result in job["result"]["results"]],
+            ["deleted", "missing"],
+        )
+
+    def test_restart(self):
+        """
+        Test queued jobs run after a restart and running ones fail
+        unless another live worker process is running them
+        """
+        self.set_config(IOSXR_GET_INTERFACE_MISSING)
+        params = {
+            "host": "test",
+            "interface_config": INTERFACE,
+            "credential": "DEFAULT",
+            "dry_run": False,
+        }
+        self.store.save(
+            Job(
+                job_id="running",
+                operation="create_interface",
+                params=params,
+                status=JobStatus.RUNNING,
+                created_at=time.time(),
+                started_at=time.time(),
+            )
+        )
+        self.store.save(
+            Job(
+                job_id="other_worker",
+                operation="create_interface",
+                params=params,
+                status=JobStatus.RUNNING,
+                created_at=time.time(),
+                started_at=time.time(),
+                owner=os.getppid(),
+            )
+        )
+        self.store.save(
+            Job(
+                job_id="queued",
+                operation="create_interface",
+                params=params,
+                created_at=time.time(),
+            )
+        )
+        with TestClient(app) as client:
+            queued = self.wait(client, "queued")
+            running = client.get("/jobs/running").json()
+            other_worker = client.get("/jobs/other_worker").json()
+        self.assertEqual(queued["status"], "succeeded")
+        self.assertEqual(queued["owner"], os.getpid())
+        self.assertEqual(running["status"], "failed")
+        self.assertEqual(running["status_code"], 500)
+        self.assertEqual(other_worker["status"], "running")
+
+    def test_not_running(self):
+        """Test background writes need the workers and jobs must exist"""
+        client = TestClient(app)
+        response = client.post(
+            "/interface",
+            params={"host": "test", "background": True},
+            json=INTERFACE,
+        )
+        self.assertEqual(response.status_code, 503)
+        response = client.get("/jobs/missing")
+        self.assertEqual(response.status_code, 404)
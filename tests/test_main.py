@@ -2,12 +2,12 @@
 Test for the fastapi app frontend
 """
 
-import os
-from unittest import TestCase
+import json
 from unittest.mock import MagicMock, patch
 
-from fastapi.testclient import TestClient
-from app.main import app
+from app.device import read_cache
+from app.pool import session_pool
+from app.metrics import CACHE_REQUESTS, ERRORS, PHASE_SECONDS, registry
 
 from tests.fixtures import (
     IOSXR_CAPABILITIES,
@@ -17,59 +17,85 @@ from tests.fixtures import (
     IOSXR_GET_INTERFACE_MISSING,
     IOSXR_GET_INTERFACES,
 )
+from tests.helpers import AppTestCase, mock_device
 
 
-class TestMain(TestCase):
+class TestMain(AppTestCase):
     """
     Test the generic endpoints in the fastapi app
     """
 
-    @classmethod
-    def setUpClass(cls):
-        cls.env_patcher = patch.dict(
-            os.environ,
-            {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"},
-        )
-        cls.env_patcher.start()
-        cls.client = TestClient(app)
-
-    @classmethod
-    def tearDownClass(cls):
-        cls.env_patcher.stop()
-
     def test_healthz(self):
         """Test we can check health of app"""
         response = self.client.get("/healthz")
         self.assertEqual(response.status_code, 200)
 
+    @patch("app.main.device_store.invalidate")
+    def test_forget_device(self, mock_invalidate):
+        """Test we can forget a discovered device type"""
+        mock_invalidate.return_value = True
+        response = self.client.delete("/device", params={"host": "test"})
+        self.assertEqual(response.status_code, 200)
+        mock_invalidate.assert_called_once_with("test")
 
-class TestInterface(TestCase):
-    """
-    Test the interface endpoints in the fastapi app
-    """
+        mock_invalidate.return_value = False
+        response = self.client.delete("/device", params={"host": "test"})
+        self.assertEqual(response.status_code, 404)
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_metrics(self, mock_manager, mock_device_type):
+        """Test phases, cache lookups and errors show up on /metrics"""
+        registry.clear()
+        session_pool.close_all()
+        read_cache.clear()
+        mock_device(mock_manager, IOSXR_GET_INTERFACE_MISSING)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.get(
+            "/interface", params={"host": "test", "interface_name": "vlan1"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            PHASE_SECONDS.count(
+                "get_config", "test", "iosxr", "GET /interface"
+            ),
+            1,
+        )
+        self.assertEqual(CACHE_REQUESTS.value("read", "miss"), 1)
+        self.assertEqual(ERRORS.value("InvalidData"), 1)
 
-    @classmethod
-    def setUpClass(cls):
-        cls.env_patcher = patch.dict(
-            os.environ,
-            {"DEFAULT_USERNAME": "test", "DEFAULT_PASSWORD": "test"},
+        with patch("app.admin.job_store") as mock_job_store:
+            mock_job_store.get.return_value = None
+            self.assertEqual(self.client.get("/jobs/1").status_code, 404)
+        self.assertEqual(self.client.get("/missing").status_code, 404)
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'netconf_phase_seconds_count{phase="parse",host="test",'
+            'device_type="iosxr",operation="GET /interface"} 1',
+            response.text,
+        )
+        self.assertIn(
+            'netconf_request_seconds_count{operation="GET /interface",'
+            'status="404"} 1',
+            response.text,
         )
-        cls.env_patcher.start()
-        cls.client = TestClient(app)
+        self.assertIn('operation="GET /jobs/{job_id}"', response.text)
+        self.assertIn('operation="GET other"', response.text)
 
-    @classmethod
-    def tearDownClass(cls):
-        cls.env_patcher.stop()
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+class TestInterface(AppTestCase):
+    """
+    Test the interface endpoints in the fastapi app
+    """
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_get_interface(self, mock_manager, mock_device_type):
         """Test we can get an interface"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_device(mock_manager, IOSXR_GET_INTERFACE)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.get(
@@ -107,8 +133,8 @@ class TestInterface(TestCase):
             },
         )
 
-    @patch("app.backend.Device.save_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.save_device_type")
+    @patch("app.device.manager.connect")
     def test_get_device_type(self, mock_manager, _):
         """Test we can get an interface"""
         mock_config = MagicMock()
@@ -116,7 +142,8 @@ class TestInterface(TestCase):
         mock_manager_obj = MagicMock()
         mock_manager_obj.get_config.return_value = mock_config
         mock_manager_obj.server_capabilities = IOSXR_CAPABILITIES
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj.__enter__.return_value = mock_manager_obj
+        mock_manager.return_value = mock_manager_obj
 
         response = self.client.get(
             "/interface",
@@ -127,8 +154,8 @@ class TestInterface(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-    @patch("app.backend.Device.save_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.save_device_type")
+    @patch("app.device.manager.connect")
     def test_get_device_type_fail(self, mock_manager, _):
         """Test we can get an interface"""
         mock_config = MagicMock()
@@ -136,7 +163,8 @@ class TestInterface(TestCase):
         mock_manager_obj = MagicMock()
         mock_manager_obj.get_config.return_value = mock_config
         mock_manager_obj.server_capabilities = []
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj.__enter__.return_value = mock_manager_obj
+        mock_manager.return_value = mock_manager_obj
 
         response = self.client.get(
             "/interface",
@@ -170,15 +198,11 @@ class TestInterface(TestCase):
             response.json()["detail"][0]["loc"], ["query", "credential"]
         )
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_get_interface_missing(self, mock_manager, mock_device_type):
         """Test we get a 404 when interface is missing"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE_MISSING
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_device(mock_manager, IOSXR_GET_INTERFACE_MISSING)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.get(
@@ -211,15 +235,11 @@ class TestInterface(TestCase):
             },
         )
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_get_interfaces(self, mock_manager, mock_device_type):
         """Test we can get interfaces"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACES
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_device(mock_manager, IOSXR_GET_INTERFACES)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.get(
@@ -237,15 +257,45 @@ class TestInterface(TestCase):
             12,
         )
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_get_interfaces_stream(self, mock_manager, mock_device_type):
+        """Test we can stream interfaces as NDJSON"""
+        mock_device(mock_manager, IOSXR_GET_INTERFACES)
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "test", "stream": True},
+        )
+        self.assertEqual(response.status_code, 200)
+        interfaces = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(len(interfaces), 12)
+        self.assertDictEqual(
+            interfaces[0],
+            {
+                "active": "act",
+                "interface-name": "Loopback0",
+                "interface-virtual": None,
+                "ipv4-network": {
+                    "@xmlns": "http://cisco.com/ns/yang/Cisco-IOS-XR-ipv4-io-cfg",
+                    "addresses": {
+                        "primary": {
+                            "address": "10.0.0.1",
+                            "netmask": "255.255.255.255",
+                        }
+                    },
+                },
+            },
+        )
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_create_interface(self, mock_manager, mock_device_type):
         """Test we can create an interface"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE_MISSING
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj = mock_device(
+            mock_manager, IOSXR_GET_INTERFACE_MISSING
+        )
         mock_device_type.return_value = "iosxr"
 
         response = self.client.post(
@@ -263,15 +313,62 @@ class TestInterface(TestCase):
             config=IOSXR_CREATE_INTERFACE,
         )
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
-    def test_create_interface_exists(self, mock_manager, mock_device_type):
-        """Test we cant create an interface if it exists"""
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_create_interface_one_session(
+        self, mock_manager, mock_device_type
+    ):
+        """Test create checks and edits in one session under a lock"""
+        mock_manager_obj = mock_device(
+            mock_manager, IOSXR_GET_INTERFACE_MISSING
+        )
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.post(
+            "/interface",
+            params={"host": "test"},
+            json={
+                "interface_name": "vlan1",
+                "address": "10.0.0.1",
+                "netmask": "255.255.255.255",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        mock_manager.assert_called_once()
+        mock_manager_obj.locked.assert_called_once_with("candidate")
+        mock_manager_obj.commit.assert_called_once()
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_create_interface_commit_fail(
+        self, mock_manager, mock_device_type
+    ):
+        """Test a failed commit discards the candidate changes"""
         mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE
+        mock_config.data_xml = IOSXR_GET_INTERFACE_MISSING
         mock_manager_obj = MagicMock()
         mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj.commit.side_effect = RuntimeError("commit failed")
+        mock_manager.return_value = mock_manager_obj
+        mock_device_type.return_value = "iosxr"
+
+        response = self.client.post(
+            "/interface",
+            params={"host": "test"},
+            json={
+                "interface_name": "vlan1",
+                "address": "10.0.0.1",
+                "netmask": "255.255.255.255",
+            },
+        )
+        self.assertEqual(response.status_code, 500)
+        mock_manager_obj.discard_changes.assert_called_once()
+
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
+    def test_create_interface_exists(self, mock_manager, mock_device_type):
+        """Test we cant create an interface if it exists"""
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.post(
@@ -286,15 +383,13 @@ class TestInterface(TestCase):
         self.assertEqual(response.status_code, 409)
         mock_manager_obj.edit_config.assert_not_called()
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_create_interface_dry_run(self, mock_manager, mock_device_type):
         """Test we dont create an interface when dry run"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE_MISSING
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj = mock_device(
+            mock_manager, IOSXR_GET_INTERFACE_MISSING
+        )
         mock_device_type.return_value = "iosxr"
 
         response = self.client.post(
@@ -308,16 +403,13 @@ class TestInterface(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         mock_manager_obj.edit_config.assert_not_called()
+        mock_manager_obj.locked.assert_not_called()
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_delete_interface(self, mock_manager, mock_device_type):
         """Test we can delete an interface"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.delete(
@@ -333,15 +425,13 @@ class TestInterface(TestCase):
             config=IOSXR_DELETE_INTERFACE,
         )
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_delete_interface_missing(self, mock_manager, mock_device_type):
         """Test we cant delete an interface if its missing"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE_MISSING
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj = mock_device(
+            mock_manager, IOSXR_GET_INTERFACE_MISSING
+        )
         mock_device_type.return_value = "iosxr"
 
         response = self.client.delete(
@@ -354,15 +444,11 @@ class TestInterface(TestCase):
         self.assertEqual(response.status_code, 404)
         mock_manager_obj.edit_config.assert_not_called()
 
-    @patch("app.backend.Device.get_device_type")
-    @patch("app.backend.manager.connect")
+    @patch("app.device.Device.get_device_type")
+    @patch("app.device.manager.connect")
     def test_delete_interface_dry_run(self, mock_manager, mock_device_type):
         """Test we dont delete an interface when dry_run"""
-        mock_config = MagicMock()
-        mock_config.data_xml = IOSXR_GET_INTERFACE
-        mock_manager_obj = MagicMock()
-        mock_manager_obj.get_config.return_value = mock_config
-        mock_manager.return_value.__enter__.return_value = mock_manager_obj
+        mock_manager_obj = mock_device(mock_manager, IOSXR_GET_INTERFACE)
         mock_device_type.return_value = "iosxr"
 
         response = self.client.delete(
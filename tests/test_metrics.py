@@ -0,0 +1,59 @@
+"""
+Tests for the in process metrics
+"""
+
+from unittest import TestCase
+
+from app.metrics import Counter, Histogram, Registry
+
+
+class TestMetrics(TestCase):
+    """
+    Test counters and histograms render in the Prometheus text format
+    """
+
+    def test_counter(self):
+        """Test counts are kept per label values"""
+        registry = Registry()
+        counter = registry.counter("errors_total", "Errors", ("exception",))
+        counter.inc("KeyError")
+        counter.inc("KeyError")
+        counter.inc('Bad"Name')
+
+        self.assertEqual(counter.value("KeyError"), 2)
+        self.assertEqual(
+            registry.expose(),
+            "# HELP errors_total Errors\n"
+            "# TYPE errors_total counter\n"
+            'errors_total{exception="KeyError"} 2\n'
+            'errors_total{exception="Bad\\"Name"} 1\n',
+        )
+
+    def test_histogram(self):
+        """Test buckets are cumulative with a sum and count"""
+        histogram = Histogram("phase_seconds", "Phases", ("phase",), (0.1, 1))
+        histogram.observe(0.05, "parse")
+        histogram.observe(0.5, "parse")
+        histogram.observe(5, "parse")
+        with histogram.time("commit"):
+            pass
+
+        self.assertEqual(histogram.count("parse"), 3)
+        self.assertEqual(histogram.count("commit"), 1)
+        self.assertListEqual(
+            histogram.expose()[2:7],
+            [
+                'phase_seconds_bucket{phase="parse",le="0.1"} 1',
+                'phase_seconds_bucket{phase="parse",le="1.0"} 2',
+                'phase_seconds_bucket{phase="parse",le="+Inf"} 3',
+                'phase_seconds_sum{phase="parse"} 5.55',
+                'phase_seconds_count{phase="parse"} 3',
+            ],
+        )
+
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are off"""
+        counter = Counter("errors_total", "Errors")
+        counter.enabled = False
+        counter.inc()
+        self.assertEqual(counter.value(), 0)
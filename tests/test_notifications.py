@@ -0,0 +1,202 @@
+"""
+Tests for cache invalidation from NETCONF notifications
+"""
+
+import os
+import socket
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+from lxml import etree
+
+from app.device import read_cache
+from app.pool import session_pool
+from app.cache import ReadCache
+from app.main import app
+from app.notifications import NOTIFICATION_KEEPALIVE, Subscription
+from app.pool import set_keepalive
+from simulator import Simulator
+from tests.helpers import use_temporary_stores
+
+NOTIFICATION = """<notification \
+xmlns="urn:ietf:params:xml:ns:netconf:notification:1.0">
+<eventTime>2024-01-01T00:00:00Z</eventTime>
+<netconf-config-change \
+xmlns="urn:ietf:params:xml:ns:yang:ietf-netconf-notifications">
+<datastore>{datastore}</datastore>
+</netconf-config-change>
+</notification>"""
+LOOPBACK = """<config><interface-configurations \
+xmlns="http://cisco.com/ns/yang/Cisco-IOS-XR-ifmgr-cfg">
+<interface-configuration><active>act</active>
+<interface-name>Loopback500</interface-name><interface-virtual/>
+</interface-configuration></interface-configurations></config>"""
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    """Poll a condition until it holds or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestHandle(TestCase):
+    """
+    Test which notifications drop the cached reads of a host
+    """
+
+    def setUp(self):
+        read_cache.clear()
+        device = MagicMock(host="test")
+        self.subscription = Subscription(device)
+        read_cache.set("test", ("interfaces",), [])
+
+    def handle(self, xml: str) -> None:
+        """Handle a notification from its xml"""
+        self.subscription.handle(etree.fromstring(xml.encode()))
+
+    def test_running_changed(self):
+        """Test a change to running invalidates the host"""
+        self.handle(NOTIFICATION.format(datastore="running"))
+
+        self.assertIsNone(read_cache.get("test", ("interfaces",)))
+        self.assertEqual(self.subscription.status.notifications, 1)
+        self.assertEqual(
+            self.subscription.status.last_event_time, "2024-01-01T00:00:00Z"
+        )
+
+    def test_ignored(self):
+        """Test other datastores and events keep the cached reads"""
+        self.handle(NOTIFICATION.format(datastore="startup"))
+        self.handle(
+            NOTIFICATION.replace("netconf-config-change", "other").format(
+                datastore="running"
+            )
+        )
+
+        self.assertIsNotNone(read_cache.get("test", ("interfaces",)))
+        self.assertEqual(self.subscription.status.notifications, 2)
+
+    def test_watched_ttl(self):
+        """Test a watched host keeps reads past the normal ttl"""
+        cache = ReadCache(ttl=0)
+        cache.watch("test", 60)
+        cache.set("test", ("interfaces",), [])
+        cache.set("other", ("interfaces",), [])
+
+        self.assertIsNotNone(cache.get("test", ("interfaces",)))
+        self.assertIsNone(cache.get("other", ("interfaces",)))
+        cache.unwatch("test")
+        self.assertIsNone(cache.get("test", ("interfaces",)))
+
+
+class TestSubscriptions(TestCase):
+    """
+    Test subscriptions against the simulator
+    """
+
+    def setUp(self):
+        self.simulator = Simulator(interfaces=3).start()
+        self.addCleanup(self.simulator.stop)
+        use_temporary_stores(self)
+        patcher = patch.dict(
+            os.environ,
+            {
+                "DEFAULT_USERNAME": "test",
+                "DEFAULT_PASSWORD": "test",
+                "NETCONF_PORT": str(self.simulator.port),
+            },
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        session_pool.close_all()
+        read_cache.clear()
+        self.addCleanup(session_pool.close_all)
+        self.client = TestClient(app)
+
+    def names(self) -> list:
+        """Interface names from GET /interfaces"""
+        response = self.client.get(
+            "/interfaces", params={"host": "127.0.0.1", "output": "records"}
+        )
+        return [
+            record["interface_name"]
+            for record in response.json()["interfaces"]
+        ]
+
+    def status(self) -> dict:
+        """Status of the only subscription"""
+        return self.client.get("/admin/subscriptions").json()[0]
+
+    def test_change_invalidates(self):
+        """Test a change made outside the app is seen on the next read"""
+        self.assertEqual(len(self.names()), 3)
+        response = self.client.post(
+            "/admin/subscriptions", params={"host": "127.0.0.1"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            wait_for(lambda: self.status()["state"] == "subscribed")
+        )
+
+        self.simulator.reset_stats()
+        self.assertEqual(len(self.names()), 3)
+        self.assertEqual(self.simulator.rpcs["get-config"], 1)
+        self.assertEqual(len(self.names()), 3)
+        self.assertEqual(self.simulator.rpcs["get-config"], 1)
+
+        self.simulator.edit_running(LOOPBACK)
+        self.assertTrue(wait_for(lambda: self.status()["notifications"] > 0))
+        self.assertIn("Loopback500", self.names())
+        self.assertEqual(self.simulator.rpcs["get-config"], 2)
+
+        response = self.client.delete(
+            "/admin/subscriptions", params={"host": "127.0.0.1"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            self.client.get("/admin/subscriptions").json(), []
+        )
+        response = self.client.delete(
+            "/admin/subscriptions", params={"host": "127.0.0.1"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_keepalive_failure(self):
+        """Test a session whose keepalives fail drops the longer ttl"""
+        sessions = []
+
+        def keepalive(session, interval):
+            self.assertEqual(interval, NOTIFICATION_KEEPALIVE)
+            sessions.append(session)
+            set_keepalive(session, interval)
+
+        with patch("app.notifications.set_keepalive", side_effect=keepalive):
+            self.client.post(
+                "/admin/subscriptions", params={"host": "127.0.0.1"}
+            )
+            self.assertTrue(
+                wait_for(lambda: self.status()["state"] == "subscribed")
+            )
+            self.assertIn("127.0.0.1", read_cache.watched)
+            # pylint: disable-next=protected-access
+            transport = sessions[0]._session._transport
+            # what the kernel does once keepalives go unacknowledged
+            transport.sock.shutdown(socket.SHUT_RDWR)
+
+            self.assertTrue(
+                wait_for(lambda: "127.0.0.1" not in read_cache.watched)
+            )
+            self.assertTrue(
+                wait_for(lambda: self.status()["state"] == "subscribed")
+            )
+        self.assertEqual(len(sessions), 2)
+        self.assertFalse(sessions[0].connected)
+        self.client.delete(
+            "/admin/subscriptions", params={"host": "127.0.0.1"}
+        )
@@ -0,0 +1,125 @@
+"""
+Tests for dry runs rendered offline from the stored device type
+"""
+
+from unittest.mock import MagicMock, patch
+
+from app.device import read_cache
+from app.models import InterfaceFilter, OutputFormat
+from app.store import DeviceInfo
+from tests.fixtures import (
+    IOSXR_CREATE_INTERFACE,
+    IOSXR_DELETE_INTERFACE,
+    IOSXR_GET_INTERFACE_MISSING,
+    IOSXR_GET_INTERFACES,
+)
+from tests.helpers import AppTestCase, mock_device
+
+
+class TestOfflineDryRun(AppTestCase):
+    """
+    Test offline dry runs never connect to the device
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.device_store.save(DeviceInfo("test", "iosxr"))
+        self.mock_connect = MagicMock()
+        patcher = patch("app.device.manager.connect", self.mock_connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, **params):
+        """Offline dry run of creating vlan1"""
+        return self.client.post(
+            "/interface",
+            params={"host": "test", "dry_run": True, "offline": True} | params,
+            json={
+                "interface_name": "vlan1",
+                "address": "10.0.0.1",
+                "netmask": "255.255.255.255",
+            },
+        )
+
+    def delete(self, interface_name: str = "vlan1", **params):
+        """Offline dry run of deleting an interface"""
+        return self.client.delete(
+            "/interface",
+            params={
+                "host": "test",
+                "interface_name": interface_name,
+                "dry_run": True,
+                "offline": True,
+            }
+            | params,
+        )
+
+    def test_skipped(self):
+        """Test without cached reads the check is skipped"""
+        response = self.create()
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json(),
+            {"dry_run": IOSXR_CREATE_INTERFACE, "existence_check": "skipped"},
+        )
+        response = self.delete()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["dry_run"], IOSXR_DELETE_INTERFACE)
+        self.assertEqual(response.json()["existence_check"], "skipped")
+        self.mock_connect.assert_not_called()
+
+    def test_cached_records(self):
+        """Test a cached full read answers the check both ways"""
+        read_cache.set(
+            "test",
+            ("interfaces", InterfaceFilter(), OutputFormat.RECORDS),
+            {"interfaces": [{"interface_name": "vlan1"}]},
+        )
+        self.assertEqual(self.create().status_code, 409)
+        response = self.delete()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["existence_check"], "cached")
+        self.assertEqual(self.delete("vlan2").status_code, 404)
+
+        # too old for the caller so the check is skipped
+        response = self.create(max_age=0)
+        self.assertEqual(response.json()["existence_check"], "skipped")
+        self.mock_connect.assert_not_called()
+
+    def test_cached_raw(self):
+        """Test a cached GET /interfaces answers the check"""
+        mock_device(self.mock_connect, IOSXR_GET_INTERFACES)
+        self.client.get("/interfaces", params={"host": "test"})
+        self.mock_connect.reset_mock()
+
+        response = self.create()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["existence_check"], "cached")
+        self.assertEqual(self.delete("Loopback100").status_code, 200)
+        self.mock_connect.assert_not_called()
+
+    def test_cached_empty(self):
+        """Test a cached read of a device without interfaces"""
+        mock_device(
+            self.mock_connect,
+            IOSXR_GET_INTERFACE_MISSING.replace(
+                " </data>",
+                "<interface-configurations "
+                'xmlns="http://cisco.com/ns/yang/Cisco-IOS-XR-ifmgr-cfg"/>'
+                "</data>",
+            ),
+        )
+        self.client.get("/interfaces", params={"host": "test"})
+        self.mock_connect.reset_mock()
+
+        response = self.create()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["existence_check"], "cached")
+        self.assertEqual(self.delete().status_code, 404)
+        self.mock_connect.assert_not_called()
+
+    def test_invalid(self):
+        """Test unknown devices and offline without dry_run are refused"""
+        self.assertEqual(self.create(host="other").status_code, 409)
+        self.assertEqual(self.delete(dry_run=False).status_code, 422)
+        self.mock_connect.assert_not_called()
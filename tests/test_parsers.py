@@ -0,0 +1,99 @@
+"""
+Tests for parsing NETCONF replies with lxml
+"""
+
+from unittest import TestCase
+
+from app.models import InterfaceField
+from app.parsers import (
+    InterfaceRecord,
+    element_to_dict,
+    find_interface_names,
+    has_interface_configurations,
+    parse_interfaces,
+    parse_xml,
+)
+from tests.fixtures import (
+    IOSXR_GET_INTERFACE,
+    IOSXR_GET_INTERFACE_MISSING,
+    IOSXR_GET_INTERFACES,
+    iosxr_interfaces_xml,
+)
+
+
+class TestParsers(TestCase):
+    """
+    Test the dict and record views of a reply
+    """
+
+    def test_element_to_dict(self):
+        """Test the dict has the same shape xmltodict gave us"""
+        data = element_to_dict(parse_xml(IOSXR_GET_INTERFACE))["data"]
+        self.assertEqual(
+            data["@xmlns:nc"], "urn:ietf:params:xml:ns:netconf:base:1.0"
+        )
+        interface = data["interface-configurations"]["interface-configuration"]
+        self.assertIsNone(interface["interface-virtual"])
+        self.assertDictEqual(
+            interface["ipv4-network"]["addresses"],
+            {"primary": {"address": "10.0.0.1", "netmask": "255.255.255.255"}},
+        )
+
+    def test_element_to_dict_attributes(self):
+        """Test attributes, prefixes and repeated tags"""
+        root = parse_xml(
+            '<a xmlns:x="urn:x" x:id="1"><x:b k="v">one</x:b>'
+            "<x:b>two</x:b></a>"
+        )
+        self.assertDictEqual(
+            element_to_dict(root),
+            {
+                "a": {
+                    "@xmlns:x": "urn:x",
+                    "@x:id": "1",
+                    "x:b": [{"@k": "v", "#text": "one"}, "two"],
+                }
+            },
+        )
+
+    def test_validate_xpaths(self):
+        """Test the compiled XPaths used to validate and list names"""
+        self.assertTrue(
+            has_interface_configurations(parse_xml(IOSXR_GET_INTERFACE))
+        )
+        missing = parse_xml(IOSXR_GET_INTERFACE_MISSING)
+        self.assertFalse(has_interface_configurations(missing))
+        self.assertListEqual(find_interface_names(missing), [])
+        self.assertIn(
+            "Loopback100",
+            find_interface_names(parse_xml(IOSXR_GET_INTERFACES)),
+        )
+
+    def test_parse_interfaces(self):
+        """Test records are built from each interface-configuration"""
+        records = parse_interfaces(parse_xml(IOSXR_GET_INTERFACES))
+        self.assertEqual(
+            records[1],
+            InterfaceRecord(
+                interface_name="Loopback100",
+                description="***TEST LOOPBACK****",
+                address="1.1.1.100",
+                netmask="255.255.255.255",
+                virtual=True,
+            ),
+        )
+        self.assertEqual(
+            records[1].project((InterfaceField.DESCRIPTION,)),
+            InterfaceRecord(
+                interface_name="Loopback100",
+                description="***TEST LOOPBACK****",
+            ),
+        )
+
+    def test_parse_synthetic(self):
+        """Test the synthetic replies used by the benchmarks"""
+        records = parse_interfaces(parse_xml(iosxr_interfaces_xml(21)))
+        self.assertEqual(len(records), 21)
+        self.assertEqual(records[14].vrf, "BENCH")
+        self.assertTrue(records[15].shutdown)
+        self.assertEqual(records[15].description, "Synthetic 15")
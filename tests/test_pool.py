@@ -0,0 +1,204 @@
+"""
+Tests for the NETCONF session pool
+"""
+
+import socket
+import threading
+import time
+from unittest import TestCase, skipUnless
+from unittest.mock import MagicMock, patch
+
+from app import deadlines
+from app.breaker import CircuitBreakers
+from app.exceptions import (
+    CircuitOpen,
+    DeadlineExceeded,
+    SessionPoolExhausted,
+)
+from app.pool import SessionPool, set_keepalive
+
+KEY = ("test", "DEFAULT")
+PARAMS = {"host": "test"}
+
+
+class TestSessionPool(TestCase):
+    """
+    Test sessions are reused, capped and evicted
+    """
+
+    @patch("app.pool.manager.connect")
+    def test_session_reused(self, mock_connect):
+        """Test a released session is handed out again"""
+        pool = SessionPool()
+        with pool.session(KEY, PARAMS) as first:
+            pass
+        with pool.session(KEY, PARAMS) as second:
+            pass
+
+        self.assertIs(first, second)
+        mock_connect.assert_called_once_with(**PARAMS)
+
+    @patch("app.pool.manager.connect")
+    def test_session_disconnected(self, mock_connect):
+        """Test a session that dropped is closed rather than reused"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool()
+        with pool.session(KEY, PARAMS) as first:
+            first.connected = False
+        with pool.session(KEY, PARAMS) as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close_session.assert_called_once()
+        self.assertEqual(mock_connect.call_count, 2)
+
+    @patch("app.pool.manager.connect")
+    def test_session_max_lifetime(self, mock_connect):
+        """Test a session past its max lifetime is not reused"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool(max_lifetime=0)
+        with pool.session(KEY, PARAMS) as first:
+            pass
+        with pool.session(KEY, PARAMS) as second:
+            pass
+
+        self.assertIsNot(first, second)
+        first.close_session.assert_called_once()
+
+    @patch("app.pool.manager.connect")
+    def test_session_exhausted(self, mock_connect):
+        """Test we give up when all sessions to the device are busy"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool(max_sessions=1, acquire_timeout=0.01)
+        with pool.session(KEY, PARAMS):
+            with self.assertRaises(SessionPoolExhausted):
+                with pool.session(KEY, PARAMS):
+                    pass
+
+        with pool.session(KEY, PARAMS):
+            pass
+        mock_connect.assert_called_once()
+
+    @patch("app.pool.manager.connect")
+    def test_evicted_closed_on_failure(self, mock_connect):
+        """Test sessions evicted while waiting are closed when we give up"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool(max_sessions=1, acquire_timeout=0.01)
+        with pool.session(KEY, PARAMS):
+            with pool.session(("other", "DEFAULT"), PARAMS) as other:
+                pass
+            other.connected = False
+            with self.assertRaises(SessionPoolExhausted):
+                with pool.session(KEY, PARAMS):
+                    pass
+
+        other.close_session.assert_called_once()
+
+    @patch("app.pool.manager.connect")
+    def test_release_wakes_key(self, mock_connect):
+        """Test a release wakes the waiter for its key behind others"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool(max_sessions=1, acquire_timeout=5)
+        other = ("other", "DEFAULT")
+        waited = {}
+
+        def wait(key):
+            start = time.monotonic()
+            with pool.session(key, PARAMS):
+                waited[key] = time.monotonic() - start
+
+        with pool.session(other, PARAMS):
+            with pool.session(KEY, PARAMS):
+                threads = []
+                for key in (other, KEY):
+                    threads.append(threading.Thread(target=wait, args=(key,)))
+                    threads[-1].start()
+                    time.sleep(0.1)
+            threads[1].join(2)
+        threads[0].join()
+
+        self.assertLess(waited[KEY], 1)
+
+    @patch("app.pool.manager.connect")
+    def test_connect_failure(self, mock_connect):
+        """Test a failed connect does not use up a slot"""
+        mock_connect.side_effect = ConnectionError
+        pool = SessionPool(max_sessions=1, acquire_timeout=0.01)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                with pool.session(KEY, PARAMS):
+                    pass
+        self.assertEqual(mock_connect.call_count, 2)
+
+    @patch("app.pool.circuit_breakers", CircuitBreakers(failures=1))
+    @patch("app.pool.manager.connect")
+    def test_breaker_wakes_waiters(self, mock_connect):
+        """Test all waiters give up once a failed connect opens the breaker"""
+
+        def connect(**_):
+            time.sleep(0.2)
+            raise ConnectionError
+
+        mock_connect.side_effect = connect
+        pool = SessionPool(max_sessions=1, acquire_timeout=5)
+        errors = []
+
+        def acquire():
+            start = time.monotonic()
+            try:
+                with pool.session(KEY, PARAMS):
+                    pass
+            except (CircuitOpen, ConnectionError) as e:
+                errors.append((e.__class__, time.monotonic() - start))
+
+        threads = [threading.Thread(target=acquire) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            sorted(error.__name__ for error, _ in errors),
+            ["CircuitOpen", "CircuitOpen", "ConnectionError"],
+        )
+        self.assertLess(max(seconds for _, seconds in errors), 1)
+
+    @patch("app.pool.manager.connect")
+    def test_deadline(self, mock_connect):
+        """Test waiting for a session stops at the request deadline"""
+        mock_connect.side_effect = lambda **_: MagicMock()
+        pool = SessionPool(max_sessions=1)
+        with pool.session(KEY, PARAMS):
+            with deadlines.within(0.05):
+                with self.assertRaises(DeadlineExceeded):
+                    with pool.session(KEY, PARAMS):
+                        pass
+
+    @patch("app.pool.manager.connect")
+    def test_connect_timeout(self, mock_connect):
+        """Test a connect gets what is left of the deadline as timeout"""
+        pool = SessionPool()
+        with deadlines.within(5):
+            with pool.session(KEY, {**PARAMS, "timeout": 30}) as session:
+                pass
+
+        self.assertLessEqual(mock_connect.call_args.kwargs["timeout"], 5)
+        self.assertEqual(session.timeout, 30)
+
+    @skipUnless(hasattr(socket, "TCP_USER_TIMEOUT"), "Linux only")
+    def test_set_keepalive(self):
+        """Test keepalives are sent and unacknowledged data times out"""
+        # pylint: disable=protected-access
+        session = MagicMock()
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            session._session._transport.sock = sock
+            set_keepalive(session, 30)
+            timeout = sock.getsockopt(
+                socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT
+            )
+        session._session._transport.set_keepalive.assert_called_once_with(30)
+        self.assertEqual(timeout, 90000)
+
+        session = MagicMock()
+        set_keepalive(session, 0)
+        session._session._transport.set_keepalive.assert_not_called()
@@ -0,0 +1,76 @@
+"""
+Tests for profiling requests on demand
+"""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from tests.fixtures import IOSXR_GET_INTERFACES
+from tests.helpers import AppTestCase, mock_device
+
+
+class TestProfiling(AppTestCase):
+    """
+    Test requests with the profiling token are profiled
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+        for patcher in (
+            patch("app.profiling.PROFILE_TOKEN", "secret"),
+            patch("app.profiling.PROFILE_DIR", self.profile_dir),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("app.device.Device.get_device_type", return_value="iosxr")
+    @patch("app.device.manager.connect")
+    def test_profile(self, mock_connect, _):
+        """Test the loop and executor work of a request is profiled"""
+        mock_device(mock_connect, IOSXR_GET_INTERFACES)
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "test"},
+            headers={"X-Profile": "secret"},
+        )
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers["X-Profile-Id"]
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.profile_dir, f"{profile_id}.prof")
+            )
+        )
+
+        response = self.client.get(
+            f"/profiles/{profile_id}",
+            params={"limit": 1000},
+            headers={"X-Profile": "secret"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("get_config_element", response.text)
+        self.assertIn("render", response.text)
+
+        response = self.client.get(f"/profiles/{profile_id}")
+        self.assertEqual(response.status_code, 403)
+
+    def test_profile_not_requested(self):
+        """Test a missing or wrong token is not profiled"""
+        response = self.client.get("/healthz", params={"profile": "wrong"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response.headers)
+
+        response = self.client.get("/healthz", params={"profile": "secret"})
+        self.assertIn("X-Profile-Id", response.headers)
+
+    def test_profile_unknown(self):
+        """Test ids we did not generate are not read from disk"""
+        response = self.client.get(
+            "/profiles/..%2F..%2Fetc%2Fpasswd",
+            headers={"X-Profile": "secret"},
+        )
+        self.assertEqual(response.status_code, 404)
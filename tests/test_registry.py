@@ -0,0 +1,86 @@
+"""
+Tests for the template registry
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from lxml import etree
+
+from app.exceptions import InvalidDeviceType, MissingTemplate
+from app.registry import (
+    TEMPLATE_DIR,
+    TemplateOperation,
+    TemplateRegistry,
+    xpath_literal,
+)
+
+
+class TestTemplateRegistry(TestCase):
+    """
+    Test templates are compiled up front and looked up by operation
+    """
+
+    def setUp(self):
+        self.template_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.template_dir)
+
+    def test_load(self):
+        """Test every operation has a compiled template for iosxr"""
+        registry = TemplateRegistry().load()
+        for operation in TemplateOperation:
+            self.assertIs(
+                registry.get("iosxr", operation),
+                registry.get("iosxr", operation),
+            )
+        self.assertIn(
+            "<interface-name>Loopback0</interface-name>",
+            registry.render(
+                "iosxr",
+                TemplateOperation.GET_INTERFACE,
+                interface_name="Loopback0",
+            ),
+        )
+
+    def test_load_missing(self):
+        """Test a device type without a full set fails to load"""
+        shutil.copy(
+            TEMPLATE_DIR / "iosxr_get_interface.xml.j2", self.template_dir
+        )
+        with self.assertRaises(MissingTemplate) as context:
+            TemplateRegistry(self.template_dir).load(("iosxr",))
+        self.assertIn("iosxr_get_interfaces.xml.j2", str(context.exception))
+        self.assertNotIn("iosxr_get_interface.xml.j2", str(context.exception))
+
+    def test_get_unknown_device_type(self):
+        """Test a device type we have no templates for"""
+        registry = TemplateRegistry().load()
+        with self.assertRaises(InvalidDeviceType):
+            registry.get("junos", TemplateOperation.GET_INTERFACE)
+
+    def test_xpath_prefix_quoted(self):
+        """Test quotes in a prefix stay inside the XPath string literal"""
+        registry = TemplateRegistry().load()
+        config = etree.fromstring(
+            "<interface-configurations><interface-configuration>"
+            "<interface-name>GigabitEthernet0</interface-name>"
+            "</interface-configuration></interface-configurations>"
+        )
+        for prefix in ("Lo' or true() or 'x", 'Lo"op', "G'i\"g"):
+            literal = xpath_literal(prefix)
+            rendered = registry.render(
+                "iosxr", TemplateOperation.GET_INTERFACES, xpath_prefix=prefix
+            )
+            self.assertIn(literal, etree.fromstring(rendered).get("select"))
+            self.assertEqual(config.xpath(f"string({literal})"), prefix)
+            self.assertListEqual(
+                config.xpath(
+                    "/interface-configurations/interface-configuration"
+                    f"[starts-with(interface-name, {literal})]"
+                ),
+                [],
+            )
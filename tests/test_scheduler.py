@@ -0,0 +1,175 @@
+"""
+Tests for the per device commit scheduler
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from app.exceptions import CannotEdit, DeadlineExceeded
+from app.scheduler import CommitScheduler, PendingWrite
+
+KEY = ("test", "DEFAULT")
+
+
+class TestCommitScheduler(TestCase):
+    """
+    Test writes are coalesced and each writer gets its own outcome
+    """
+
+    def setUp(self):
+        self.batches = []
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def apply(self, writes: list) -> list:
+        """Record the batch, fail writes named bad and defer repeats"""
+        with self.lock:
+            self.batches.append([write.name for write in writes])
+        time.sleep(0.05)
+        deferred, names = [], set()
+        for write in writes:
+            if write.name in names:
+                deferred.append(write)
+            elif write.name == "bad":
+                write.resolve(error=CannotEdit("bad"))
+            else:
+                names.add(write.name)
+                write.resolve(write.name.upper())
+        return deferred
+
+    async def run_leader(self, func, *args):
+        """Run a leader's blocking work on a thread and count it"""
+        self.threads.append(func)
+        return await asyncio.to_thread(func, *args)
+
+    def submit(self, scheduler: CommitScheduler, write: PendingWrite, apply):
+        """Submit a write from an event loop of its own"""
+        return asyncio.run(
+            scheduler.submit_async(KEY, write, apply, self.run_leader)
+        )
+
+    def submit_all(self, scheduler: CommitScheduler, names: list) -> list:
+        """Submit a write per name at once and collect the outcomes"""
+
+        async def submit_all():
+            return await asyncio.gather(
+                *(
+                    scheduler.submit_async(
+                        KEY,
+                        PendingWrite("create", name),
+                        self.apply,
+                        self.run_leader,
+                    )
+                    for name in names
+                ),
+                return_exceptions=True,
+            )
+
+        return asyncio.run(submit_all())
+
+    def test_coalesced(self):
+        """Test concurrent writes share batches and get their results"""
+        scheduler = CommitScheduler(window=0.05)
+        names = [f"Loopback{n}" for n in range(20)]
+        results = self.submit_all(scheduler, names)
+
+        self.assertListEqual(results, [name.upper() for name in names])
+        self.assertLess(len(self.batches), len(names))
+        self.assertEqual(sum(len(batch) for batch in self.batches), 20)
+        self.assertDictEqual(scheduler.pending, {})
+
+    def test_leader_thread(self):
+        """Test writers only take a thread to lead a batch"""
+        scheduler = CommitScheduler(window=0.05)
+        names = [f"Loopback{n}" for n in range(20)]
+        self.submit_all(scheduler, names)
+
+        self.assertLess(len(self.threads), len(names))
+        self.assertEqual(len(self.threads), len(self.batches))
+
+    def test_own_outcome(self):
+        """Test a failed write only fails its own writer"""
+        scheduler = CommitScheduler(window=0.05)
+        results = self.submit_all(scheduler, ["one", "bad", "two"])
+
+        self.assertEqual(results[0], "ONE")
+        self.assertIsInstance(results[1], CannotEdit)
+        self.assertEqual(results[2], "TWO")
+
+    def test_deferred(self):
+        """Test a second write to a name goes in a later batch"""
+        scheduler = CommitScheduler(window=0.05)
+        results = self.submit_all(scheduler, ["one", "one"])
+
+        self.assertListEqual(results, ["ONE", "ONE"])
+        self.assertListEqual(self.batches[-1], ["one"])
+
+    def test_deadline(self):
+        """Test queued writes give up at their deadline, not the batch's"""
+        scheduler = CommitScheduler(window=0)
+        started = threading.Event()
+
+        def apply(writes):
+            started.set()
+            time.sleep(0.5)
+            return self.apply(writes)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(
+                self.submit, scheduler, PendingWrite("create", "one"), apply
+            )
+            started.wait()
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                self.submit(
+                    scheduler,
+                    PendingWrite("create", "late", deadline=start + 0.1),
+                    apply,
+                )
+            self.assertLess(time.monotonic() - start, 0.3)
+            self.assertEqual(leader.result(), "ONE")
+
+        self.assertListEqual(self.batches, [["one"]])
+        self.assertDictEqual(scheduler.pending, {})
+
+    def test_cancelled(self):
+        """Test a cancelled writer does not hold up the writes behind it"""
+        scheduler = CommitScheduler(window=0)
+        # another writer is leading so these queue
+        scheduler.pending[KEY] = []
+        writes = [PendingWrite("create", name) for name in ("two", "three")]
+
+        async def cancel_first():
+            tasks = [
+                asyncio.create_task(
+                    scheduler.submit_async(
+                        KEY, write, self.apply, self.run_leader
+                    )
+                )
+                for write in writes
+            ]
+            await asyncio.sleep(0.05)
+            # handed the lead just as its writer is cancelled
+            writes[0].leader = True
+            tasks[0].cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await tasks[0]
+            return await asyncio.wait_for(tasks[1], 2)
+
+        self.assertEqual(asyncio.run(cancel_first()), "THREE")
+        self.assertListEqual(self.batches, [["three"]])
+        self.assertDictEqual(scheduler.pending, {})
+
+    def test_apply_raises(self):
+        """Test every write in a batch gets the error if apply raises"""
+        scheduler = CommitScheduler(window=0)
+
+        def apply(_):
+            raise RuntimeError("session failed")
+
+        with self.assertRaises(RuntimeError):
+            self.submit(scheduler, PendingWrite("create", "one"), apply)
+        self.assertDictEqual(scheduler.pending, {})
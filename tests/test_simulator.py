@@ -0,0 +1,269 @@
+"""
+Tests for the NETCONF simulator and the app running against it
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from lxml import etree
+
+from app.device import read_cache
+from app.pool import session_pool
+from app.main import app
+from simulator import Simulator, subtree_filter
+from tests.helpers import use_temporary_stores
+
+FILTER = """<interface-configurations \
+xmlns="http://cisco.com/ns/yang/Cisco-IOS-XR-ifmgr-cfg">
+ <interface-configuration>
+  <interface-name>Loopback3</interface-name>
+ </interface-configuration>
+ <interface-configuration>
+  <active/>
+  <interface-name/>
+  <description/>
+ </interface-configuration>
+</interface-configurations>"""
+
+
+class TestSubtreeFilter(TestCase):
+    """
+    Test the simulator applies subtree filters like a device
+    """
+
+    def test_subtree_filter(self):
+        """Test content match, selection and containment nodes"""
+        simulator = Simulator(interfaces=4)
+        spec = etree.fromstring(
+            FILTER, etree.XMLParser(remove_blank_text=True)
+        )
+        trimmed = subtree_filter(simulator.config.running[0], spec)
+
+        interfaces = list(trimmed)
+        self.assertEqual(len(interfaces), 4)
+        # Loopback3 matched the content match node so is complete
+        self.assertEqual(len(interfaces[3]), 5)
+        # the rest only have the selected leaves
+        self.assertListEqual(
+            [etree.QName(leaf).localname for leaf in interfaces[0]],
+            ["active", "interface-name", "description"],
+        )
+        self.assertListEqual(
+            [etree.QName(leaf).localname for leaf in interfaces[1]],
+            ["active", "interface-name"],
+        )
+
+
+class TestSimulator(TestCase):
+    """
+    Test the app end to end against the simulator
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.simulator = Simulator(interfaces=10).start()
+        cls.env_patcher = patch.dict(
+            os.environ,
+            {
+                "DEFAULT_USERNAME": "test",
+                "DEFAULT_PASSWORD": "test",
+                "NETCONF_PORT": str(cls.simulator.port),
+            },
+        )
+        cls.env_patcher.start()
+        cls.client = TestClient(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env_patcher.stop()
+        cls.simulator.stop()
+
+    def setUp(self):
+        session_pool.close_all()
+        read_cache.clear()
+        self.store = use_temporary_stores(self)
+
+    def tearDown(self):
+        session_pool.close_all()
+
+    def test_interfaces(self):
+        """Test discovery, reads, a create and a delete"""
+        self.simulator.reset_stats()
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "output": "records"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["interfaces"]), 10)
+        self.assertEqual(self.store.get("127.0.0.1").device_type, "iosxr")
+
+        response = self.client.post(
+            "/interface",
+            params={"host": "127.0.0.1"},
+            json={
+                "interface_name": "Loopback100",
+                "address": "10.1.1.1",
+                "netmask": "255.255.255.255",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            "/interface",
+            params={
+                "host": "127.0.0.1",
+                "interface_name": "Loopback100",
+                "output": "records",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["address"], "10.1.1.1")
+
+        response = self.client.delete(
+            "/interface",
+            params={"host": "127.0.0.1", "interface_name": "Loopback100"},
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            "/interface",
+            params={"host": "127.0.0.1", "interface_name": "Loopback100"},
+        )
+        self.assertEqual(response.status_code, 404)
+
+        # one session to discover and one pooled session for the rest
+        self.assertEqual(self.simulator.stats["sessions_opened"], 2)
+        self.assertEqual(self.simulator.rpcs["commit"], 2)
+
+    def test_concurrent_writes(self):
+        """Test concurrent writes to one device share commits"""
+        self.client.get("/interfaces", params={"host": "127.0.0.1"})
+        self.simulator.reset_stats()
+
+        def create(n):
+            return self.client.post(
+                "/interface",
+                params={"host": "127.0.0.1"},
+                json={
+                    "interface_name": f"Loopback{100 + n}",
+                    "address": f"10.1.1.{n}",
+                    "netmask": "255.255.255.255",
+                },
+            ).status_code
+
+        def delete(n):
+            return self.client.delete(
+                "/interface",
+                params={
+                    "host": "127.0.0.1",
+                    "interface_name": f"Loopback{100 + n}",
+                },
+            ).status_code
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            self.assertListEqual(list(pool.map(create, range(10))), [200] * 10)
+            # the duplicate gets its own conflict back
+            self.assertListEqual(list(pool.map(create, [0, 10])), [409, 200])
+            self.assertListEqual(list(pool.map(delete, range(11))), [200] * 11)
+
+        self.assertLess(self.simulator.rpcs["commit"], 23)
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "max_age": 0, "output": "records"},
+        )
+        self.assertEqual(len(response.json()["interfaces"]), 10)
+
+    def test_reconcile(self):
+        """Test PUT /interfaces applies a minimal diff in one commit"""
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "output": "records"},
+        )
+        current = {
+            record["interface_name"]: record
+            for record in response.json()["interfaces"]
+        }
+        desired = [
+            {
+                "interface_name": "Loopback0",
+                "address": current["Loopback0"]["address"],
+                "netmask": current["Loopback0"]["netmask"],
+            },
+            {
+                "interface_name": "Loopback1",
+                "address": "10.9.9.9",
+                "netmask": "255.255.255.255",
+            },
+            {
+                "interface_name": "Loopback100",
+                "address": "10.9.9.10",
+                "netmask": "255.255.255.255",
+            },
+        ]
+        self.simulator.reset_stats()
+
+        response = self.client.put(
+            "/interfaces",
+            params={"host": "127.0.0.1", "dry_run": True},
+            json=desired,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["dry_run"]), 2)
+        self.assertEqual(self.simulator.rpcs["edit-config"], 0)
+
+        response = self.client.put(
+            "/interfaces", params={"host": "127.0.0.1"}, json=desired
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertDictEqual(
+            response.json(),
+            {
+                "added": ["Loopback100"],
+                "changed": ["Loopback1"],
+                "deleted": [f"Loopback{n}" for n in range(2, 10)],
+                "unchanged": ["Loopback0"],
+                "committed": True,
+            },
+        )
+        self.assertEqual(self.simulator.rpcs["commit"], 1)
+
+        response = self.client.get(
+            "/interfaces",
+            params={"host": "127.0.0.1", "output": "records"},
+        )
+        self.assertDictEqual(
+            {
+                record["interface_name"]: record["address"]
+                for record in response.json()["interfaces"]
+            },
+            {
+                "Loopback0": current["Loopback0"]["address"],
+                "Loopback1": "10.9.9.9",
+                "Loopback100": "10.9.9.10",
+            },
+        )
+
+        # already matches so nothing is sent
+        response = self.client.put(
+            "/interfaces", params={"host": "127.0.0.1"}, json=desired
+        )
+        self.assertFalse(response.json()["committed"])
+        self.assertEqual(len(response.json()["unchanged"]), 3)
+        self.assertEqual(self.simulator.rpcs["commit"], 1)
+        self.assertEqual(self.simulator.rpcs["edit-config"], 2)
+
+        response = self.client.put(
+            "/interfaces",
+            params={"host": "127.0.0.1", "name_prefix": "Gig"},
+            json=desired,
+        )
+        self.assertEqual(response.status_code, 422)
+
+        # a prefix that would break out of the XPath filter
+        response = self.client.put(
+            "/interfaces",
+            params={"host": "127.0.0.1", "name_prefix": "Lo' or true() or 'x"},
+            json=desired,
+        )
+        self.assertEqual(response.status_code, 422)
@@ -0,0 +1,342 @@
+"""
+Tests for the device store, the cache in front of it, the cache
+shared between workers and config snapshots
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from app.cache import ReadCache
+from app.models import Job, JobStatus
+from app.store import (
+    DeviceInfo,
+    DeviceStore,
+    JobStore,
+    SharedCache,
+    SnapshotStore,
+)
+
+from tests.fixtures import IOSXR_CAPABILITIES
+
+
+class TestDeviceStore(TestCase):
+    """
+    Test device types are stored once per host and served from cache
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "netconf.db")
+        self.store = DeviceStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def count_rows(self) -> int:
+        """Count rows in device_info straight from the file"""
+        conn = sqlite3.connect(self.path)
+        count = conn.execute("SELECT COUNT(*) FROM device_info").fetchone()[0]
+        conn.close()
+        return count
+
+    def test_save_upsert(self):
+        """Test saving a host twice keeps one row with the latest values"""
+        self.store.save(DeviceInfo("test", "default"))
+        self.store.save(DeviceInfo("test", "iosxr", tuple(IOSXR_CAPABILITIES)))
+        self.store.cache.clear()
+
+        self.assertEqual(
+            self.store.get("test"),
+            DeviceInfo("test", "iosxr", tuple(IOSXR_CAPABILITIES)),
+        )
+        self.assertEqual(self.count_rows(), 1)
+
+    def test_save_many(self):
+        """Test a bulk save upserts every host"""
+        self.store.save(DeviceInfo("one", "default"))
+        self.store.save_many(
+            [DeviceInfo("one", "iosxr"), DeviceInfo("two", "iosxr")]
+        )
+        self.store.cache.clear()
+
+        self.assertEqual(self.store.get("one").device_type, "iosxr")
+        self.assertEqual(self.store.get("two").device_type, "iosxr")
+        self.assertEqual(self.count_rows(), 2)
+
+    def test_get_cached(self):
+        """Test a cached host does not need the database"""
+        self.store.save(DeviceInfo("test", "iosxr"))
+        self.store.connection().close()
+
+        self.assertEqual(self.store.get("test").device_type, "iosxr")
+
+    def test_get_missing(self):
+        """Test an unknown host returns None"""
+        self.assertIsNone(self.store.get("test"))
+
+    def test_invalidate(self):
+        """Test an invalidated host is gone from cache and database"""
+        self.store.save(DeviceInfo("test", "iosxr"))
+
+        self.assertTrue(self.store.invalidate("test"))
+        self.assertIsNone(self.store.get("test"))
+        self.assertFalse(self.store.invalidate("test"))
+
+    def test_migrate_legacy_table(self):
+        """Test duplicate rows from the old schema are collapsed"""
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE device_info ( "
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "host TEXT NOT NULL, "
+            "device_type TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO device_info (host, device_type) VALUES (?, ?)",
+            [("test", "iosxr"), ("test", "iosxr"), ("other", "iosxr")],
+        )
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.store.get("test"), DeviceInfo("test", "iosxr"))
+        self.assertEqual(self.count_rows(), 2)
+
+
+class TestJobStore(TestCase):
+    """
+    Test background jobs are saved and found again
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.tmpdir, "netconf.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_save_get(self):
+        """Test a job round trips and updates in place"""
+        job = Job(
+            job_id="one", operation="test", params={"a": 1}, created_at=1
+        )
+        self.store.save(job)
+        job.status = JobStatus.SUCCEEDED
+        job.status_code = 200
+        job.result = {"detail": "done"}
+        job.finished_at = 2
+        self.store.save(job)
+
+        self.assertEqual(self.store.get("one"), job)
+        self.assertIsNone(self.store.get("two"))
+
+    def test_with_status_purge(self):
+        """Test jobs are listed by status and old finished ones purged"""
+        for job_id, created_at in (("two", 2), ("one", 1)):
+            self.store.save(
+                Job(
+                    job_id=job_id,
+                    operation="test",
+                    params={},
+                    created_at=created_at,
+                )
+            )
+        self.store.save(
+            Job(
+                job_id="done",
+                operation="test",
+                params={},
+                status=JobStatus.SUCCEEDED,
+                created_at=1,
+                finished_at=1,
+            )
+        )
+
+        self.assertListEqual(
+            [job.job_id for job in self.store.with_status(JobStatus.QUEUED)],
+            ["one", "two"],
+        )
+        self.assertEqual(self.store.purge(before=2), 1)
+        self.assertIsNone(self.store.get("done"))
+
+    def test_claim(self):
+        """Test a queued job is claimed once, by one worker process"""
+        self.store.save(
+            Job(job_id="one", operation="test", params={}, created_at=1)
+        )
+        other = JobStore(self.store.path)
+        self.addCleanup(other.close)
+
+        job = self.store.claim("one", 100)
+        self.assertEqual(job.status, JobStatus.RUNNING)
+        self.assertEqual(job.owner, 100)
+        self.assertIsNotNone(job.started_at)
+        self.assertIsNone(other.claim("one", 200))
+        self.assertIsNone(self.store.claim("missing", 100))
+
+
+class TestSharedCache(TestCase):
+    """
+    Test two workers, each with its own connections to the same file,
+    see each others reads and invalidations
+    """
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = os.path.join(tmpdir, "netconf.db")
+        self.first, self.first_reads = self.worker()
+        self.second, self.second_reads = self.worker()
+
+    def worker(self) -> tuple:
+        """Device store and read cache as one worker process has them"""
+        shared = SharedCache(self.path)
+        store = DeviceStore(self.path, shared=shared)
+        self.addCleanup(shared.close)
+        self.addCleanup(store.close)
+        return store, ReadCache(shared=shared)
+
+    def test_device_invalidated_everywhere(self):
+        """Test forgetting a host in one worker is seen by the other"""
+        self.first.save(DeviceInfo("test", "iosxr"))
+        self.assertEqual(self.second.get("test").device_type, "iosxr")
+
+        self.first.invalidate("test")
+
+        self.assertIsNone(self.second.get("test"))
+
+    def test_device_rediscovered_everywhere(self):
+        """Test a host saved again in one worker is reloaded by the other"""
+        self.first.save(DeviceInfo("test", "default"))
+        self.assertEqual(self.second.get("test").device_type, "default")
+
+        self.first.save(DeviceInfo("test", "iosxr"))
+
+        self.assertEqual(self.second.get("test").device_type, "iosxr")
+
+    def test_read_shared(self):
+        """Test a read cached by one worker is served by the other"""
+        cached = self.first_reads.set(
+            "test", ("interfaces",), [{"name": "Loopback0"}]
+        )
+
+        self.assertEqual(
+            self.second_reads.get("test", ("interfaces",)), cached
+        )
+        self.assertIsNone(
+            self.second_reads.get("test", ("interfaces",), max_age=-1)
+        )
+
+    def test_read_invalidated_everywhere(self):
+        """Test a write in one worker retires the reads of both"""
+        self.first_reads.set("test", ("interfaces",), [])
+        self.assertIsNotNone(self.second_reads.get("test", ("interfaces",)))
+
+        self.second_reads.invalidate("test")
+
+        self.assertIsNone(self.first_reads.get("test", ("interfaces",)))
+        self.assertIsNone(self.second_reads.get("test", ("interfaces",)))
+
+    def test_stale_read_dropped(self):
+        """Test a read that started before a write is not shared"""
+        generation = self.first_reads.generation("test")
+        self.second_reads.invalidate("test")
+        self.first_reads.set("test", ("interfaces",), [], generation)
+
+        self.assertIsNone(self.second_reads.get("test", ("interfaces",)))
+
+
+class TestSnapshotStore(TestCase):
+    """
+    Test snapshots are versioned, deduplicated and rebuilt from deltas
+    """
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = os.path.join(tmpdir, "netconf.db")
+        self.store = SnapshotStore(self.path, full_every=3, keep=4)
+        self.addCleanup(self.store.close)
+
+    def save_versions(self, count: int) -> list:
+        """Save count versions that each change something, return them"""
+        snapshots = []
+        for version in range(count):
+            interfaces = {
+                f"Loopback{index}": {"description": f"{version}"}
+                for index in range(version % 3 + 1)
+            }
+            interfaces["Loopback9"] = {"description": str(version // 2)}
+            self.store.save("test", f'"{version}"', interfaces)
+            snapshots.append(interfaces)
+        return snapshots
+
+    def test_dedupe(self):
+        """Test only the latest content keeps its version"""
+        self.assertEqual(self.store.save("test", '"a"', {"one": {}}), 1)
+        self.assertEqual(self.store.save("test", '"a"', {"one": {}}), 1)
+        self.assertEqual(self.store.save("test", '"b"', {"two": {}}), 2)
+        self.assertEqual(self.store.save("test", '"a"', {"one": {}}), 3)
+        self.assertEqual(self.store.version("test", '"a"'), 3)
+        self.assertIsNone(self.store.version("test", '"b"'))
+        self.assertIsNone(self.store.version("other", '"a"'))
+
+    def test_version_in_memory(self):
+        """Test the latest version is answered without querying SQLite"""
+        self.store.save("test", '"a"', {"one": {}})
+        other = SnapshotStore(self.path)
+        self.addCleanup(other.close)
+        self.assertEqual(other.version("test", '"a"'), 1)
+
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute("DELETE FROM config_snapshots")
+        conn.close()
+        self.assertEqual(self.store.version("test", '"a"'), 1)
+        self.assertEqual(other.version("test", '"a"'), 1)
+        self.store.latest.clear()
+        self.assertIsNone(self.store.version("test", '"a"'))
+
+    def test_deltas(self):
+        """Test versions between full snapshots are rebuilt from deltas"""
+        snapshots = self.save_versions(4)
+        self.store.states.clear()
+
+        conn = sqlite3.connect(self.path)
+        bases = conn.execute(
+            "SELECT base FROM config_snapshots ORDER BY version"
+        ).fetchall()
+        conn.close()
+        self.assertListEqual(bases, [(1,), (1,), (1,), (4,)])
+        for version, interfaces in enumerate(snapshots, 1):
+            self.assertDictEqual(self.store.load("test", version), interfaces)
+
+    def test_changes(self):
+        """Test only what was added, changed or removed is returned"""
+        self.store.save(
+            "test", '"a"', {"one": {"a": 1}, "two": {"a": 2}, "three": {}}
+        )
+        self.store.save(
+            "test", '"b"', {"one": {"a": 1}, "two": {"a": 3}, "four": {}}
+        )
+
+        self.assertTupleEqual(
+            self.store.changes("test", 1, 2), ([{}], [{"a": 3}], ["three"])
+        )
+        self.assertTupleEqual(self.store.changes("test", 2, 2), ([], [], []))
+        self.assertIsNone(self.store.changes("test", 3, 2))
+
+    def test_prune(self):
+        """Test old versions go once nothing we keep depends on them"""
+        snapshots = self.save_versions(8)
+        self.store.states.clear()
+
+        self.assertIsNone(self.store.load("test", 3))
+        for version in range(4, 9):
+            self.assertDictEqual(
+                self.store.load("test", version), snapshots[version - 1]
+            )